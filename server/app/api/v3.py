@@ -23,11 +23,11 @@ from server.common.errors import (
 
 def rest_get_data_adaptor(func):
     @wraps(func)
-    def wrapped_function(self, s3_uri=None):
+    def wrapped_function(self, s3_uri=None, **kwargs):
         try:
             s3_uri = unquote(s3_uri) if s3_uri else s3_uri
             data_adaptor = get_data_adaptor(s3_uri, app_config=current_app.app_config)
-            return func(self, data_adaptor)
+            return func(self, data_adaptor, **kwargs)
         except (DatasetAccessError, DatasetNotFoundError, DatasetMetadataError) as e:
             return common_rest.abort_and_log(
                 e.status_code, f"Invalid s3_uri {s3_uri}: {e.message}", loglevel=logging.INFO, include_exc_info=True
@@ -74,6 +74,13 @@ class ConfigAPI(S3URIResource):
         return common_rest.config_get(current_app.app_config, data_adaptor)
 
 
+class BootstrapAPI(S3URIResource):
+    @cache_control(immutable=True, max_age=ONE_YEAR)
+    @rest_get_data_adaptor
+    def get(self, data_adaptor):
+        return common_rest.bootstrap_get(request, current_app.app_config, data_adaptor)
+
+
 class AnnotationsObsAPI(S3URIResource):
     @cache_control(immutable=True, max_age=ONE_YEAR)
     @rest_get_data_adaptor
@@ -88,6 +95,41 @@ class AnnotationsVarAPI(S3URIResource):
         return common_rest.annotations_var_get(request, data_adaptor)
 
 
+class SummaryObsAPI(S3URIResource):
+    @cache_control(immutable=True, max_age=ONE_YEAR)
+    @rest_get_data_adaptor
+    def get(self, data_adaptor):
+        return common_rest.summary_obs_get(request, data_adaptor)
+
+
+class SummaryVarAPI(S3URIResource):
+    @cache_control(immutable=True, max_age=ONE_YEAR)
+    @rest_get_data_adaptor
+    def get(self, data_adaptor):
+        return common_rest.summary_var_get(request, data_adaptor)
+
+
+class SummaryVarGroupsAPI(S3URIResource):
+    @cache_control(immutable=True, max_age=ONE_YEAR)
+    @rest_get_data_adaptor
+    def get(self, data_adaptor):
+        return common_rest.summary_var_groups_get(request, data_adaptor)
+
+
+class SummaryVarQuantilesAPI(S3URIResource):
+    @cache_control(no_store=True)
+    @rest_get_data_adaptor
+    def post(self, data_adaptor):
+        return common_rest.summary_var_quantiles_post(request, data_adaptor)
+
+
+class SearchVarAPI(S3URIResource):
+    @cache_control(immutable=True, max_age=ONE_YEAR)
+    @rest_get_data_adaptor
+    def get(self, data_adaptor):
+        return common_rest.search_var_get(request, data_adaptor)
+
+
 class DataVarAPI(S3URIResource):
     @cache_control(no_store=True)
     @rest_get_data_adaptor
@@ -100,6 +142,20 @@ class DataVarAPI(S3URIResource):
         return common_rest.data_var_get(request, data_adaptor)
 
 
+class DataVarBatchAPI(S3URIResource):
+    @cache_control(no_store=True)
+    @rest_get_data_adaptor
+    def post(self, data_adaptor):
+        return common_rest.data_var_batch_post(request, data_adaptor)
+
+
+class DataObsAPI(S3URIResource):
+    @cache_control(immutable=True, max_age=ONE_YEAR)
+    @rest_get_data_adaptor
+    def get(self, data_adaptor):
+        return common_rest.data_obs_get(request, data_adaptor)
+
+
 class ColorsAPI(S3URIResource):
     @cache_control(immutable=True, max_age=ONE_YEAR)
     @rest_get_data_adaptor
@@ -114,6 +170,13 @@ class DiffExpObsAPI(DatasetResource):
         return common_rest.diffexp_obs_post(request, data_adaptor)
 
 
+class DiffExpObsGroupsAPI(S3URIResource):
+    @cache_control(no_store=True)
+    @rest_get_data_adaptor
+    def post(self, data_adaptor):
+        return common_rest.diffexp_obs_groups_post(request, data_adaptor)
+
+
 class LayoutObsAPI(S3URIResource):
     @cache_control(immutable=True, max_age=ONE_YEAR)
     @rest_get_data_adaptor
@@ -121,6 +184,27 @@ class LayoutObsAPI(S3URIResource):
         return common_rest.layout_obs_get(request, data_adaptor)
 
 
+class LayoutObsTileAPI(S3URIResource):
+    @cache_control(immutable=True, max_age=ONE_YEAR)
+    @rest_get_data_adaptor
+    def get(self, data_adaptor):
+        return common_rest.layout_obs_tile_get(request, data_adaptor)
+
+
+class LayoutObsRasterAPI(S3URIResource):
+    @cache_control(immutable=True, max_age=ONE_YEAR)
+    @rest_get_data_adaptor
+    def get(self, data_adaptor):
+        return common_rest.layout_obs_raster_get(request, data_adaptor)
+
+
+class LayoutObsSelectionAPI(S3URIResource):
+    @cache_control(no_store=True)
+    @rest_get_data_adaptor
+    def post(self, data_adaptor):
+        return common_rest.layout_obs_selection_post(request, data_adaptor)
+
+
 class GenesetsAPI(S3URIResource):
     @cache_control(immutable=True, max_age=ONE_YEAR)
     @rest_get_data_adaptor
@@ -140,6 +224,39 @@ class SummarizeVarAPI(S3URIResource):
         return common_rest.summarize_var_post(request, data_adaptor)
 
 
+class JobsDiffExpObsAPI(S3URIResource):
+    @cache_control(no_store=True)
+    @rest_get_data_adaptor
+    def post(self, data_adaptor):
+        return common_rest.jobs_diffexp_obs_post(request, data_adaptor)
+
+
+class JobsSummarizeVarAPI(S3URIResource):
+    @cache_control(no_store=True)
+    @rest_get_data_adaptor
+    def post(self, data_adaptor):
+        return common_rest.jobs_summarize_var_post(request, data_adaptor)
+
+
+class JobAPI(S3URIResource):
+    @cache_control(no_store=True)
+    @rest_get_data_adaptor
+    def get(self, data_adaptor, job_id):
+        return common_rest.job_get(data_adaptor, job_id)
+
+    @cache_control(no_store=True)
+    @rest_get_data_adaptor
+    def delete(self, data_adaptor, job_id):
+        return common_rest.job_delete(data_adaptor, job_id)
+
+
+class JobResultAPI(S3URIResource):
+    @cache_control(no_store=True)
+    @rest_get_data_adaptor
+    def get(self, data_adaptor, job_id):
+        return common_rest.job_result_get(data_adaptor, job_id)
+
+
 def get_api_dataroot_resources(bp_dataroot, url_dataroot=None):
     """Add resources that refer to a dataset"""
     api = Api(bp_dataroot)
@@ -165,17 +282,34 @@ def get_api_s3uri_resources(bp_dataroot, s3uri_path):
     # Initialization routes
     add_resource(SchemaAPI, "/schema")
     add_resource(ConfigAPI, "/config")
+    add_resource(BootstrapAPI, "/bootstrap")
     # Data routes
     add_resource(AnnotationsObsAPI, "/annotations/obs")
     add_resource(AnnotationsVarAPI, "/annotations/var")
+    add_resource(SummaryObsAPI, "/summary/obs")
+    add_resource(SummaryVarAPI, "/summary/var")
+    add_resource(SummaryVarGroupsAPI, "/summary/var/groups")
+    add_resource(SummaryVarQuantilesAPI, "/summary/var/quantiles")
+    add_resource(SearchVarAPI, "/search/var")
     add_resource(DataVarAPI, "/data/var")
+    add_resource(DataVarBatchAPI, "/data/var/batch")
+    add_resource(DataObsAPI, "/data/obs")
     add_resource(GenesetsAPI, "/genesets")
     add_resource(SummarizeVarAPI, "/summarize/var")
     # Display routes
     add_resource(ColorsAPI, "/colors")
     # Computation routes
     add_resource(DiffExpObsAPI, "/diffexp/obs")
+    add_resource(DiffExpObsGroupsAPI, "/diffexp/obs/groups")
     add_resource(LayoutObsAPI, "/layout/obs")
+    add_resource(LayoutObsTileAPI, "/layout/obs/tile")
+    add_resource(LayoutObsRasterAPI, "/layout/obs/raster")
+    add_resource(LayoutObsSelectionAPI, "/layout/obs/selection")
+    # Background job routes
+    add_resource(JobsDiffExpObsAPI, "/jobs/diffexp/obs")
+    add_resource(JobsSummarizeVarAPI, "/jobs/summarize/var")
+    add_resource(JobAPI, "/jobs/<job_id>")
+    add_resource(JobResultAPI, "/jobs/<job_id>/result")
     return api
 
 
@@ -0,0 +1,42 @@
+import threading
+import time
+
+from server.common.errors import ComputeCancelledError
+
+
+class CancellationToken(object):
+    """
+    Cooperative cancellation of a computation which is split into tasks (eg, the column partitions
+    of diffexp).  The tasks call check() between units of work, such as reads of X, and stop by
+    raising ComputeCancelledError once the token is cancelled or its deadline has passed.  Tasks
+    which have not yet started stop before doing any work.
+
+    A running read can not be interrupted, so cancellation takes effect at the next check().
+    """
+
+    def __init__(self, timeout=None):
+        """timeout is the number of seconds, from now, until the deadline, or None for no deadline"""
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+        self.event = threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    def remaining(self):
+        """return the number of seconds until the deadline, or None if there is no deadline"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    @property
+    def cancelled(self):
+        if not self.event.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.event.set()
+        return self.event.is_set()
+
+    def check(self):
+        """raise ComputeCancelledError if the computation has been cancelled or has exceeded its deadline"""
+        if self.cancelled:
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                raise ComputeCancelledError("Computation exceeded its time limit")
+            raise ComputeCancelledError("Computation was cancelled")
@@ -1,3 +1,6 @@
+import hashlib
+
+import numba
 import numpy as np
 from scipy import sparse, stats
 from server.common.constants import XApproximateDistribution
@@ -119,7 +122,17 @@ def mean_var_n(X, X_approximate_distribution=XApproximateDistribution.NORMAL):
     Two-pass variance calculation.  Numerically (more) stable
     than naive methods (and same method used by numpy.var())
     https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance#Two-pass
+
+    Dense matrices are handled by mean_var_masked(), in a single pass and without temporaries.
     """
+    if not sparse.issparse(X):
+        # AnnData does not guarantee that operations on a view of X will
+        # return an ndarray, so force the cast if it wasn't done for us.
+        X = np.asarray(X)
+        n = X.shape[0]
+        mean, var = mean_var_masked(X, np.ones((n, 1), dtype=np.bool_), X_approximate_distribution)
+        return mean[0], var[0], n
+
     # fp_err_occurred is a flag indicating that a floating point error
     # occured somewhere in our compute.  Used to trigger non-finite
     # number handling.
@@ -131,23 +144,13 @@ def mean_var_n(X, X_approximate_distribution=XApproximateDistribution.NORMAL):
 
     with np.errstate(divide="call", invalid="call", call=fp_err_set):
         n = X.shape[0]
-        if sparse.issparse(X):
-            if X_approximate_distribution == XApproximateDistribution.COUNT:
-                X = X.log1p()
-            mean = X.mean(axis=0).A1
-            dfm = X - mean
-            sumsq = np.sum(np.multiply(dfm, dfm), axis=0).A1
-            v = sumsq / (n - 1)
-        else:
-            if X_approximate_distribution == XApproximateDistribution.COUNT:
-                X = np.log1p(X)
-            mean = X.mean(axis=0)
-            dfm = X - mean
-            sumsq = np.sum(np.multiply(dfm, dfm), axis=0)
-            v = sumsq / (n - 1)
-
-    # AnnData does not guarantee that operations on a view of X will
-    # return an ndarray, so force the cast if it wasn't done for us.
+        if X_approximate_distribution == XApproximateDistribution.COUNT:
+            X = X.log1p()
+        mean = X.mean(axis=0).A1
+        dfm = X - mean
+        sumsq = np.sum(np.multiply(dfm, dfm), axis=0).A1
+        v = sumsq / (n - 1)
+
     if type(mean) is not np.ndarray:
         mean = mean.toarray()
     if type(v) is not np.ndarray:
@@ -161,3 +164,125 @@ def mean_var_n(X, X_approximate_distribution=XApproximateDistribution.NORMAL):
         v[np.isnan(v)] = 0
 
     return mean, v, n
+
+
+def mean_var_masked(X, membership, X_approximate_distribution=XApproximateDistribution.NORMAL, nonfinite=0):
+    """
+    Per-column mean and variance of several (possibly overlapping) sets of the rows of the dense
+    matrix X, in one pass over X.  membership is a boolean array of shape (n_rows, n_sets), true
+    where the row is a member of the set.  Returns (mean, var), each of shape (n_sets, n_cols),
+    in float64.  The results of empty sets are zero, as is the variance of single row sets.
+    The results for columns containing non-finite values, NaN or +/-inf, are `nonfinite`.  This
+    is also the result of the two-pass sparse path of mean_var_n(), where an infinite value
+    always raises the floating point error (inf - inf) which zeroes all non-finite results.
+    """
+    log1p = X_approximate_distribution == XApproximateDistribution.COUNT
+    mean, var = _mean_var_masked_numba(X, membership, log1p)
+    n = membership.sum(axis=0)
+    sanitize_mean_var(mean, var, n, nonfinite)
+    return mean, var
+
+
+def sanitize_mean_var(mean, var, n, nonfinite=0):
+    """in place, replace the undefined statistics of sets (rows of mean & var) with fewer than two members"""
+    mean[n == 0] = 0
+    var[n < 2] = 0
+    non_finite = np.isfinite(mean) == False  # noqa: E712
+    mean[non_finite] = nonfinite
+    var[non_finite | (np.isfinite(var) == False)] = nonfinite  # noqa: E712
+
+
+@numba.njit(error_model="numpy", nogil=True)
+def _mean_var_masked_numba(X, membership, log1p):
+    """
+    Welford's online algorithm, applied to each set, row by row.  Rows are visited in storage
+    order and the set statistics are updated in place, so there are no temporaries the size of X.
+    https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance#Welford's_online_algorithm
+    """
+    n_rows, n_cols = X.shape
+    n_sets = membership.shape[1]
+    n = np.zeros((n_sets,), dtype=np.int64)
+    mean = np.zeros((n_sets, n_cols), dtype=np.float64)
+    m2 = np.zeros((n_sets, n_cols), dtype=np.float64)
+    row = np.empty((n_cols,), dtype=np.float64)
+    for i in range(n_rows):
+        for j in range(n_cols):
+            row[j] = np.log1p(X[i, j]) if log1p else X[i, j]
+        for s in range(n_sets):
+            if not membership[i, s]:
+                continue
+            n[s] += 1
+            inv_n = 1.0 / n[s]
+            for j in range(n_cols):
+                delta = row[j] - mean[s, j]
+                mean[s, j] += delta * inv_n
+                m2[s, j] += delta * (row[j] - mean[s, j])
+
+    var = np.empty_like(m2)
+    for s in range(n_sets):
+        var[s, :] = m2[s, :] / (n[s] - 1)
+    return mean, var
+
+
+def mean_var_grouped(X, codes, n_groups, X_approximate_distribution=XApproximateDistribution.NORMAL, nonfinite=0):
+    """
+    Per-column mean and variance of each group of the rows of the dense matrix X, in one pass
+    over X.  codes is an integer array of length n_rows assigning each row to a group in
+    [0, n_groups), or to no group if negative.  Returns (mean, var, n), where mean and var
+    have shape (n_groups, n_cols), in float64, and n is the size of each group.  Undefined
+    and non-finite results are handled as by mean_var_masked.
+    """
+    log1p = X_approximate_distribution == XApproximateDistribution.COUNT
+    mean, var, n = _mean_var_grouped_numba(X, codes, n_groups, log1p)
+    sanitize_mean_var(mean, var, n, nonfinite)
+    return mean, var, n
+
+
+@numba.njit(error_model="numpy", nogil=True)
+def _mean_var_grouped_numba(X, codes, n_groups, log1p):
+    """as _mean_var_masked_numba, where each row belongs to at most one set"""
+    n_rows, n_cols = X.shape
+    n = np.zeros((n_groups,), dtype=np.int64)
+    mean = np.zeros((n_groups, n_cols), dtype=np.float64)
+    m2 = np.zeros((n_groups, n_cols), dtype=np.float64)
+    for i in range(n_rows):
+        g = codes[i]
+        if g < 0:
+            continue
+        n[g] += 1
+        inv_n = 1.0 / n[g]
+        for j in range(n_cols):
+            x = np.log1p(X[i, j]) if log1p else X[i, j]
+            delta = x - mean[g, j]
+            mean[g, j] += delta * inv_n
+            m2[g, j] += delta * (x - mean[g, j])
+
+    var = np.empty_like(m2)
+    for g in range(n_groups):
+        var[g, :] = m2[g, :] / (n[g] - 1)
+    return mean, var, n
+
+
+def subsample_mask(mask, max_rows, seed=0, tile_rows=1):
+    """
+    Return a mask of a random sample of at most max_rows of the rows selected by mask, or mask
+    itself if it selects no more than max_rows.  The sample depends only on the mask, seed and
+    tile_rows, so is reproducible.
+
+    To reduce reads from tiled storage, rows are drawn a tile (of tile_rows rows) at a time:  the
+    tiles holding selected rows are visited in random order, taking all of their selected rows,
+    until the sample is full.
+    """
+    rows = np.flatnonzero(mask)
+    if len(rows) <= max_rows:
+        return mask
+
+    digest = hashlib.sha1(np.packbits(mask)).digest()
+    rng = np.random.default_rng([seed, int.from_bytes(digest[0:8], "little")])
+    _, tile_of_row = np.unique(rows // max(tile_rows, 1), return_inverse=True)
+    tile_rank = rng.permutation(tile_of_row.max() + 1)
+    order = np.lexsort((rng.random(len(rows)), tile_rank[tile_of_row]))
+
+    sample = np.zeros_like(mask, dtype=bool)
+    sample[rows[order[0:max_rows]]] = True
+    return sample
@@ -0,0 +1,220 @@
+import numba
+import numpy as np
+
+
+def _part1by1(v):
+    """spread the low 32 bits of v so that there is a zero bit between each"""
+    v = v.astype(np.uint64) & np.uint64(0xFFFFFFFF)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x3333333333333333)
+    v = (v | (v << np.uint64(1))) & np.uint64(0x5555555555555555)
+    return v
+
+
+def _compact1by1(v):
+    """inverse of _part1by1"""
+    v = v.astype(np.uint64) & np.uint64(0x5555555555555555)
+    v = (v | (v >> np.uint64(1))) & np.uint64(0x3333333333333333)
+    v = (v | (v >> np.uint64(2))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    v = (v | (v >> np.uint64(4))) & np.uint64(0x00FF00FF00FF00FF)
+    v = (v | (v >> np.uint64(8))) & np.uint64(0x0000FFFF0000FFFF)
+    v = (v | (v >> np.uint64(16))) & np.uint64(0x00000000FFFFFFFF)
+    return v
+
+
+def morton_encode(x, y):
+    """interleave the bits of the (non-negative, integer) grid coordinates x & y into a Morton (Z-order) code"""
+    return _part1by1(x) | (_part1by1(y) << np.uint64(1))
+
+
+def morton_decode(code):
+    """inverse of morton_encode, returns (x, y)"""
+    code = np.asarray(code, dtype=np.uint64)
+    return _compact1by1(code), _compact1by1(code >> np.uint64(1))
+
+
+@numba.njit(error_model="numpy", nogil=True)
+def points_in_polygon(xy: np.ndarray, px: np.ndarray, py: np.ndarray):
+    """Return a boolean mask of the points xy (shape (n, 2)) inside the polygon (px, py), by the even-odd rule."""
+    n_points = xy.shape[0]
+    n_vertices = px.shape[0]
+    result = np.zeros((n_points,), dtype=np.bool_)
+    for i in range(n_points):
+        x = xy[i, 0]
+        y = xy[i, 1]
+        inside = False
+        j = n_vertices - 1
+        for k in range(n_vertices):
+            if (py[k] > y) != (py[j] > y):
+                if x < (px[j] - px[k]) * (y - py[k]) / (py[j] - py[k]) + px[k]:
+                    inside = not inside
+            j = k
+        result[i] = inside
+    return result
+
+
+class LayoutIndex(object):
+    """
+    Spatial index over a normalized 2D layout, ie, one whose coordinates fall within [0, 1].
+
+    Points are bucketed into a square grid of 2**max_level cells on a side, and sorted in
+    Morton (Z) order.  This implies a quadtree:  at zoom level z, the unit square is divided
+    into 2**z by 2**z tiles, and the points in any tile are a contiguous run of the sorted
+    points, found by binary search.
+
+    Each point is also assigned a random priority, used to draw density-preserving
+    subsamples.  A tile sample is the points of lowest priority in the tile, so samples
+    are stable, and every point drawn for a tile is also drawn for the child tile
+    containing it.
+
+    Spatial selections (select_box, select_polygon) only test the individual points of
+    tiles which overlap the selection boundary.
+
+    Points with non-finite coordinates are not indexed.
+    """
+
+    # tile_counts() returns up to 4**depth counts
+    max_count_depth = 8
+
+    def __init__(self, layout, max_level=16, seed=0):
+        if layout.ndim != 2 or layout.shape[1] < 2:
+            raise ValueError("layout must have at least two dimensions")
+        if not 0 < max_level <= 31:
+            raise ValueError("max_level must be in range [1, 31]")
+
+        self.max_level = max_level
+        self.n_obs = layout.shape[0]
+        xy = layout[:, 0:2]
+        finite = np.isfinite(xy).all(axis=1)
+        obs = np.nonzero(finite)[0]
+        xy = xy[finite]
+
+        dim = 1 << max_level
+        grid = np.clip(np.floor(xy * dim), 0, dim - 1).astype(np.uint64)
+        codes = morton_encode(grid[:, 0], grid[:, 1])
+        order = np.argsort(codes, kind="stable")
+
+        self.codes = codes[order]
+        self.obs = obs[order].astype(np.uint32)
+        self.xy = np.ascontiguousarray(xy[order], dtype=np.float32)
+        priority = np.random.default_rng(seed).random(self.n_obs, dtype=np.float32)
+        self.priority = priority[self.obs]
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.obs.nbytes + self.xy.nbytes + self.priority.nbytes
+
+    def _check_tile(self, z, x, y):
+        if not 0 <= z <= self.max_level:
+            raise ValueError(f"zoom level must be in range [0, {self.max_level}]")
+        if not (0 <= x < (1 << z) and 0 <= y < (1 << z)):
+            raise ValueError("tile coordinates are out of range for zoom level")
+
+    def _code_range(self, z, x, y, depth=0):
+        """return the Morton code boundaries of the (4**depth) sub-tiles of tile (z, x, y)"""
+        shift = np.uint64(2 * (self.max_level - z - depth))
+        first = int(morton_encode(np.array([x]), np.array([y]))[0]) << (2 * depth)
+        boundaries = np.arange(first, first + (1 << (2 * depth)) + 1, dtype=np.uint64)
+        return boundaries << shift
+
+    def tile_range(self, z, x, y):
+        """return (start, stop) of the points contained in tile (z, x, y)"""
+        self._check_tile(z, x, y)
+        lo, hi = self._code_range(z, x, y)
+        return tuple(int(i) for i in np.searchsorted(self.codes, [lo, hi]))
+
+    def tile_sample(self, z, x, y, limit):
+        """
+        return (obs, xy) for a density-preserving sample of at most `limit` of the points in
+        tile (z, x, y).  obs are the point indices, xy the normalized coordinates.
+        """
+        if limit < 0:
+            raise ValueError("limit must be non-negative")
+        start, stop = self.tile_range(z, x, y)
+        if stop - start > limit:
+            if limit == 0:
+                selected = np.zeros((0,), dtype=np.intp)
+            else:
+                selected = np.sort(np.argpartition(self.priority[start:stop], limit - 1)[0:limit]) + start
+            return self.obs[selected], self.xy[selected]
+        return self.obs[start:stop], self.xy[start:stop]
+
+    def tile_counts(self, z, x, y, depth):
+        """
+        return (x, y, count) for each non-empty sub-tile at level z+depth, contained
+        within tile (z, x, y).  Sub-tile coordinates are those of level z+depth.
+        """
+        self._check_tile(z, x, y)
+        max_depth = min(self.max_count_depth, self.max_level - z)
+        if not 0 <= depth <= max_depth:
+            raise ValueError(f"depth must be in range [0, {max_depth}]")
+        boundaries = self._code_range(z, x, y, depth)
+        counts = np.diff(np.searchsorted(self.codes, boundaries)).astype(np.uint32)
+        nonzero = np.nonzero(counts)[0]
+        sub_x, sub_y = morton_decode(boundaries[nonzero] >> np.uint64(2 * (self.max_level - z - depth)))
+        return sub_x.astype(np.uint32), sub_y.astype(np.uint32), counts[nonzero]
+
+    def _box_runs(self, x0, y0, x1, y1, tiles_per_side=8):
+        """
+        return (starts, stops, inside) for the tiles overlapping the box, at the coarsest zoom
+        level where the box spans at least `tiles_per_side` tiles.  The points in each tile are
+        the run [start, stop), and `inside` is true for tiles entirely within the box.
+        """
+        extent = max(x1 - x0, y1 - y0)
+        z = self.max_level
+        if extent > 0:
+            z = int(np.clip(np.floor(np.log2(tiles_per_side / extent)), 0, self.max_level))
+        dim = 1 << z
+        tx0, tx1 = int(np.floor(x0 * dim)), min(int(np.floor(x1 * dim)), dim - 1)
+        ty0, ty1 = int(np.floor(y0 * dim)), min(int(np.floor(y1 * dim)), dim - 1)
+        tx, ty = np.meshgrid(np.arange(tx0, tx1 + 1), np.arange(ty0, ty1 + 1))
+        tx, ty = tx.ravel(), ty.ravel()
+
+        shift = np.uint64(2 * (self.max_level - z))
+        codes = morton_encode(tx, ty)
+        starts = np.searchsorted(self.codes, codes << shift)
+        stops = np.searchsorted(self.codes, (codes + np.uint64(1)) << shift)
+        inside = (tx >= x0 * dim) & (tx + 1 <= x1 * dim) & (ty >= y0 * dim) & (ty + 1 <= y1 * dim)
+        return starts, stops, inside
+
+    def select_box(self, x0, y0, x1, y1):
+        """return a boolean mask, of length n_obs, of the points within the (inclusive) box"""
+        mask = np.zeros((self.n_obs,), dtype=np.bool_)
+        x0, y0, x1, y1 = max(x0, 0.0), max(y0, 0.0), min(x1, 1.0), min(y1, 1.0)
+        if x0 > x1 or y0 > y1:
+            return mask
+
+        for start, stop, inside in zip(*self._box_runs(x0, y0, x1, y1)):
+            if start == stop:
+                continue
+            obs = self.obs[start:stop]
+            if not inside:
+                xy = self.xy[start:stop]
+                obs = obs[(xy[:, 0] >= x0) & (xy[:, 0] <= x1) & (xy[:, 1] >= y0) & (xy[:, 1] <= y1)]
+            mask[obs] = True
+        return mask
+
+    def select_polygon(self, vertices):
+        """
+        return a boolean mask, of length n_obs, of the points within the polygon (even-odd rule).
+        vertices is a sequence of (x, y), and the polygon is implicitly closed.
+        """
+        vertices = np.asarray(vertices, dtype=np.float64)
+        if vertices.ndim != 2 or vertices.shape[1] != 2 or vertices.shape[0] < 3:
+            raise ValueError("polygon must have at least three (x, y) vertices")
+        if not np.isfinite(vertices).all():
+            raise ValueError("polygon vertices must be finite")
+
+        mask = np.zeros((self.n_obs,), dtype=np.bool_)
+        x0, y0 = np.maximum(vertices.min(axis=0), 0.0)
+        x1, y1 = np.minimum(vertices.max(axis=0), 1.0)
+        if x0 > x1 or y0 > y1:
+            return mask
+
+        starts, stops, _ = self._box_runs(x0, y0, x1, y1)
+        candidates = np.concatenate([np.arange(start, stop) for start, stop in zip(starts, stops)])
+        hit = points_in_polygon(self.xy[candidates], vertices[:, 0].copy(), vertices[:, 1].copy())
+        mask[self.obs[candidates[hit]]] = True
+        return mask
@@ -0,0 +1,82 @@
+import sys
+
+import numpy as np
+
+
+class NameIndex(object):
+    """
+    Case-insensitive prefix index over the names of the elements of an axis (eg, gene symbols),
+    optionally with aliases (eg, Ensembl IDs) from other annotation fields.
+
+    Every (name or alias, position, field) is an entry, and the entries are sorted by their case
+    folded name, so that the entries beginning with a prefix are a contiguous run of the sorted
+    names, found by binary search.
+
+    Matches are ranked:  exact matches before prefix matches, then by field (names before
+    aliases, and aliases in the order given), then by length, and lastly by position.  Each
+    position is returned at most once, for its best match.
+    """
+
+    def __init__(self, fields):
+        """fields is a list of (field name, values), the first being the primary names"""
+        keys, positions, field_ids = [], [], []
+        for field_id, (_, values) in enumerate(fields):
+            values = np.asarray(values, dtype=object)
+            valid = np.array([isinstance(v, str) and v != "" for v in values], dtype=np.bool_)
+            keys.append(np.array([v.casefold() for v in values[valid]], dtype=np.str_))
+            positions.append(np.nonzero(valid)[0].astype(np.uint32))
+            field_ids.append(np.full((np.count_nonzero(valid),), field_id, dtype=np.uint8))
+
+        keys = np.concatenate(keys) if keys else np.zeros((0,), dtype=np.str_)
+        order = np.argsort(keys, kind="stable")
+        self.field_names = [name for name, _ in fields]
+        self.field_values = [np.asarray(values, dtype=object) for _, values in fields]
+        self.keys = keys[order]
+        self.positions = np.concatenate(positions)[order] if positions else np.zeros((0,), dtype=np.uint32)
+        self.fields = np.concatenate(field_ids)[order] if field_ids else np.zeros((0,), dtype=np.uint8)
+
+    @property
+    def nbytes(self):
+        # the field values are Python strings, estimated at 64 bytes each
+        n_values = sum(len(values) for values in self.field_values)
+        return self.keys.nbytes + self.positions.nbytes + self.fields.nbytes + 64 * n_values
+
+    def _prefix_range(self, prefix):
+        """return the [lo, hi) range of the sorted entries beginning with the (case folded) prefix"""
+        lo = np.searchsorted(self.keys, prefix, side="left")
+        # the entries beginning with the prefix sort before the prefix incremented in its last character.
+        # The greatest character can not be incremented, but sorts after any other, so the entries beginning
+        # with the prefix also sort before the prefix without its trailing greatest characters, incremented.
+        stem = prefix.rstrip(chr(sys.maxunicode))
+        if stem == "":
+            return lo, len(self.keys)
+        hi = np.searchsorted(self.keys, stem[:-1] + chr(ord(stem[-1]) + 1), side="left")
+        return lo, hi
+
+    def search(self, query, limit):
+        """
+        return up to limit matches of the query, best first, as a list of (position, name,
+        field name, matched value).  The query matches names and aliases beginning with it,
+        ignoring case.
+        """
+        prefix = query.strip().casefold()
+        if prefix == "" or limit < 1:
+            return []
+
+        lo, hi = self._prefix_range(prefix)
+        keys, positions, fields = self.keys[lo:hi], self.positions[lo:hi], self.fields[lo:hi]
+        lengths = np.char.str_len(keys)
+        order = np.lexsort((positions, lengths, fields, keys != prefix))
+
+        # keep the best match of each position
+        _, first = np.unique(positions[order], return_index=True)
+        order = order[np.sort(first)][:limit]
+        return [
+            (
+                int(positions[i]),
+                self.field_values[0][positions[i]],
+                self.field_names[fields[i]],
+                self.field_values[fields[i]][positions[i]],
+            )
+            for i in order
+        ]
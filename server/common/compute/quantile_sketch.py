@@ -0,0 +1,142 @@
+"""
+Mergeable quantile sketches, after the merging t-digest (Dunning & Ertl, "Computing Extremely
+Accurate Quantiles Using t-Digests").  A distribution is summarized by weighted centroids, which
+are small near the tails and larger near the median, so that extreme quantiles remain accurate.
+Sketches of disjoint sets of values may be merged into a sketch of their union.
+
+One value, the "atom", may be counted exactly rather than summarized by centroids.  This is
+used for the values not stored by sparse matrices (eg, zero), which typically dominate.
+"""
+import numpy as np
+
+DEFAULT_COMPRESSION = 200
+
+
+def _k(q, compression):
+    """the t-digest k1 scale function"""
+    return compression / (2 * np.pi) * np.arcsin(2 * np.clip(q, 0, 1) - 1)
+
+
+def _compress(groups, values, weights, n_groups, compression):
+    """
+    Merge weighted values, which must be sorted by (group, value), into the centroids of each
+    group.  Each centroid spans at most one unit of the k scale.  Returns the (groups, means,
+    weights) of the centroids, sorted by (group, mean).
+    """
+    if len(values) == 0:
+        return groups, values.astype(np.float64), weights.astype(np.float64)
+
+    totals = np.bincount(groups, weights=weights, minlength=n_groups)
+    starts = np.cumsum(totals) - totals
+    q = (np.cumsum(weights) - weights / 2 - starts[groups]) / totals[groups]
+    bucket = np.floor(_k(q, compression) - _k(0, compression)).astype(np.int64)
+
+    key = groups.astype(np.int64) * (compression + 2) + bucket
+    first = np.concatenate(([True], key[1:] != key[:-1]))
+    ids = np.cumsum(first) - 1
+    centroid_weights = np.bincount(ids, weights=weights)
+    centroid_means = np.bincount(ids, weights=values * weights) / centroid_weights
+    return groups[first], centroid_means, centroid_weights
+
+
+class QuantileSketch(object):
+    """
+    Sketch of a distribution:  centroids (means, weights), sorted by mean, plus atom_weight
+    occurrences of the value atom, and the exact minimum and maximum.
+    """
+
+    def __init__(self, means, weights, atom, atom_weight, min, max, compression=DEFAULT_COMPRESSION):
+        self.means = means
+        self.weights = weights
+        self.atom = atom
+        self.atom_weight = atom_weight
+        self.min = min
+        self.max = max
+        self.compression = compression
+
+    @property
+    def count(self):
+        return self.weights.sum() + self.atom_weight
+
+    @property
+    def nbytes(self):
+        return self.means.nbytes + self.weights.nbytes + 64
+
+    @staticmethod
+    def build_grouped(values, groups, n_groups, atom=0.0, atom_weights=None, compression=DEFAULT_COMPRESSION):
+        """
+        Sketch each group of values in a single pass, returning a list of n_groups sketches.
+        groups are the group indices (in [0, n_groups)) of each value.  atom_weights, if given,
+        are the number of additional occurrences of atom in each group.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        groups = np.asarray(groups, dtype=np.int64)
+        atom_weights = np.zeros((n_groups,), dtype=np.float64) if atom_weights is None else atom_weights
+
+        order = np.lexsort((values, groups))
+        values, groups = values[order], groups[order]
+        bounds = np.searchsorted(groups, np.arange(n_groups + 1))
+        c_groups, c_means, c_weights = _compress(groups, values, np.ones_like(values), n_groups, compression)
+        c_bounds = np.searchsorted(c_groups, np.arange(n_groups + 1))
+
+        sketches = []
+        for g in range(n_groups):
+            lo, hi = bounds[g], bounds[g + 1]
+            extremes = [values[lo], values[hi - 1]] if hi > lo else []
+            extremes += [atom] if atom_weights[g] > 0 else []
+            sketches.append(
+                QuantileSketch(
+                    c_means[c_bounds[g] : c_bounds[g + 1]],
+                    c_weights[c_bounds[g] : c_bounds[g + 1]],
+                    atom,
+                    float(atom_weights[g]),
+                    min(extremes) if extremes else None,
+                    max(extremes) if extremes else None,
+                    compression,
+                )
+            )
+        return sketches
+
+    @staticmethod
+    def merge(sketches):
+        """return a sketch of the union of the values of the sketches, which must share their atom"""
+        if len({sketch.atom for sketch in sketches if sketch.atom_weight > 0}) > 1:
+            raise ValueError("sketches with different atoms can not be merged")
+        compression = max(sketch.compression for sketch in sketches)
+        means = np.concatenate([sketch.means for sketch in sketches])
+        weights = np.concatenate([sketch.weights for sketch in sketches])
+        order = np.argsort(means, kind="stable")
+        _, means, weights = _compress(
+            np.zeros(len(means), dtype=np.int64), means[order], weights[order], 1, compression
+        )
+
+        atom_weight = sum(sketch.atom_weight for sketch in sketches)
+        atom = next((sketch.atom for sketch in sketches if sketch.atom_weight > 0), sketches[0].atom)
+        mins = [sketch.min for sketch in sketches if sketch.min is not None]
+        maxs = [sketch.max for sketch in sketches if sketch.max is not None]
+        return QuantileSketch(
+            means, weights, atom, atom_weight, min(mins) if mins else None, max(maxs) if maxs else None, compression
+        )
+
+    def quantile(self, q):
+        """
+        return the (approximate) quantiles q of the values, by interpolating between the centroids,
+        each centered on the middle of its weight, or None for each if there are no values.
+        """
+        q = np.asarray(q, dtype=np.float64)
+        total = self.count
+        if total == 0:
+            return [None] * len(q)
+
+        mids = np.cumsum(self.weights) - self.weights / 2
+        below = self.means < self.atom
+        n_below = np.count_nonzero(below)
+        weight_below = self.weights[:n_below].sum()
+        xs = [[0.0], mids[:n_below]]
+        ys = [[self.min], self.means[:n_below]]
+        if self.atom_weight > 0:
+            xs.append([weight_below, weight_below + self.atom_weight])
+            ys.append([self.atom, self.atom])
+        xs += [mids[n_below:] + self.atom_weight, [total]]
+        ys += [self.means[n_below:], [self.max]]
+        return np.interp(q * total, np.concatenate(xs), np.concatenate(ys)).tolist()
@@ -72,6 +72,9 @@ def get_client_config(app_config, data_adaptor, current_app):
     config["corpora_props"] = corpora_props
     config["limits"] = {
         "column_request_max": server_config.limits__column_request_max,
+        "data_var_batch_max": server_config.limits__data_var_batch_max,
+        "data_obs_max": server_config.limits__data_obs_max,
         "diffexp_cellcount_max": server_config.limits__diffexp_cellcount_max,
+        "diffexp_groups_max": server_config.limits__diffexp_groups_max,
     }
     return client_config
@@ -22,6 +22,10 @@ class DatasetConfig(BaseConfig):
             self.diffexp__enable = default_config["diffexp"]["enable"]
             self.diffexp__lfc_cutoff = default_config["diffexp"]["lfc_cutoff"]
             self.diffexp__top_n = default_config["diffexp"]["top_n"]
+            self.diffexp__approximate_max_cells = default_config["diffexp"]["approximate_max_cells"]
+            self.diffexp__approximate_seed = default_config["diffexp"]["approximate_seed"]
+
+            self.virtual_obs__enable = default_config["virtual_obs"]["enable"]
 
             self.X_approximate_distribution = default_config["X_approximate_distribution"]
 
@@ -33,6 +37,7 @@ class DatasetConfig(BaseConfig):
         self.handle_presentation()
         self.handle_embeddings()
         self.handle_diffexp(context)
+        self.handle_virtual_obs()
         self.handle_X_approximate_distribution()
 
     def handle_app(self):
@@ -67,6 +72,8 @@ class DatasetConfig(BaseConfig):
         self.validate_correct_type_of_configuration_attribute("diffexp__enable", bool)
         self.validate_correct_type_of_configuration_attribute("diffexp__lfc_cutoff", float)
         self.validate_correct_type_of_configuration_attribute("diffexp__top_n", int)
+        self.validate_correct_type_of_configuration_attribute("diffexp__approximate_max_cells", int)
+        self.validate_correct_type_of_configuration_attribute("diffexp__approximate_seed", int)
 
         server_config = self.app_config.server_config
         if server_config.single_dataset__datapath:
@@ -76,6 +83,9 @@ class DatasetConfig(BaseConfig):
                     "running differential expression may take longer or fail."
                 )
 
+    def handle_virtual_obs(self):
+        self.validate_correct_type_of_configuration_attribute("virtual_obs__enable", bool)
+
     def handle_X_approximate_distribution(self):
         self.validate_correct_type_of_configuration_attribute("X_approximate_distribution", str)
         if self.X_approximate_distribution not in ["normal", "count"]:
@@ -51,13 +51,29 @@ class ServerConfig(BaseConfig):
             self.diffexp__alg_cxg__max_workers = default_config["diffexp"]["alg_cxg"]["max_workers"]
             self.diffexp__alg_cxg__cpu_multiplier = default_config["diffexp"]["alg_cxg"]["cpu_multiplier"]
             self.diffexp__alg_cxg__target_workunit = default_config["diffexp"]["alg_cxg"]["target_workunit"]
+            self.diffexp__alg_cxg__timeout = default_config["diffexp"]["alg_cxg"]["timeout"]
+            self.diffexp__alg_cxg__executor = default_config["diffexp"]["alg_cxg"]["executor"]
 
             self.data_locator__s3__region_name = default_config["data_locator"]["s3"]["region_name"]
             self.data_locator__api_base = default_config["data_locator"]["api_base"]
+            self.adaptor__io_max_workers = default_config["adaptor"]["io_max_workers"]
             self.adaptor__cxg_adaptor__tiledb_ctx = default_config["adaptor"]["cxg_adaptor"]["tiledb_ctx"]
 
+            self.data_cache__layout_max_bytes = default_config["data_cache"]["layout_max_bytes"]
+            self.data_cache__selection_max_bytes = default_config["data_cache"]["selection_max_bytes"]
+            self.data_cache__diffexp_max_bytes = default_config["data_cache"]["diffexp_max_bytes"]
+            self.data_cache__summarize_max_bytes = default_config["data_cache"]["summarize_max_bytes"]
+            self.data_cache__column_max_bytes = default_config["data_cache"]["column_max_bytes"]
+
+            self.jobs__max_workers = default_config["jobs"]["max_workers"]
+            self.jobs__directory = default_config["jobs"]["directory"]
+            self.jobs__ttl = default_config["jobs"]["ttl"]
+
             self.limits__diffexp_cellcount_max = default_config["limits"]["diffexp_cellcount_max"]
+            self.limits__diffexp_groups_max = default_config["limits"]["diffexp_groups_max"]
             self.limits__column_request_max = default_config["limits"]["column_request_max"]
+            self.limits__data_var_batch_max = default_config["limits"]["data_var_batch_max"]
+            self.limits__data_obs_max = default_config["limits"]["data_obs_max"]
 
         except KeyError as e:
             raise ConfigurationError(f"Unexpected config: {str(e)}")
@@ -70,6 +86,8 @@ class ServerConfig(BaseConfig):
         self.handle_single_dataset(context)  # may depend on adaptor
         self.handle_multi_dataset()  # may depend on adaptor
         self.handle_diffexp()
+        self.handle_data_cache()
+        self.handle_jobs()
         self.handle_limits()
 
         self.check_config()
@@ -259,14 +277,31 @@ class ServerConfig(BaseConfig):
         self.validate_correct_type_of_configuration_attribute("diffexp__alg_cxg__max_workers", (str, int))
         self.validate_correct_type_of_configuration_attribute("diffexp__alg_cxg__cpu_multiplier", int)
         self.validate_correct_type_of_configuration_attribute("diffexp__alg_cxg__target_workunit", int)
+        self.validate_correct_type_of_configuration_attribute("diffexp__alg_cxg__timeout", (type(None), int, float))
+        self.validate_correct_type_of_configuration_attribute("diffexp__alg_cxg__executor", str)
+        if self.diffexp__alg_cxg__executor not in ("thread", "process"):
+            raise ConfigurationError('diffexp__alg_cxg__executor must be "thread" or "process"')
+        if self.diffexp__alg_cxg__executor == "process" and diffexp_tiledb.shared_memory is None:
+            raise ConfigurationError('diffexp__alg_cxg__executor "process" requires python 3.8 or later')
 
         max_workers = self.diffexp__alg_cxg__max_workers
         cpu_multiplier = self.diffexp__alg_cxg__cpu_multiplier
         cpu_count = os.cpu_count()
         max_workers = min(max_workers, cpu_multiplier * cpu_count)
-        diffexp_tiledb.set_config(max_workers, self.diffexp__alg_cxg__target_workunit)
+        diffexp_tiledb.set_config(
+            max_workers,
+            self.diffexp__alg_cxg__target_workunit,
+            self.diffexp__alg_cxg__timeout,
+            self.diffexp__alg_cxg__executor,
+        )
 
     def handle_adaptor(self):
+        self.validate_correct_type_of_configuration_attribute("adaptor__io_max_workers", int)
+
+        from server.dataset import dataset
+
+        dataset.set_io_config(self.adaptor__io_max_workers)
+
         # cxg
         self.validate_correct_type_of_configuration_attribute("adaptor__cxg_adaptor__tiledb_ctx", dict)
         regionkey = "vfs.s3.region"
@@ -278,9 +313,36 @@ class ServerConfig(BaseConfig):
 
         CxgDataset.set_tiledb_context(self.adaptor__cxg_adaptor__tiledb_ctx)
 
+    def handle_data_cache(self):
+        self.validate_correct_type_of_configuration_attribute("data_cache__layout_max_bytes", int)
+        self.validate_correct_type_of_configuration_attribute("data_cache__selection_max_bytes", int)
+        self.validate_correct_type_of_configuration_attribute("data_cache__diffexp_max_bytes", int)
+        self.validate_correct_type_of_configuration_attribute("data_cache__summarize_max_bytes", int)
+        self.validate_correct_type_of_configuration_attribute("data_cache__column_max_bytes", int)
+
+        from server.dataset import dataset
+
+        dataset.layout_cache.set_max_bytes(self.data_cache__layout_max_bytes)
+        dataset.selection_cache.set_max_bytes(self.data_cache__selection_max_bytes)
+        diffexp_tiledb.mean_var_cache.set_max_bytes(self.data_cache__diffexp_max_bytes)
+        dataset.summarize_cache.set_max_bytes(self.data_cache__summarize_max_bytes)
+        dataset.column_cache.set_max_bytes(self.data_cache__column_max_bytes)
+
+    def handle_jobs(self):
+        self.validate_correct_type_of_configuration_attribute("jobs__max_workers", int)
+        self.validate_correct_type_of_configuration_attribute("jobs__directory", (type(None), str))
+        self.validate_correct_type_of_configuration_attribute("jobs__ttl", (int, float))
+
+        from server.common import jobs
+
+        jobs.set_config(self.jobs__max_workers, self.jobs__directory, self.jobs__ttl)
+
     def handle_limits(self):
         self.validate_correct_type_of_configuration_attribute("limits__diffexp_cellcount_max", (type(None), int))
         self.validate_correct_type_of_configuration_attribute("limits__column_request_max", (type(None), int))
+        self.validate_correct_type_of_configuration_attribute("limits__data_var_batch_max", (type(None), int))
+        self.validate_correct_type_of_configuration_attribute("limits__data_obs_max", (type(None), int))
+        self.validate_correct_type_of_configuration_attribute("limits__diffexp_groups_max", (type(None), int))
 
     def exceeds_limit(self, limit_name, value):
         limit_value = getattr(self, "limits__" + limit_name, None)
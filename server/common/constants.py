@@ -29,7 +29,41 @@ class XApproximateDistribution(AugmentedEnum):
     COUNT = "count"
 
 
+class JobStatus(AugmentedEnum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
 JSON_NaN_to_num_warning_msg = "JSON encoding failure - please verify all data are finite values (no NaN or Infinities)"
 REACTIVE_LIMIT = 1_000_000
 
 MAX_LAYOUTS = 30
+
+# layout tile defaults: maximum number of cells per tile sample, and count sub-tile depth
+LAYOUT_TILE_DEFAULT_LIMIT = 16384
+LAYOUT_TILE_DEFAULT_DEPTH = 6
+
+# layout rasters: the default, and the maximum, width and height of the grid
+LAYOUT_RASTER_DEFAULT_SIZE = 128
+LAYOUT_RASTER_MAX_SIZE = 1024
+
+# obs annotation and gene expression summaries: number of histogram bins, and the quantiles of
+# gene expression reported
+SUMMARY_DEFAULT_BINS = 40
+SUMMARY_MAX_BINS = 1000
+VAR_SUMMARY_QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+
+# gene expression quantiles by category:  the default (a box plot), and the maximum number requested
+VAR_QUANTILES_DEFAULT = (0, 0.25, 0.5, 0.75, 1)
+VAR_QUANTILES_MAX = 101
+
+# var name search: the default, and the maximum, number of matches returned
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 1000
+
+# virtual obs annotations:  the gene subsets, by var name prefix (ignoring case), whose percentage
+# of each cell's total expression is the annotation pct_counts_<subset>
+VIRTUAL_OBS_GENE_SUBSETS = {"mt": ("MT-",), "ribo": ("RPS", "RPL")}
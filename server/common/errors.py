@@ -66,6 +66,11 @@ define_request_exception(
     "Raised when an error occurs during a compute algorithm (such as diffexp)",
     HTTPStatus.INTERNAL_SERVER_ERROR,
 )
+define_request_exception(
+    "ComputeCancelledError",
+    "Raised when a compute algorithm is cancelled, or exceeds its time limit",
+    HTTPStatus.SERVICE_UNAVAILABLE,
+)
 define_request_exception("ExceedsLimitError", "Raised when an HTTP request exceeds a limit/quota")
 define_request_exception("ColorFormatException", "Raised when color helper functions encounter an unknown color format")
 
@@ -29,7 +29,7 @@ def serialize_column(builder, typed_arr):
 
 
 # Serialization helper
-def serialize_matrix(builder, n_rows, n_cols, columns, col_idx):
+def serialize_matrix(builder, n_rows, n_cols, columns, col_idx, row_idx=None):
     """Serialize NetEncoding.Matrix"""
 
     Matrix.MatrixStart(builder)
@@ -40,6 +40,10 @@ def serialize_matrix(builder, n_rows, n_cols, columns, col_idx):
         (u_type, u_val) = col_idx
         Matrix.MatrixAddColIndexType(builder, u_type)
         Matrix.MatrixAddColIndex(builder, u_val)
+    if row_idx is not None:
+        (u_type, u_val) = row_idx
+        Matrix.MatrixAddRowIndexType(builder, u_type)
+        Matrix.MatrixAddRowIndex(builder, u_val)
     return Matrix.MatrixEnd(builder)
 
 
@@ -140,24 +144,54 @@ def encode_matrix_fbs(matrix, row_idx=None, col_idx=None):
     :param matrix: 2D DataFrame, ndarray or sparse equivalent
     :param row_idx: index for row dimension, Index or ndarray
     :param col_idx: index for col dimension, Index or ndarray
-
-    NOTE: row indices are (currently) unsupported and must be None
     """
 
-    if row_idx is not None:
-        raise ValueError("row indexing not supported for FBS Matrix")
     if matrix.ndim != 2:
         raise ValueError("FBS Matrix must be 2D")
 
     (n_rows, n_cols) = matrix.shape
+    if row_idx is not None and len(row_idx) != n_rows:
+        raise ValueError("FBS Matrix row index length does not match number of rows")
 
     # estimate size needed, so we don't unnecessarily realloc.
     builder = Builder(guess_at_mem_needed(matrix))
 
+    if isinstance(matrix, pd.DataFrame):
+        columns = (matrix.iloc[:, cidx] for cidx in range(n_cols - 1, -1, -1))
+    else:
+        columns = (matrix[:, cidx] for cidx in range(n_cols - 1, -1, -1))
+    return _build_matrix_fbs(builder, n_rows, n_cols, columns, col_idx, row_idx)
+
+
+def encode_columns_fbs(columns, n_rows, col_idx=None, row_idx=None):
+    """
+    Given a list of 1D ndarray or Series, each of length n_rows, create and return a Matrix
+    flatbuffer with one column per array.  Equivalent to encode_matrix_fbs() on the column-wise
+    concatenation of the arrays, without the need to create it.
+
+    :param columns: list of 1D ndarray or Series
+    :param n_rows: length of each column
+    :param col_idx: index for col dimension, Index or ndarray
+    :param row_idx: index for row dimension, Index or ndarray
+    """
+
+    if any(len(col) != n_rows for col in columns):
+        raise ValueError("FBS Matrix columns must all be of length n_rows")
+    if row_idx is not None and len(row_idx) != n_rows:
+        raise ValueError("FBS Matrix row index length does not match number of rows")
+
+    n_cols = len(columns)
+    guess = sum(getattr(col, "nbytes", 0) for col in columns) + 1024
+    builder = Builder((guess + 0x400) & (~0x3FF))
+    return _build_matrix_fbs(builder, n_rows, n_cols, reversed(columns), col_idx, row_idx)
+
+
+def _build_matrix_fbs(builder, n_rows, n_cols, reversed_columns, col_idx, row_idx=None):
+    """serialize the columns (last to first), col_idx and row_idx into a finished Matrix flatbuffer"""
+
     columns = []
-    for cidx in range(n_cols - 1, -1, -1):
+    for col in reversed_columns:
         # serialize the typed array
-        col = matrix.iloc[:, cidx] if isinstance(matrix, pd.DataFrame) else matrix[:, cidx]
         typed_arr = serialize_typed_array(builder, col, column_encoding)
 
         # serialize the Column union
@@ -174,8 +208,13 @@ def encode_matrix_fbs(matrix, row_idx=None, col_idx=None):
     if col_idx is not None:
         cidx = serialize_typed_array(builder, col_idx, index_encoding)
 
+    # serialize the rowIndex if provided
+    ridx = None
+    if row_idx is not None:
+        ridx = serialize_typed_array(builder, np.asarray(row_idx), index_encoding)
+
     # Serialize Matrix
-    matrix = serialize_matrix(builder, n_rows, n_cols, matrix_column_vec, cidx)
+    matrix = serialize_matrix(builder, n_rows, n_cols, matrix_column_vec, cidx, ridx)
 
     builder.Finish(matrix)
     return builder.Output()
@@ -209,6 +248,7 @@ def deserialize_typed_array(tarr):
 def decode_matrix_fbs(fbs):
     """
     Given an FBS-encoded Matrix, return a Pandas DataFrame the contains the data and indices.
+    The row index, if any, becomes the DataFrame index.
     """
 
     matrix = Matrix.Matrix.GetRootAsMatrix(fbs, 0)
@@ -217,9 +257,6 @@ def decode_matrix_fbs(fbs):
     if n_rows == 0 or n_cols == 0:
         return pd.DataFrame()
 
-    if matrix.RowIndexType() is not TypedArray.TypedArray.NONE:
-        raise ValueError("row indexing not supported for FBS Matrix")
-
     columns_length = matrix.ColumnsLength()
 
     columns_index = deserialize_typed_array((matrix.ColIndexType(), matrix.ColIndex()))
@@ -244,6 +281,12 @@ def decode_matrix_fbs(fbs):
 
     df = pd.DataFrame.from_dict(data=columns_data).astype(columns_type, copy=False)
 
+    rows_index = deserialize_typed_array((matrix.RowIndexType(), matrix.RowIndex()))
+    if rows_index is not None:
+        if len(rows_index) != n_rows:
+            raise ValueError("FBS row index length does not match number of rows")
+        df.index = rows_index
+
     # more sanity checks
     if not df.columns.is_unique or len(df.columns) != n_cols:
         raise KeyError("FBS column indices are not unique")
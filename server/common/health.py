@@ -2,6 +2,7 @@ from http import HTTPStatus
 from flask import make_response, jsonify
 
 from server import __version__ as cellxgene_version
+from server.common.lru_kvcache import cache_stats
 from server.common.utils.data_locator import DataLocator
 
 
@@ -32,6 +33,7 @@ def health_check(config):
         checks = _is_accessible(server_config.single_dataset__datapath, server_config)
 
     health["status"] = "pass" if checks else "fail"
+    health["caches"] = cache_stats()
     code = HTTPStatus.OK if health["status"] == "pass" else HTTPStatus.BAD_REQUEST
     response = make_response(jsonify(health), code)
     response.headers["Content-Type"] = "application/health+json"
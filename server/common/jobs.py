@@ -0,0 +1,244 @@
+"""
+Background jobs.  Computations which may outlast an HTTP request (eg, diffexp of large
+selections) can be submitted as jobs, which run on a bounded pool of worker threads,
+separate from the threads serving requests.  The status and result of each job are
+persisted to a local directory, so they may be retrieved by later requests, from any
+server process sharing the directory, until they expire.
+
+A job which is queued or running may be cancelled, but only by the process running it.
+Jobs expire ttl seconds after they finish, however long they were queued or running.  Jobs
+interrupted by a server restart never finish, so are reported as running until their records
+are removed from the directory.
+"""
+import concurrent.futures
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from http import HTTPStatus
+
+from server.common.compute.cancellation import CancellationToken
+from server.common.constants import JobStatus
+from server.common.errors import ComputeCancelledError, RequestException
+
+job_executor = None
+job_max_workers = 2
+job_directory = None
+job_ttl = 3600
+
+# minimum seconds between sweeps of the job directory for expired jobs
+JOB_SWEEP_INTERVAL = 60
+
+_job_store = None
+_job_tokens = {}  # job id -> CancellationToken, for the jobs queued or running in this process
+_job_tokens_lock = threading.Lock()
+
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+def set_config(config_max_workers, config_directory, config_ttl):
+    global job_max_workers, job_directory, job_ttl, _job_store
+    job_max_workers = config_max_workers
+    job_directory = config_directory
+    job_ttl = config_ttl
+    _job_store = None
+
+
+def get_job_executor():
+    global job_executor
+    if job_executor is None:
+        job_executor = concurrent.futures.ThreadPoolExecutor(max_workers=job_max_workers)
+    return job_executor
+
+
+def get_job_store():
+    global _job_store
+    if _job_store is None:
+        directory = job_directory or os.path.join(tempfile.gettempdir(), "cellxgene-jobs")
+        _job_store = JobStore(directory, job_ttl)
+    return _job_store
+
+
+class JobStore(object):
+    """
+    Job records and results, persisted as files in a directory.  Each job has a JSON record,
+    <id>.json, and once it has succeeded, a result, <id>.result.  Files are replaced atomically,
+    so concurrent readers see either the previous or the new version.  Jobs expire ttl seconds
+    after they finish, and are then removed.  A job which has not finished has no expiry.
+    """
+
+    def __init__(self, directory, ttl, sweep_interval=JOB_SWEEP_INTERVAL):
+        self.directory = directory
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.last_sweep = None
+        self.sweep_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id, suffix):
+        if not JOB_ID_PATTERN.match(job_id):
+            raise KeyError(job_id)
+        return os.path.join(self.directory, job_id + suffix)
+
+    def _write(self, path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def put(self, record, result=None):
+        if result is not None:
+            self._write(self._path(record["id"], ".result"), result)
+        self._write(self._path(record["id"], ".json"), json.dumps(record).encode())
+
+    def get(self, job_id):
+        """return the record of the job, or None if it does not exist or has expired (unfinished jobs do not expire)"""
+        try:
+            with open(self._path(job_id, ".json"), "rb") as f:
+                record = json.loads(f.read())
+        except (KeyError, FileNotFoundError, ValueError):
+            return None
+        if record["finished"] is not None and record["expires"] <= time.time():
+            self.delete(job_id)
+            return None
+        return record
+
+    def get_result(self, job_id):
+        try:
+            with open(self._path(job_id, ".result"), "rb") as f:
+                return f.read()
+        except (KeyError, FileNotFoundError):
+            return None
+
+    def delete(self, job_id):
+        for suffix in (".json", ".result"):
+            try:
+                os.unlink(self._path(job_id, suffix))
+            except (KeyError, FileNotFoundError):
+                pass
+
+    def sweep(self):
+        """
+        remove all expired jobs, at most once every sweep_interval seconds.  A record is last
+        written when its job finishes, so only records last modified more than ttl seconds ago
+        may have expired, and only those are read.
+        """
+        now = time.time()
+        with self.sweep_lock:
+            if self.last_sweep is not None and now - self.last_sweep < self.sweep_interval:
+                return
+            self.last_sweep = now
+
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                job_id, ext = os.path.splitext(entry.name)
+                try:
+                    if ext == ".json" and entry.stat().st_mtime + self.ttl <= now:
+                        self.get(job_id)
+                except FileNotFoundError:
+                    pass
+
+
+def submit_job(job_type, location, fn):
+    """
+    Submit fn(cancel_token) to run as a job, returning the job record.  fn must return
+    (content_type, bytes).  A RequestException raised by fn fails the job with the status
+    code of the exception; any other exception fails the job with an internal error.
+    """
+    store = get_job_store()
+    store.sweep()
+    now = time.time()
+    record = dict(
+        id=uuid.uuid4().hex,
+        type=job_type,
+        location=location,
+        status=str(JobStatus.QUEUED),
+        created=now,
+        started=None,
+        finished=None,
+        expires=None,
+        status_code=None,
+        error=None,
+        content_type=None,
+    )
+    token = CancellationToken()
+    with _job_tokens_lock:
+        _job_tokens[record["id"]] = token
+    store.put(record)
+    get_job_executor().submit(_run_job, store, dict(record), fn, token)
+    return record
+
+
+def _run_job(store, record, fn, token):
+    result = None
+    try:
+        try:
+            token.check()
+            record.update(status=str(JobStatus.RUNNING), started=time.time())
+            store.put(record)
+            content_type, result = fn(token)
+            record.update(status=str(JobStatus.SUCCEEDED), content_type=content_type)
+        except ComputeCancelledError as e:
+            record.update(status=str(JobStatus.CANCELLED), status_code=e.status_code, error=e.message)
+        except RequestException as e:
+            record.update(status=str(JobStatus.FAILED), status_code=e.status_code, error=e.message)
+        except Exception:
+            logging.exception(f"job {record['id']} failed")
+            record.update(
+                status=str(JobStatus.FAILED), status_code=HTTPStatus.INTERNAL_SERVER_ERROR, error="Internal error"
+            )
+
+        record.update(finished=time.time(), expires=time.time() + store.ttl)
+        try:
+            store.put(record, result)
+        except Exception:
+            # the job must not be left recorded as running, which never expires
+            logging.exception(f"job {record['id']} could not be saved")
+            record.update(
+                status=str(JobStatus.FAILED),
+                status_code=HTTPStatus.INTERNAL_SERVER_ERROR,
+                error="Internal error",
+                content_type=None,
+            )
+            store.put(record)
+    finally:
+        with _job_tokens_lock:
+            del _job_tokens[record["id"]]
+
+
+def get_job(job_id, location):
+    """return the record of the job, or None if there is no such job for the dataset at location"""
+    record = get_job_store().get(job_id)
+    if record is None or record["location"] != location:
+        return None
+    return record
+
+
+def get_job_result(job_id):
+    return get_job_store().get_result(job_id)
+
+
+def cancel_job(job_id):
+    """
+    Cancel the job, if queued or running in this process, or discard it, if finished.
+    Return False if the job is queued or running in another process.
+    """
+    with _job_tokens_lock:
+        token = _job_tokens.get(job_id)
+    if token is not None:
+        token.cancel()
+        return True
+    store = get_job_store()
+    record = store.get(job_id)
+    if record is not None and record["finished"] is None:
+        return False
+    store.delete(job_id)
+    return True
@@ -0,0 +1,167 @@
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# named caches, for reporting (see cache_stats)
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def cache_stats():
+    """return the stats of all named LRUKVCache instances, as a dict of name: stats"""
+    with _registry_lock:
+        caches = list(_registry.items())
+    return {name: cache.stats() for name, cache in caches}
+
+
+def sizeof(value):
+    """
+    Approximate the number of bytes held by a cached value.  Understands ndarrays (including
+    the objects referenced by object arrays, eg, strings), pandas objects, bytes and (nested)
+    tuples, lists and dicts of those.  Anything else is counted as a nominal 64 bytes.
+    """
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return value.nbytes + sum(sys.getsizeof(v) for v in value.flat)
+        return value.nbytes
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=False).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(sizeof(v) for v in value)
+    if isinstance(value, dict):
+        return sum(sizeof(v) for v in value.values())
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    return 64
+
+
+class LRUKVCache(object):
+    """
+    Thread-safe key/value cache, bounded by an (approximate) byte budget.  When an
+    insertion would exceed the budget, least recently used entries are evicted.
+    Values larger than the entire budget are never cached.
+
+    get_or_create() guarantees that concurrent requests for the same missing key
+    will call the factory once, and only once (the other callers wait for the result).
+
+    If a name is given, the cache statistics are reported by cache_stats().
+    """
+
+    def __init__(self, max_bytes, sizeof=sizeof, name=None):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.lock = threading.Lock()  # guards everything below
+        self.cache = OrderedDict()  # key -> (value, nbytes), in LRU order
+        self.nbytes = 0
+        self.factory_calls = {}  # per-key factory condition variables
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if name is not None:
+            with _registry_lock:
+                _registry[name] = self
+
+    def set_max_bytes(self, max_bytes):
+        with self.lock:
+            self.max_bytes = max_bytes
+            self._evict(0)
+
+    def _evict(self, nbytes_needed):
+        """evict LRU entries until nbytes_needed will fit.  Must be called with lock held."""
+        while self.cache and self.nbytes + nbytes_needed > self.max_bytes:
+            _, (_, nbytes) = self.cache.popitem(last=False)
+            self.nbytes -= nbytes
+            self.evictions += 1
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return self.cache[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        nbytes = self.sizeof(value)
+        with self.lock:
+            if key in self.cache:
+                _, old_nbytes = self.cache.pop(key)
+                self.nbytes -= old_nbytes
+            if nbytes > self.max_bytes:
+                return
+            self._evict(nbytes)
+            self.cache[key] = (value, nbytes)
+            self.nbytes += nbytes
+
+    def get_or_create(self, key, factory):
+        """Return the value for key, calling factory(key) to create it if it is not cached."""
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return self.cache[key][0]
+            self.misses += 1
+            creation_thr = key not in self.factory_calls
+            if creation_thr:
+                self.factory_calls[key] = {"cv": threading.Condition(), "is_done": False, "error": None}
+            factory_call = self.factory_calls[key]
+
+        cv = factory_call["cv"]
+        with cv:
+            if creation_thr:
+                try:
+                    factory_call["value"] = self._create(key, factory)
+                except Exception as e:
+                    factory_call["error"] = e
+                with self.lock:
+                    del self.factory_calls[key]
+                factory_call["is_done"] = True
+                cv.notify_all()
+            else:
+                while not factory_call["is_done"]:
+                    cv.wait()
+
+        if factory_call["error"] is not None:
+            raise factory_call["error"]
+        return factory_call["value"]
+
+    def _create(self, key, factory):
+        value = factory(key)
+        self.put(key, value)
+        return value
+
+    def __contains__(self, key):
+        """weak contain - does not update LRU order or statistics"""
+        with self.lock:
+            return key in self.cache
+
+    def __len__(self):
+        with self.lock:
+            return len(self.cache)
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.cache),
+                "nbytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
@@ -1,17 +1,37 @@
 import copy
 import hashlib
+import itertools
 import logging
 import sys
 import zlib
 from http import HTTPStatus
 
-from flask import make_response, jsonify, current_app, abort, redirect
+import numpy as np
+from flask import make_response, jsonify, current_app, abort, redirect, json, Response
 from werkzeug.urls import url_unquote
 
 from server.app.api.util import get_dataset_artifact_s3_uri
 from server.common.config.client_config import get_client_config
-from server.common.constants import Axis, DiffExpMode, JSON_NaN_to_num_warning_msg
+from server.common import jobs
+from server.common.constants import (
+    Axis,
+    DiffExpMode,
+    JobStatus,
+    JSON_NaN_to_num_warning_msg,
+    LAYOUT_TILE_DEFAULT_LIMIT,
+    LAYOUT_TILE_DEFAULT_DEPTH,
+    LAYOUT_RASTER_DEFAULT_SIZE,
+    SEARCH_DEFAULT_LIMIT,
+    SEARCH_MAX_LIMIT,
+    SUMMARY_DEFAULT_BINS,
+    SUMMARY_MAX_BINS,
+    VAR_SUMMARY_QUANTILES,
+    VAR_QUANTILES_DEFAULT,
+    VAR_QUANTILES_MAX,
+)
 from server.common.errors import (
+    ComputeCancelledError,
+    RequestException,
     FilterError,
     JSONEncodingValueError,
     InvalidCxgDatasetError,
@@ -22,7 +42,9 @@ from server.common.errors import (
     UnsupportedSummaryMethod,
     TombstoneError,
 )
+from server.common.utils.bundle import encode_bundle
 from server.dataset import dataset_metadata
+from server.dataset.dataset import get_io_executor
 
 
 def abort_and_log(code, logmsg, loglevel=logging.DEBUG, include_exc_info=False):
@@ -139,6 +161,44 @@ def config_get(app_config, data_adaptor):
     return make_response(jsonify(config), HTTPStatus.OK)
 
 
+def bootstrap_get(request, app_config, data_adaptor):
+    """
+    Return, in a single bundle (see server.common.utils.bundle), the resources needed for the
+    client's initial render.  Each part is named after, and identical to the response of, the
+    equivalent route:
+        schema, config, colors: JSON
+        annotations/var: FBS, the var index column
+        layout/obs: FBS, the default embedding (or all embeddings if there is no default)
+    The colors part is omitted if the dataset colors are malformed.
+    """
+    preferred_mimetype = request.accept_mimetypes.best_match(["application/octet-stream"])
+    if preferred_mimetype != "application/octet-stream":
+        return abort(HTTPStatus.NOT_ACCEPTABLE)
+
+    try:
+        schema = schema_get_helper(data_adaptor)
+        var_index_name = schema["annotations"]["var"]["index"]
+        var_index = get_io_executor().submit(data_adaptor.annotation_to_fbs_matrix, Axis.VAR, [var_index_name])
+
+        config = get_client_config(app_config, data_adaptor, current_app)
+        parts = [("schema", json.dumps({"schema": schema})), ("config", json.dumps(config))]
+        try:
+            colors = data_adaptor.get_colors() if data_adaptor.dataset_config.presentation__custom_colors else {}
+            parts.append(("colors", json.dumps(colors)))
+        except ColorFormatException as e:
+            current_app.logger.warning(f"Omitting colors from bootstrap: {str(e)}")
+        parts = [(name, payload.encode("utf-8")) for name, payload in parts]
+
+        default_embedding = config["config"]["parameters"].get("default_embedding")
+        layouts = [default_embedding] if default_embedding else []
+        parts.append(("layout/obs", data_adaptor.layout_to_fbs_matrix(layouts)))
+        parts.append(("annotations/var", var_index.result()))
+
+        return make_response(encode_bundle(parts), HTTPStatus.OK, {"Content-Type": "application/octet-stream"})
+    except (KeyError, DatasetAccessError) as e:
+        return abort_and_log(HTTPStatus.BAD_REQUEST, str(e), include_exc_info=True)
+
+
 def annotations_obs_get(request, data_adaptor):
     fields = request.args.getlist("annotation-name", None)
     num_columns_requested = len(data_adaptor.get_obs_keys()) if len(fields) == 0 else len(fields)
@@ -155,6 +215,113 @@ def annotations_obs_get(request, data_adaptor):
         return abort_and_log(HTTPStatus.BAD_REQUEST, str(e), include_exc_info=True)
 
 
+def summary_obs_get(request, data_adaptor):
+    """
+    Summaries of obs annotations (see Dataset.summarize_obs), small enough to draw category
+    legends and histograms without fetching the per-cell values.  Query params:
+        annotation-name: the annotations to summarize (all, if none are given)
+        bins: number of histogram bins for numeric annotations
+        selection: restrict the summaries to the cells of a selection handle
+    """
+    fields = request.args.getlist("annotation-name", None)
+    if len(fields) == 0:
+        fields = data_adaptor.get_obs_keys()
+    if data_adaptor.server_config.exceeds_limit("column_request_max", len(fields)):
+        return abort(HTTPStatus.BAD_REQUEST)
+
+    bins = request.args.get("bins", type=int, default=SUMMARY_DEFAULT_BINS)
+    if bins is None or bins < 1 or bins > SUMMARY_MAX_BINS:
+        return abort_and_log(HTTPStatus.BAD_REQUEST, f"bins must be an integer in [1, {SUMMARY_MAX_BINS}]")
+    selection = request.args.get("selection", None)
+
+    try:
+        summary = data_adaptor.summarize_obs(fields, bins, selection)
+        return make_response(summary, HTTPStatus.OK, {"Content-Type": "application/json"})
+    except (KeyError, FilterError) as e:
+        return abort_and_log(HTTPStatus.BAD_REQUEST, str(e), include_exc_info=True)
+    except JSONEncodingValueError:
+        current_app.logger.warning(JSON_NaN_to_num_warning_msg)
+        raise
+
+
+def summary_var_get(request, data_adaptor):
+    """
+    Distributions of the expression of genes (see Dataset.summarize_var_distribution), for
+    histograms and color scales without fetching the per-cell values.  Query params:
+        var-index: the genes to summarize (required)
+        bins: number of histogram bins
+        selection: restrict the summaries to the cells of a selection handle
+    """
+    var_indices = request.args.getlist("var-index", type=int)
+    if len(var_indices) == 0:
+        return abort_and_log(HTTPStatus.BAD_REQUEST, "missing or invalid required parameter var-index")
+    bins = request.args.get("bins", type=int, default=SUMMARY_DEFAULT_BINS)
+    if bins is None or bins < 1 or bins > SUMMARY_MAX_BINS:
+        return abort_and_log(HTTPStatus.BAD_REQUEST, f"bins must be an integer in [1, {SUMMARY_MAX_BINS}]")
+    selection = request.args.get("selection", None)
+
+    try:
+        summary = data_adaptor.summarize_var_distribution(var_indices, bins, VAR_SUMMARY_QUANTILES, selection)
+        return make_response(summary, HTTPStatus.OK, {"Content-Type": "application/json"})
+    except (ValueError, FilterError, ExceedsLimitError) as e:
+        return abort_and_log(HTTPStatus.BAD_REQUEST, str(e), include_exc_info=True)
+
+
+def summary_var_groups_get(request, data_adaptor):
+    """
+    Expression of genes aggregated by category (see Dataset.summarize_var_groups), eg, for a dot
+    plot.  Query params:
+        obs: the categorical obs annotation (required)
+        var-index: the genes to aggregate (required)
+    """
+    obs_name = request.args.get("obs", None)
+    var_indices = request.args.getlist("var-index", type=int)
+    if obs_name is None or len(var_indices) == 0:
+        return abort_and_log(HTTPStatus.BAD_REQUEST, "missing or invalid required parameter")
+
+    try:
+        summary = data_adaptor.summarize_var_groups(obs_name, var_indices)
+        return make_response(summary, HTTPStatus.OK, {"Content-Type": "application/json"})
+    except (ValueError, FilterError, ExceedsLimitError) as e:
+        return abort_and_log(HTTPStatus.BAD_REQUEST, str(e), include_exc_info=True)
+
+
+def summary_var_quantiles_post(request, data_adaptor):
+    """
+    Quantiles of the expression of genes by category (see Dataset.summarize_var_quantiles), eg,
+    for violin or box plots.  JSON body:
+        {"obs": <categorical obs annotation>, "var": [<var index>, ...]}
+    and optionally "groups": [[<category>, ...], ...] (default, each category alone), and
+    "quantiles": [<q>, ...] (default, those of a box plot).
+    """
+    args = request.get_json()
+    try:
+        obs_name = args["obs"]
+        var_indices = args["var"]
+        groups = args.get("groups")
+        quantiles = args.get("quantiles", VAR_QUANTILES_DEFAULT)
+        if not isinstance(obs_name, str):
+            return abort_and_log(HTTPStatus.BAD_REQUEST, "obs must be the name of an annotation")
+        if not isinstance(var_indices, list) or not all(isinstance(var, int) for var in var_indices):
+            return abort_and_log(HTTPStatus.BAD_REQUEST, "var must be a list of var indices")
+        if groups is not None and not all(isinstance(group, list) for group in groups):
+            return abort_and_log(HTTPStatus.BAD_REQUEST, "groups must be a list of lists of categories")
+        if groups is not None and not all(len(group) > 0 for group in groups):
+            return abort_and_log(HTTPStatus.BAD_REQUEST, "each group must have at least one category")
+        valid_quantiles = all(isinstance(q, (int, float)) and 0 <= q <= 1 for q in quantiles)
+        if not valid_quantiles or not 0 < len(quantiles) <= VAR_QUANTILES_MAX:
+            return abort_and_log(HTTPStatus.BAD_REQUEST, f"quantiles must be 1 to {VAR_QUANTILES_MAX} values in [0, 1]")
+
+    except (KeyError, TypeError, AttributeError) as e:
+        return abort_and_log(HTTPStatus.BAD_REQUEST, str(e), include_exc_info=True)
+
+    try:
+        summary = data_adaptor.summarize_var_quantiles(obs_name, var_indices, quantiles, groups)
+        return make_response(summary, HTTPStatus.OK, {"Content-Type": "application/json"})
+    except (ValueError, FilterError, ExceedsLimitError) as e:
+        return abort_and_log(HTTPStatus.BAD_REQUEST, str(e), include_exc_info=True)
+
+
 def inflate(data):
     return zlib.decompress(data)
 
@@ -211,6 +378,80 @@ def data_var_get(request, data_adaptor):
         return abort_and_log(HTTPStatus.BAD_REQUEST, str(e), include_exc_info=True)
 
 
+def data_var_batch_post(request, data_adaptor):
+    """
+    Return X columns for a batch of vars, as a bundle (see server.common.utils.bundle) with one part per
+    requested var, in request order.  Each part is named by the var index, and contains the same FBS
+    Matrix as /data/var would return for that var alone.  The request body is either JSON, {"var": [...]},
+    or (application/octet-stream) a little-endian uint32 array of var indices.
+
+    The bundle is streamed.  The first part is read before the response starts, so that a failure to read
+    it is reported by the status code, but a failure to read a later part can only end the response
+    early:  a truncated bundle (see decode_bundle) means a server error.
+    """
+    preferred_mimetype = request.accept_mimetypes.best_match(["application/octet-stream"])
+    if preferred_mimetype != "application/octet-stream":
+        return abort(HTTPStatus.NOT_ACCEPTABLE)
+
+    try:
+        if request.mimetype == "application/octet-stream":
+            var_indices = np.frombuffer(request.get_data(), dtype="<u4")
+        else:
+            var_indices = request.get_json()["var"]
+        fbs_matrices = data_adaptor.data_var_batch_to_fbs_matrices(var_indices)
+    except (KeyError, TypeError, ValueError, ExceedsLimitError) as e:
+        return abort_and_log(HTTPStatus.BAD_REQUEST, str(e), include_exc_info=True)
+
+    def _frames():
+        for var, fbs in fbs_matrices:
+            yield encode_bundle([(str(var), fbs)])
+
+    frames = _frames()
+    first = next(frames, b"")
+    return Response(itertools.chain([first], frames), HTTPStatus.OK, {"Content-Type": "application/octet-stream"})
+
+
+def search_var_get(request, data_adaptor):
+    """
+    Search the var names and aliases (see Dataset.search_var), eg, for gene name autocompletion,
+    without fetching the var index.  Query params:
+        q: the beginning of the name, ignoring case (required)
+        limit: the maximum number of matches
+    """
+    query = request.args.get("q", "")
+    if query.strip() == "":
+        return abort_and_log(HTTPStatus.BAD_REQUEST, "missing or invalid required parameter q")
+    limit = request.args.get("limit", type=int, default=SEARCH_DEFAULT_LIMIT)
+    if limit is None or limit < 1 or limit > SEARCH_MAX_LIMIT:
+        return abort_and_log(HTTPStatus.BAD_REQUEST, f"limit must be an integer in [1, {SEARCH_MAX_LIMIT}]")
+
+    matches = data_adaptor.search_var(query, limit)
+    return make_response(matches, HTTPStatus.OK, {"Content-Type": "application/json"})
+
+
+def data_obs_get(request, data_adaptor):
+    """
+    Expression of a list of cells across all genes (see Dataset.data_obs_values), eg, to show
+    the top expressed genes of a cell.  Query params:
+        obs-index: the cells (required)
+        top-n: return only the top-n expressed genes of each cell
+    """
+    obs_indices = request.args.getlist("obs-index", type=int)
+    if len(obs_indices) == 0:
+        return abort_and_log(HTTPStatus.BAD_REQUEST, "missing or invalid required parameter obs-index")
+    top_n = request.args.get("top-n", None)
+    if top_n is not None:
+        top_n = request.args.get("top-n", type=int)
+        if top_n is None:
+            return abort_and_log(HTTPStatus.BAD_REQUEST, "top-n must be a positive integer")
+
+    try:
+        values = data_adaptor.data_obs_values(obs_indices, top_n)
+        return make_response(values, HTTPStatus.OK, {"Content-Type": "application/json"})
+    except (ValueError, ExceedsLimitError) as e:
+        return abort_and_log(HTTPStatus.BAD_REQUEST, str(e), include_exc_info=True)
+
+
 def colors_get(data_adaptor):
     if not data_adaptor.dataset_config.presentation__custom_colors:
         return make_response(jsonify({}), HTTPStatus.OK)
@@ -220,7 +461,8 @@ def colors_get(data_adaptor):
         return abort_and_log(HTTPStatus.NOT_FOUND, str(e), include_exc_info=True)
 
 
-def diffexp_obs_post(request, data_adaptor):
+def _diffexp_obs_args(request, data_adaptor):
+    """return the (set1_filter, set2_filter, count, approximate) of a diffexp request, or abort"""
     if not data_adaptor.dataset_config.diffexp__enable:
         return abort(HTTPStatus.NOT_IMPLEMENTED)
 
@@ -233,6 +475,9 @@ def diffexp_obs_post(request, data_adaptor):
 
         set1_filter = args.get("set1", {"filter": {}})["filter"]
         set2_filter = args.get("set2", {"filter": {}})["filter"]
+        approximate = args.get("approximate", False)
+        if not isinstance(approximate, bool):
+            return abort_and_log(HTTPStatus.BAD_REQUEST, "approximate must be a boolean")
         # TODO(#1281): When we simplify the config, we should actually use the config to determine this number,
         #  this will also require an update in the client
         count = 15
@@ -245,11 +490,48 @@ def diffexp_obs_post(request, data_adaptor):
     except (KeyError, TypeError) as e:
         return abort_and_log(HTTPStatus.BAD_REQUEST, str(e), include_exc_info=True)
 
+    return set1_filter, set2_filter, count, approximate
+
+
+def diffexp_obs_post(request, data_adaptor):
+    set1_filter, set2_filter, count, approximate = _diffexp_obs_args(request, data_adaptor)
+    try:
+        diffexp = data_adaptor.diffexp_topN(set1_filter, set2_filter, count, approximate)
+        return make_response(diffexp, HTTPStatus.OK, {"Content-Type": "application/json"})
+    except (ValueError, DisabledFeatureError, FilterError, ExceedsLimitError) as e:
+        return abort_and_log(HTTPStatus.BAD_REQUEST, str(e), include_exc_info=True)
+    except ComputeCancelledError as e:
+        return abort_and_log(e.status_code, str(e), loglevel=logging.INFO)
+    except JSONEncodingValueError:
+        # JSON encoding failure, usually due to bad data. Just let it ripple up
+        # to default exception handler.
+        current_app.logger.warning(JSON_NaN_to_num_warning_msg)
+        raise
+
+
+def diffexp_obs_groups_post(request, data_adaptor):
+    if not data_adaptor.dataset_config.diffexp__enable:
+        return abort(HTTPStatus.NOT_IMPLEMENTED)
+
+    args = request.get_json()
+    try:
+        obs_name = args["obs"]
+        count = args.get("count")
+        if not isinstance(obs_name, str):
+            return abort_and_log(HTTPStatus.BAD_REQUEST, "obs must be the name of an annotation")
+        if count is not None and (not isinstance(count, int) or count < 1):
+            return abort_and_log(HTTPStatus.BAD_REQUEST, "count must be a positive integer")
+
+    except (KeyError, TypeError, AttributeError) as e:
+        return abort_and_log(HTTPStatus.BAD_REQUEST, str(e), include_exc_info=True)
+
     try:
-        diffexp = data_adaptor.diffexp_topN(set1_filter, set2_filter, count)
+        diffexp = data_adaptor.diffexp_groups_topN(obs_name, count)
         return make_response(diffexp, HTTPStatus.OK, {"Content-Type": "application/json"})
     except (ValueError, DisabledFeatureError, FilterError, ExceedsLimitError) as e:
         return abort_and_log(HTTPStatus.BAD_REQUEST, str(e), include_exc_info=True)
+    except ComputeCancelledError as e:
+        return abort_and_log(e.status_code, str(e), loglevel=logging.INFO)
     except JSONEncodingValueError:
         # JSON encoding failure, usually due to bad data. Just let it ripple up
         # to default exception handler.
@@ -282,6 +564,88 @@ def layout_obs_get(request, data_adaptor):
         )
 
 
+def layout_obs_tile_get(request, data_adaptor):
+    """
+    Level-of-detail access to a single layout.  Query params:
+        layout-name: the embedding name (required)
+        z, x, y: the tile (required).  At zoom level z, the layout is divided into 2**z by 2**z tiles.
+        mode: "points" (default) for a density-preserving sample of the cells in the tile, or
+              "counts" for the number of cells in each sub-tile.
+        limit: maximum number of cells returned in "points" mode
+        depth: sub-tiles are at level z+depth in "counts" mode
+    """
+    preferred_mimetype = request.accept_mimetypes.best_match(["application/octet-stream"])
+    if preferred_mimetype != "application/octet-stream":
+        return abort(HTTPStatus.NOT_ACCEPTABLE)
+
+    ename = request.args.get("layout-name", None)
+    z = request.args.get("z", type=int, default=None)
+    x = request.args.get("x", type=int, default=None)
+    y = request.args.get("y", type=int, default=None)
+    mode = request.args.get("mode", default="points")
+    if ename is None or z is None or x is None or y is None or mode not in ("points", "counts"):
+        return abort_and_log(HTTPStatus.BAD_REQUEST, "missing or invalid required parameter")
+
+    try:
+        if mode == "points":
+            limit = request.args.get("limit", type=int, default=LAYOUT_TILE_DEFAULT_LIMIT)
+            fbs = data_adaptor.layout_tile_to_fbs_matrix(ename, z, x, y, limit)
+        else:
+            depth = request.args.get("depth", type=int, default=LAYOUT_TILE_DEFAULT_DEPTH)
+            fbs = data_adaptor.layout_tile_counts_to_fbs_matrix(ename, z, x, y, depth)
+        return make_response(fbs, HTTPStatus.OK, {"Content-Type": "application/octet-stream"})
+    except (KeyError, ValueError, DatasetAccessError) as e:
+        return abort_and_log(HTTPStatus.BAD_REQUEST, str(e), include_exc_info=True)
+
+
+def layout_obs_raster_get(request, data_adaptor):
+    """
+    Overview of a layout, aggregating the cells over a grid (see Dataset.layout_raster_to_fbs_matrix).
+    Query params:
+        layout-name: the embedding name (required)
+        width, height: the size of the grid
+        var-index: the gene, or genes of a gene set, whose expression is aggregated
+        agg: "mean" (default) or "max"
+    """
+    preferred_mimetype = request.accept_mimetypes.best_match(["application/octet-stream"])
+    if preferred_mimetype != "application/octet-stream":
+        return abort(HTTPStatus.NOT_ACCEPTABLE)
+
+    ename = request.args.get("layout-name", None)
+    width = request.args.get("width", type=int, default=LAYOUT_RASTER_DEFAULT_SIZE)
+    height = request.args.get("height", type=int, default=LAYOUT_RASTER_DEFAULT_SIZE)
+    var_indices = request.args.getlist("var-index", type=int)
+    agg = request.args.get("agg", default="mean")
+    if ename is None or width is None or height is None:
+        return abort_and_log(HTTPStatus.BAD_REQUEST, "missing or invalid required parameter")
+
+    try:
+        fbs = data_adaptor.layout_raster_to_fbs_matrix(ename, width, height, var_indices, agg)
+        return make_response(fbs, HTTPStatus.OK, {"Content-Type": "application/octet-stream"})
+    except (KeyError, ValueError, DatasetAccessError, ExceedsLimitError) as e:
+        return abort_and_log(HTTPStatus.BAD_REQUEST, str(e), include_exc_info=True)
+
+
+def layout_obs_selection_post(request, data_adaptor):
+    """
+    Select cells by region of a layout, in normalized layout coordinates.  JSON body:
+        {"layout": <embedding name>, "box": [x0, y0, x1, y1]}, or
+        {"layout": <embedding name>, "polygon": [[x, y], ...]}
+    and optionally "index": true, to also return the selection as an obs index filter.
+    """
+    args = request.get_json()
+    try:
+        return make_response(
+            data_adaptor.select_layout(
+                args["layout"], box=args.get("box"), polygon=args.get("polygon"), index=args.get("index", False)
+            ),
+            HTTPStatus.OK,
+            {"Content-Type": "application/json"},
+        )
+    except (KeyError, TypeError, ValueError, DatasetAccessError) as e:
+        return abort_and_log(HTTPStatus.BAD_REQUEST, str(e), include_exc_info=True)
+
+
 # TODO: I think this is no longer useful, but it is called. So just returning an effectively empty response for now
 def genesets_get(request, data_adaptor):
     preferred_mimetype = request.accept_mimetypes.best_match(["application/json", "text/csv"])
@@ -296,11 +660,8 @@ def genesets_get(request, data_adaptor):
         return abort_and_log(HTTPStatus.BAD_REQUEST, str(e))
 
 
-def summarize_var_helper(request, data_adaptor, key, raw_query):
-    preferred_mimetype = request.accept_mimetypes.best_match(["application/octet-stream"])
-    if preferred_mimetype != "application/octet-stream":
-        return abort(HTTPStatus.NOT_ACCEPTABLE)
-
+def _summarize_var_args(request, key, raw_query):
+    """return the (method, filter, query_hash) of a summarize request, or abort"""
     summary_method = request.values.get("method", default="mean")
 
     def summarizeQueryHash(raw_query):
@@ -317,6 +678,19 @@ def summarize_var_helper(request, data_adaptor, key, raw_query):
 
     try:
         filter = _query_parameter_to_filter(args_filter_only)
+    except FilterError as e:
+        return abort(HTTPStatus.BAD_REQUEST, description=str(e))
+
+    return summary_method, filter, query_hash
+
+
+def summarize_var_helper(request, data_adaptor, key, raw_query):
+    preferred_mimetype = request.accept_mimetypes.best_match(["application/octet-stream"])
+    if preferred_mimetype != "application/octet-stream":
+        return abort(HTTPStatus.NOT_ACCEPTABLE)
+
+    summary_method, filter, query_hash = _summarize_var_args(request, key, raw_query)
+    try:
         return make_response(
             data_adaptor.summarize_var(summary_method, filter, query_hash),
             HTTPStatus.OK,
@@ -335,8 +709,85 @@ def summarize_var_get(request, data_adaptor):
 def summarize_var_post(request, data_adaptor):
     if not request.content_type or "application/x-www-form-urlencoded" not in request.content_type:
         return abort(HTTPStatus.UNSUPPORTED_MEDIA_TYPE)
-    if request.content_length > 1_000_000:  # just a sanity check to avoid memory exhaustion
+    if (request.content_length or 0) > 1_000_000:  # just a sanity check to avoid memory exhaustion
         return abort(HTTPStatus.BAD_REQUEST)
 
     key = request.args.get("key", default=None)
     return summarize_var_helper(request, data_adaptor, key, request.get_data())
+
+
+def _job_response(record, status=HTTPStatus.OK):
+    job = {k: record[k] for k in ("id", "type", "status", "created", "started", "finished", "expires", "error")}
+    return make_response(jsonify(job), status)
+
+
+def jobs_diffexp_obs_post(request, data_adaptor):
+    set1_filter, set2_filter, count, approximate = _diffexp_obs_args(request, data_adaptor)
+    # the request is validated before the job is submitted, so that it fails as /diffexp/obs does
+    try:
+        maskA, maskB, approximation = data_adaptor.diffexp_obs_masks(set1_filter, set2_filter, approximate)
+    except (ValueError, DisabledFeatureError, FilterError, ExceedsLimitError) as e:
+        return abort_and_log(HTTPStatus.BAD_REQUEST, str(e), include_exc_info=True)
+
+    def diffexp(cancel_token):
+        try:
+            result = data_adaptor.diffexp_topN_from_masks(maskA, maskB, approximation, count, cancel_token)
+        except ValueError as e:
+            raise RequestException(str(e))
+        return "application/json", result.encode()
+
+    record = jobs.submit_job("diffexp", data_adaptor.get_location(), diffexp)
+    return _job_response(record, HTTPStatus.ACCEPTED)
+
+
+def jobs_summarize_var_post(request, data_adaptor):
+    if not request.content_type or "application/x-www-form-urlencoded" not in request.content_type:
+        return abort(HTTPStatus.UNSUPPORTED_MEDIA_TYPE)
+    if (request.content_length or 0) > 1_000_000:  # just a sanity check to avoid memory exhaustion
+        return abort(HTTPStatus.BAD_REQUEST)
+
+    key = request.args.get("key", default=None)
+    summary_method, filter, query_hash = _summarize_var_args(request, key, request.get_data())
+
+    def summarize(cancel_token):
+        try:
+            result = data_adaptor.summarize_var(summary_method, filter, query_hash, cancel_token)
+        except ValueError as e:
+            raise RequestException(str(e), HTTPStatus.NOT_FOUND)
+        except UnsupportedSummaryMethod as e:
+            raise RequestException(str(e))
+        return "application/octet-stream", result
+
+    record = jobs.submit_job("summarize_var", data_adaptor.get_location(), summarize)
+    return _job_response(record, HTTPStatus.ACCEPTED)
+
+
+def job_get(data_adaptor, job_id):
+    record = jobs.get_job(job_id, data_adaptor.get_location())
+    if record is None:
+        return abort(HTTPStatus.NOT_FOUND, description="unknown or expired job")
+    return _job_response(record)
+
+
+def job_delete(data_adaptor, job_id):
+    record = jobs.get_job(job_id, data_adaptor.get_location())
+    if record is None:
+        return abort(HTTPStatus.NOT_FOUND, description="unknown or expired job")
+    if not jobs.cancel_job(job_id):
+        return abort(HTTPStatus.CONFLICT, description="job is running on another server")
+    return make_response("", HTTPStatus.NO_CONTENT)
+
+
+def job_result_get(data_adaptor, job_id):
+    record = jobs.get_job(job_id, data_adaptor.get_location())
+    if record is None:
+        return abort(HTTPStatus.NOT_FOUND, description="unknown or expired job")
+    if record["finished"] is None:
+        return abort(HTTPStatus.CONFLICT, description="job is not complete")
+    if record["status"] != JobStatus.SUCCEEDED:
+        return abort(record["status_code"], description=record["error"])
+
+    result = jobs.get_job_result(job_id)
+    if result is None:
+        return abort(HTTPStatus.NOT_FOUND, description="unknown or expired job")
+    return make_response(result, HTTPStatus.OK, {"Content-Type": record["content_type"]})
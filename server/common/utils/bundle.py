@@ -0,0 +1,45 @@
+"""
+A bundle is a simple framed binary encoding of a sequence of named parts, used to return
+several resources in one response.  Each part is encoded as:
+
+    uint32 name length, name (utf-8), uint32 payload length, payload
+
+where all integers are little-endian.  Parts are decoded in the order they were encoded.
+"""
+import struct
+
+_uint32 = struct.Struct("<I")
+
+
+def encode_bundle(parts):
+    """Given an iterable of (name, payload) tuples, where payload is bytes, return the bundle."""
+    chunks = []
+    for name, payload in parts:
+        name = name.encode("utf-8")
+        chunks.extend((_uint32.pack(len(name)), name, _uint32.pack(len(payload)), payload))
+    return b"".join(chunks)
+
+
+def decode_bundle(buf):
+    """
+    Given a bundle, return a list of (name, payload) tuples, in bundle order.  Names need not be
+    unique (eg, a batch may repeat a requested item), so every part is returned.
+    """
+    buf = memoryview(buf)
+    parts = []
+    offset = 0
+    while offset < len(buf):
+        try:
+            (name_len,) = _uint32.unpack_from(buf, offset)
+            offset += _uint32.size
+            name = bytes(buf[offset : offset + name_len]).decode("utf-8")
+            offset += name_len
+            (payload_len,) = _uint32.unpack_from(buf, offset)
+            offset += _uint32.size
+        except struct.error:
+            raise ValueError("truncated bundle")
+        if offset + payload_len > len(buf):
+            raise ValueError("truncated bundle")
+        parts.append((name, bytes(buf[offset : offset + payload_len])))
+        offset += payload_len
+    return parts
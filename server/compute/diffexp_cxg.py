@@ -1,11 +1,28 @@
 import concurrent.futures
-import numpy as np
+import hashlib
+import multiprocessing
+import os
+from collections import OrderedDict, namedtuple
 
+import numpy as np
+import tiledb
 from numba import jit
 
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # python < 3.8
+    shared_memory = None
+
 from server.dataset.cxg_util import pack_selector_from_indices
-from server.common.compute.diffexp_generic import diffexp_ttest_from_mean_var, mean_var_n
-from server.common.errors import ComputeError
+from server.common.compute.diffexp_generic import (
+    diffexp_ttest_from_mean_var,
+    mean_var_grouped,
+    mean_var_masked,
+    sanitize_mean_var,
+)
+from server.common.compute.cancellation import CancellationToken
+from server.common.errors import ComputeCancelledError, ComputeError
+from server.common.lru_kvcache import LRUKVCache
 
 """
 See the comments in diffexp_generic for a description of this algorithm
@@ -14,18 +31,51 @@ This implementation runs directly in-process.  It is multi- threaded, but not pa
 Longer term, will likely move to a distributed framework for this.
 
 There are currently no global throttles on simultaneous workers.
+
+Each computation has a CancellationToken, which the partition workers check before and between
+reads of X.  A computation which exceeds its deadline (the configured timeout), or which is
+cancelled, stops without reading the partitions not yet started.
+
+The partitions are run on a thread pool (the default), or on a pool of worker processes, which
+avoids contention for the GIL in the code surrounding the numba kernels.  Worker processes each own
+a long-lived TileDB context and open arrays.  Partition results are written directly into output
+arrays in shared memory, and large arguments are passed through shared memory, so neither is copied
+through the process pool's pipes.  Process partitions observe the deadline, and explicit cancellation
+through a flag in shared memory.
 """
 
 diffexp_thread_executor = None
+diffexp_process_executor = None
 max_workers = None
 target_workunit = None
+timeout = None
+executor_type = "thread"
+
+# state of a worker process of the process pool
+_worker_tiledb_ctx = None
+_worker_arrays = OrderedDict()  # uri -> open array, in LRU order
+WORKER_ARRAYS_MAX = 16
+
+# seconds between checks for the cancellation of a computation, while waiting for its partitions
+CANCELLATION_POLL_INTERVAL = 0.1
+
+# Per-gene mean and variance of both sets of recent comparisons, keyed by
+# (dataset location, fingerprint of maskA, fingerprint of maskB, X distribution).
+# Repeated comparisons, with any top_n or lfc cutoff, are answered without reading X.
+# Also holds the per-gene statistics of all rows of each dataset, keyed by
+# (dataset location, "totals", X distribution).
+mean_var_cache = LRUKVCache(max_bytes=1 << 28, name="diffexp")
 
 
-def set_config(config_max_workers, config_target_workunit):
+def set_config(config_max_workers, config_target_workunit, config_timeout=None, config_executor="thread"):
     global max_workers
     global target_workunit
+    global timeout
+    global executor_type
     max_workers = config_max_workers
     target_workunit = config_target_workunit
+    timeout = config_timeout
+    executor_type = config_executor
 
 
 def get_thread_executor():
@@ -35,32 +85,275 @@ def get_thread_executor():
     return diffexp_thread_executor
 
 
-def diffexp_ttest(adaptor, maskA, maskB, top_n=8, diffexp_lfc_cutoff=0.01):
+def get_process_executor():
+    """
+    The worker processes are spawned, rather than forked, as the server is multi-threaded.  There
+    is no benefit to more processes than CPUs.
+    """
+    global diffexp_process_executor
+    if diffexp_process_executor is None:
+        from server.dataset.cxg_dataset import CxgDataset
+
+        diffexp_process_executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(max_workers, os.cpu_count()),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker_process,
+            initargs=(CxgDataset.tiledb_ctx.config().dict(),),
+        )
+    return diffexp_process_executor
+
+
+def mask_fingerprint(mask):
+    """return a digest identifying the boolean mask"""
+    return hashlib.sha1(np.packbits(mask)).hexdigest() + f"/{len(mask)}"
+
+
+def diffexp_ttest(adaptor, maskA, maskB, top_n=8, diffexp_lfc_cutoff=0.01, cancel_token=None):
+    if cancel_token is None:
+        cancel_token = CancellationToken(timeout)
+    location = adaptor.get_location()
+    distribution = str(adaptor.get_X_approximate_distribution())
+    fingerprintA = mask_fingerprint(maskA)
+    fingerprintB = mask_fingerprint(maskB)
+
+    # the same comparison, in the opposite direction, shares the statistics
+    mean_var = None
+    swapped_key = (location, fingerprintB, fingerprintA, distribution)
+    if swapped_key in mean_var_cache:
+        mean_var = mean_var_cache.get(swapped_key)
+        if mean_var is not None:
+            meanB, varB, nB, meanA, varA, nA = mean_var
+    if mean_var is None:
+        meanA, varA, nA, meanB, varB, nB = _get_or_create_mean_var(
+            (location, fingerprintA, fingerprintB, distribution),
+            lambda token: mean_var_ab(adaptor, maskA, maskB, token),
+            cancel_token,
+        )
 
+    r = diffexp_ttest_from_mean_var(
+        meanA=meanA,
+        varA=varA,
+        nA=nA,
+        meanB=meanB,
+        varB=varB,
+        nB=nB,
+        top_n=top_n,
+        diffexp_lfc_cutoff=diffexp_lfc_cutoff,
+    )
+
+    return r
+
+
+def diffexp_ttest_groups(adaptor, codes, n_groups, top_n=8, diffexp_lfc_cutoff=0.01, cancel_token=None):
+    """
+    Compare each group of rows to the rest of the dataset.  codes assigns each row to a group
+    in [0, n_groups), or to no group if negative.  Returns a list, with an element per group,
+    of (n, result), where result is as returned by diffexp_ttest.
+    """
+    if cancel_token is None:
+        cancel_token = CancellationToken(timeout)
+    location = adaptor.get_location()
+    distribution = str(adaptor.get_X_approximate_distribution())
+    codes = np.ascontiguousarray(codes, dtype=np.int32)
+    fingerprint = hashlib.sha1(codes).hexdigest() + f"/{n_groups}"
+    groups, rests = _get_or_create_mean_var(
+        (location, "groups", fingerprint, distribution),
+        lambda token: mean_var_groups(adaptor, codes, n_groups, token),
+        cancel_token,
+    )
+
+    results = []
+    for (meanA, varA, nA), (meanB, varB, nB) in zip(groups, rests):
+        r = diffexp_ttest_from_mean_var(
+            meanA=meanA,
+            varA=varA,
+            nA=nA,
+            meanB=meanB,
+            varB=varB,
+            nB=nB,
+            top_n=top_n,
+            diffexp_lfc_cutoff=diffexp_lfc_cutoff,
+        )
+        results.append((nA, r))
+
+    return results
+
+
+def _get_or_create_mean_var(key, compute, cancel_token):
+    """
+    return the cached statistics for key, or compute(cancel_token) them.  Concurrent callers for
+    the same key wait for a single computation (see LRUKVCache.get_or_create), which runs under the
+    token of the caller which started it.  If that computation is cancelled, the waiters, which
+    were not, each retry under their own token.
+    """
+    while True:
+        try:
+            return mean_var_cache.get_or_create(key, lambda key: compute(cancel_token))
+        except ComputeCancelledError:
+            # re-raise if it was this caller which was cancelled
+            cancel_token.check()
+
+
+def mean_var_ab(adaptor, maskA, maskB, cancel_token=None):
+    """
+    return (meanA, varA, nA, meanB, varB, nB), the per-gene statistics of the two sets of rows.
+
+    A set larger than its complement is not read from X:  its statistics are derived from the
+    whole-dataset totals (the statistics of all rows) less those of the complement.  The rows read from
+    X therefore number at most min(|A|, n_obs - |A|) + min(|B|, n_obs - |B|), and a one-vs-rest
+    comparison reads the smaller set only.
+    """
     matrix = adaptor.open_array("X")
-    row_selector_A = np.where(maskA)[0]
-    row_selector_B = np.where(maskB)[0]
-    nA = len(row_selector_A)
-    nB = len(row_selector_B)
+    n_obs = maskA.shape[0]
+
+    # plan, for each set, the rows to read and whether to subtract them from the totals
+    read_masks = []
+    plan = []
+    for mask in (maskA, maskB):
+        complement = 2 * np.count_nonzero(mask) > n_obs
+        read_mask = ~mask if complement else mask
+        for idx, other in enumerate(read_masks):
+            if np.array_equal(other, read_mask):
+                break
+        else:
+            idx = len(read_masks)
+            read_masks.append(read_mask)
+        plan.append((idx, complement))
+
+    # the whole-dataset totals are computed once, lazily, in the same pass as the first
+    # comparison which needs them.
+    totals = None
+    totals_key = (adaptor.get_location(), "totals", str(adaptor.get_X_approximate_distribution()))
+    compute_totals = False
+    if any(complement for _, complement in plan):
+        totals = mean_var_cache.get(totals_key)
+        if totals is None:
+            compute_totals = True
+            read_masks.append(np.ones((n_obs,), dtype=bool))
+
+    stats = mean_var_rows(matrix, read_masks, cancel_token)
+    if compute_totals:
+        totals = stats[-1]
+        mean_var_cache.put(totals_key, totals)
+
+    result = []
+    for idx, complement in plan:
+        mean, var, n = stats[idx]
+        if complement:
+            mean, var, n = mean_var_complement(totals, (mean, var, n))
+        result.append((mean, var, n))
+
+    (meanA, varA, nA), (meanB, varB, nB) = _finalize_mean_var(adaptor, matrix, result)
+    return (meanA, varA, nA, meanB, varB, nB)
+
+
+def mean_var_complement(totals, part):
+    """
+    Given the (mean, var, n) of all rows, and of a subset of the rows, return the (mean, var, n) of
+    the remaining rows.  This inverts the pairwise combination of Chan et al:
+    https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance#Parallel_algorithm
+    """
+    mean_total, var_total, n_total = totals
+    mean_part, var_part, n_part = part
+    n_rest = n_total - n_part
+    if n_rest <= 0:
+        return np.zeros_like(mean_total), np.zeros_like(var_total), 0
+
+    mean_rest = (n_total * mean_total - n_part * mean_part) / n_rest
+    if n_part == 0:
+        return mean_rest, var_total, n_rest
+
+    delta = mean_part - mean_rest
+    m2_rest = var_total * (n_total - 1) - var_part * max(n_part - 1, 0) - delta * delta * (n_part * n_rest / n_total)
+    var_rest = np.maximum(m2_rest, 0) / (n_rest - 1) if n_rest > 1 else np.zeros_like(m2_rest)
+    return mean_rest, var_rest, n_rest
+
+
+def mean_var_combine(parts):
+    """
+    Given the (mean, var, n) of disjoint sets of rows, return the (mean, var, n) of their union,
+    by the pairwise combination of Chan et al (see mean_var_complement).
+    """
+    mean = m2 = None
+    n = 0
+    for part_mean, part_var, part_n in parts:
+        if part_n == 0:
+            continue
+        part_m2 = part_var * (part_n - 1)
+        if n == 0:
+            mean, m2, n = part_mean.astype(np.float64), part_m2.astype(np.float64), part_n
+            continue
+        total_n = n + part_n
+        delta = part_mean - mean
+        mean = mean + delta * (part_n / total_n)
+        m2 = m2 + part_m2 + delta * delta * (n * part_n / total_n)
+        n = total_n
+
+    if n == 0:
+        return 0, 0, 0
+    var = m2 / (n - 1) if n > 1 else np.zeros_like(m2)
+    return mean, var, n
+
+
+def mean_var_groups(adaptor, codes, n_groups, cancel_token=None):
+    """
+    return (groups, rests), each a list with an element per group, of the (mean, var, n) of the
+    group, and of all other rows.  X is read once, in full.
+    """
+    matrix = adaptor.open_array("X")
+    n_obs, cols = matrix.shape
 
-    dtype = matrix.dtype
-    cols = matrix.shape[1]
-    tile_extent = [dim.tile for dim in matrix.schema.domain]
+    # rows assigned to no group are gathered into an extra group, so that the
+    # groups partition the rows and their union is the whole-dataset totals.
+    codes = np.where(codes < 0, n_groups, codes).astype(np.int32)
+    n_sets = n_groups + 1
+    n = np.bincount(codes, minlength=n_sets)
 
-    is_sparse = matrix.schema.sparse
+    col_partitions = _col_partitions(matrix, n_obs * matrix.schema.domain.dim(1).tile)
 
-    if is_sparse:
-        row_selector_A = pack_selector_from_indices(row_selector_A)
-        row_selector_B = pack_selector_from_indices(row_selector_B)
-    else:
-        # The rows from both row_selector_A and row_selector_B are gathered at the
-        # same time, then the mean and variance are computed by subsetting on that
-        # combined submatrix.  Combining the gather reduces number of requests/bandwidth
-        # to the data source.
-        row_selector_AB = np.union1d(row_selector_A, row_selector_B)
-        row_selector_A_in_AB = np.in1d(row_selector_AB, row_selector_A, assume_unique=True)
-        row_selector_B_in_AB = np.in1d(row_selector_AB, row_selector_B, assume_unique=True)
-        row_selector_AB = pack_selector_from_indices(row_selector_AB)
+    if cancel_token is None:
+        cancel_token = CancellationToken(timeout)
+    is_sparse = matrix.schema.sparse
+    with _Partitions(cancel_token) as partitions:
+        mean = partitions.zeros((n_sets, cols))
+        var = partitions.zeros((n_sets, cols))
+        for col_range in col_partitions:
+            if is_sparse:
+                partitions.submit(_mean_var_sparse_groups, matrix, codes, n, col_range, mean, var)
+            else:
+                partitions.submit(_mean_var_groups, matrix, codes, n_sets, col_range, mean, var)
+        mean, var = partitions.gather(mean, var)
+
+    stats = [(mean[g], var[g], int(n[g])) for g in range(n_sets)]
+    totals = mean_var_combine(stats)
+    if n_obs > 0:
+        # the totals are reused by later one-vs-rest comparisons (see mean_var_ab)
+        mean_var_cache.put((adaptor.get_location(), "totals", str(adaptor.get_X_approximate_distribution())), totals)
+    rests = [mean_var_complement(totals, group) for group in stats[0:n_groups]]
+
+    return _finalize_mean_var(adaptor, matrix, stats[0:n_groups]), _finalize_mean_var(adaptor, matrix, rests)
+
+
+def _finalize_mean_var(adaptor, matrix, stats):
+    """
+    Given a list of (mean, var, n) of the values stored in X, return them in the dtype of X, with
+    any column shift applied, and with the non-finite statistics (ie, of columns containing non-finite
+    values) replaced by zero.
+    """
+    X_col_shift = 0
+    if matrix.schema.sparse and adaptor.has_array("X_col_shift"):
+        X_col_shift = adaptor.open_array("X_col_shift")[:]
+
+    result = []
+    for mean, var, n in stats:
+        mean = np.where(np.isfinite(mean), mean, 0) + X_col_shift
+        var = np.where(np.isfinite(var), var, 0)
+        result.append((mean.astype(matrix.dtype), var.astype(matrix.dtype), n))
+    return result
+
+
+def _col_partitions(matrix, cells_per_coltile):
+    """return the (start, stop) column ranges over which to partition a computation on X"""
 
     # because all IO is done per-tile, and we are always col-major,
     # use the tile column size as the unit of partition.  Possibly access
@@ -73,72 +366,301 @@ def diffexp_ttest(adaptor, maskA, maskB, top_n=8, diffexp_lfc_cutoff=0.01):
     # However partitioning the rows is slightly more complex due to the arbitrary distribution
     # of row selections that are passed into this algorithm.
 
-    cells_per_coltile = (nA + nB) * tile_extent[1]
-    cols_per_partition = max(1, int(target_workunit / cells_per_coltile)) * tile_extent[1]
-    col_partitions = [(c, min(c + cols_per_partition, cols)) for c in range(0, cols, cols_per_partition)]
+    cols = matrix.shape[1]
+    col_tile_extent = matrix.schema.domain.dim(1).tile
+    cols_per_partition = max(1, int(target_workunit / max(cells_per_coltile, 1))) * col_tile_extent
+    return [(c, min(c + cols_per_partition, cols)) for c in range(0, cols, cols_per_partition)]
 
-    meanA = np.zeros((cols,), dtype=np.float64)
-    varA = np.zeros((cols,), dtype=np.float64)
-    meanB = np.zeros((cols,), dtype=np.float64)
-    varB = np.zeros((cols,), dtype=np.float64)
 
-    executor = get_thread_executor()
-    futures = []
+def mean_var_rows(matrix, masks, cancel_token=None):
+    """
+    return [(mean, var, n), ...], the per-column statistics of X for each of the row masks, in
+    float64, and ignoring any column shift.
+    """
+    row_selectors = [np.where(mask)[0] for mask in masks]
+    n_rows = [len(row_selector) for row_selector in row_selectors]
 
-    if is_sparse:
-        for cols in col_partitions:
-            futures.append(executor.submit(_mean_var_sparse_ab, matrix, row_selector_A, nA, row_selector_B, nB, cols))
-    else:
-        for cols in col_partitions:
-            futures.append(
-                executor.submit(_mean_var_ab, matrix, row_selector_AB, row_selector_A_in_AB, row_selector_B_in_AB, cols)
-            )
+    cols = matrix.shape[1]
+    tile_extent = [dim.tile for dim in matrix.schema.domain]
 
-    for future in futures:
-        # returns tuple: (meanA, varA, meanB, varB, cols)
-        try:
-            result = future.result()
-            part_meanA, part_varA, part_meanB, part_varB, cols = result
-            meanA[cols[0] : cols[1]] += part_meanA
-            varA[cols[0] : cols[1]] += part_varA
-            meanB[cols[0] : cols[1]] += part_meanB
-            varB[cols[0] : cols[1]] += part_varB
-        except Exception as e:
-            for future in futures:
-                future.cancel()
-            raise ComputeError(str(e))
+    is_sparse = matrix.schema.sparse
 
     if is_sparse:
-        if adaptor.has_array("X_col_shift"):
-            X_col_shift = adaptor.open_array("X_col_shift")[:]
-            meanA += X_col_shift
-            meanB += X_col_shift
-
-    r = diffexp_ttest_from_mean_var(
-        meanA=meanA.astype(dtype),
-        varA=varA.astype(dtype),
-        nA=nA,
-        meanB=meanB.astype(dtype),
-        varB=varB.astype(dtype),
-        nB=nB,
-        top_n=top_n,
-        diffexp_lfc_cutoff=diffexp_lfc_cutoff,
-    )
-
-    return r
-
-
-def _mean_var_ab(matrix, row_selector_AB, row_selector_A_in_AB, row_selector_B_in_AB, col_range):
-    X = matrix.multi_index[row_selector_AB, col_range[0] : col_range[1] - 1][""]
-    meanA, varA, n = mean_var_n(X[row_selector_A_in_AB])
-    meanB, varB, n = mean_var_n(X[row_selector_B_in_AB])
-    return (meanA, varA, meanB, varB, col_range)
-
-
-def _mean_var_sparse_ab(matrix, row_selector_A, nrows_A, row_selector_B, nrows_B, col_range):
-    meanA, varA = _mean_var_sparse(matrix, row_selector_A, nrows_A, col_range)
-    meanB, varB = _mean_var_sparse(matrix, row_selector_B, nrows_B, col_range)
-    return (meanA, varA, meanB, varB, col_range)
+        row_selectors = [pack_selector_from_indices(row_selector) for row_selector in row_selectors]
+        cells_per_coltile = sum(n_rows) * tile_extent[1]
+    else:
+        # The rows from all row selectors are gathered at the same time, then the mean and
+        # variance are computed by subsetting on that combined submatrix.  Combining the gather
+        # reduces number of requests/bandwidth to the data source.
+        row_selector_union = row_selectors[0]
+        for row_selector in row_selectors[1:]:
+            row_selector_union = np.union1d(row_selector_union, row_selector)
+        row_selectors_in_union = [
+            np.in1d(row_selector_union, row_selector, assume_unique=True) for row_selector in row_selectors
+        ]
+        n_union = len(row_selector_union)
+        row_selector_union = pack_selector_from_indices(row_selector_union)
+        cells_per_coltile = n_union * tile_extent[1]
+
+    col_partitions = _col_partitions(matrix, cells_per_coltile)
+
+    if cancel_token is None:
+        cancel_token = CancellationToken(timeout)
+    with _Partitions(cancel_token) as partitions:
+        means = partitions.zeros((len(masks), cols))
+        variances = partitions.zeros((len(masks), cols))
+        if is_sparse:
+            for col_range in col_partitions:
+                partitions.submit(_mean_var_sparse_rows, matrix, row_selectors, n_rows, col_range, means, variances)
+        elif n_union > 0:
+            membership = np.column_stack(row_selectors_in_union)
+            for col_range in col_partitions:
+                partitions.submit(_mean_var_rows, matrix, row_selector_union, membership, col_range, means, variances)
+        means, variances = partitions.gather(means, variances)
+
+    return list(zip(means, variances, n_rows))
+
+
+def _results(futures, cancel_token):
+    """
+    Yield the result of each of the futures, in order.  If any fails, or the computation is
+    cancelled or exceeds its deadline, cancel the remaining futures and raise.  The token is
+    checked at least every CANCELLATION_POLL_INTERVAL seconds while waiting, as tasks in
+    worker processes can not observe its explicit cancellation themselves.
+    """
+    try:
+        for future in futures:
+            while True:
+                timeout = CANCELLATION_POLL_INTERVAL
+                remaining = cancel_token.remaining()
+                if remaining is not None:
+                    timeout = min(remaining, timeout)
+                try:
+                    result = future.result(timeout=timeout)
+                    break
+                except concurrent.futures.TimeoutError:
+                    cancel_token.check()
+            yield result
+    except Exception as e:
+        cancel_token.cancel()
+        for future in futures:
+            future.cancel()
+        if isinstance(e, ComputeCancelledError):
+            raise
+        raise ComputeError(str(e))
+
+
+_SharedArray = namedtuple("_SharedArray", ["name", "shape", "dtype"])
+
+
+class _Partitions(object):
+    """
+    The partition tasks of one computation, run on the configured executor.  Each task is called
+    as fn(matrix, *args, cancel_token), and writes its results into output arrays (see zeros())
+    common to all tasks.
+
+    With the process executor, the output arrays, and the ndarray arguments of the tasks, are
+    placed in shared memory, which is released when the computation completes.  The tasks are
+    cancelled through a flag, also in shared memory.  On exit, the tasks not yet started are
+    cancelled, and those started are stopped (by the flag) and waited for, so that no task uses
+    the shared memory once it is released.
+    """
+
+    def __init__(self, cancel_token):
+        self.cancel_token = cancel_token
+        self.use_processes = executor_type == "process"
+        self.futures = []
+        self.blocks = []  # SharedMemory
+        self.shared = {}  # id(ndarray) -> (ndarray, _SharedArray)
+        self.cancel_flag = None  # (ndarray, _SharedArray), set to cancel the process tasks
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.use_processes:
+            if self.cancel_flag is not None:
+                self.cancel_flag[0][0] = 1
+            for future in self.futures:
+                future.cancel()
+            concurrent.futures.wait(self.futures)
+        self.cancel_flag = None
+        self.shared.clear()
+        for block in self.blocks:
+            block.unlink()
+            try:
+                block.close()
+            except BufferError:
+                pass  # an output array is still referenced (eg, on error), and will unmap the block when freed
+        self.blocks.clear()
+
+    def zeros(self, shape):
+        if not self.use_processes:
+            return np.zeros(shape, dtype=np.float64)
+        array, _ = self._allocate(shape, np.float64)
+        array[...] = 0
+        return array
+
+    def _allocate(self, shape, dtype):
+        dtype = np.dtype(dtype)
+        block = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * dtype.itemsize))
+        self.blocks.append(block)
+        array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        self.shared[id(array)] = (array, _SharedArray(block.name, shape, dtype.str))
+        return array, self.shared[id(array)][1]
+
+    def _share(self, arg):
+        if not isinstance(arg, np.ndarray):
+            return arg
+        if id(arg) not in self.shared:
+            array, _ = self._allocate(arg.shape, arg.dtype)
+            array[...] = arg
+            self.shared[id(arg)] = (arg, self.shared[id(array)][1])
+        return self.shared[id(arg)][1]
+
+    def submit(self, fn, matrix, *args):
+        if self.use_processes:
+            if self.cancel_flag is None:
+                self.cancel_flag = self._allocate((1,), np.uint8)
+                self.cancel_flag[0][0] = 0
+            args = tuple(self._share(arg) for arg in args)
+            future = get_process_executor().submit(
+                _run_in_worker_process, fn, matrix.uri, args, self.cancel_token.remaining(), self.cancel_flag[1]
+            )
+        else:
+            future = get_thread_executor().submit(fn, matrix, *args, self.cancel_token)
+        self.futures.append(future)
+
+    def gather(self, *outputs):
+        """wait for all tasks to complete, and return (copies of) the output arrays"""
+        for _ in _results(self.futures, self.cancel_token):
+            pass
+        if self.use_processes:
+            return tuple(np.array(output) for output in outputs)
+        return outputs
+
+
+def _init_worker_process(tiledb_ctx_params):
+    global _worker_tiledb_ctx
+    _worker_tiledb_ctx = tiledb.Ctx(tiledb_ctx_params)
+
+
+def _worker_open_array(uri):
+    from server.dataset.cxg_dataset import CxgDataset
+
+    array = _worker_arrays.pop(uri, None)
+    if array is None:
+        array = CxgDataset._open_array(uri, _worker_tiledb_ctx)
+    _worker_arrays[uri] = array
+    while len(_worker_arrays) > WORKER_ARRAYS_MAX:
+        _, evicted = _worker_arrays.popitem(last=False)
+        evicted.close()
+    return array
+
+
+class _WorkerCancellationToken(CancellationToken):
+    """the CancellationToken of a task in a worker process, also cancelled by a flag in shared memory"""
+
+    def __init__(self, timeout, flag):
+        super().__init__(timeout)
+        self.flag = flag
+
+    @property
+    def cancelled(self):
+        if self.flag[0]:
+            self.event.set()
+        return super().cancelled
+
+
+def _run_in_worker_process(fn, uri, args, timeout, cancel_flag):
+    """run the partition task fn in a worker process, attaching its shared array arguments"""
+    blocks = []
+
+    def attach(arg):
+        if not isinstance(arg, _SharedArray):
+            return arg
+        block = shared_memory.SharedMemory(name=arg.name)
+        blocks.append(block)
+        return np.ndarray(arg.shape, dtype=arg.dtype, buffer=block.buf)
+
+    try:
+        cancel_token = _WorkerCancellationToken(timeout, attach(cancel_flag))
+        cancel_token.check()
+        attached = [attach(arg) for arg in args]
+        fn(_worker_open_array(uri), *attached, cancel_token)
+    finally:
+        # the views of the shared memory must be released before it is closed
+        attached = cancel_token = None
+        for block in blocks:
+            try:
+                block.close()
+            except BufferError:
+                pass  # still referenced by the traceback of an error, and unmapped when it is freed
+
+
+def _mean_var_rows(matrix, row_selector_union, membership, col_range, out_mean, out_var, cancel_token):
+    cancel_token.check()
+    X = matrix.multi_index[row_selector_union, col_range[0] : col_range[1] - 1][""]
+    cancel_token.check()
+    # all sets are computed from the gathered rows, in place
+    mean, var = mean_var_masked(X, membership, nonfinite=np.nan)
+    out_mean[:, col_range[0] : col_range[1]] = mean
+    out_var[:, col_range[0] : col_range[1]] = var
+
+
+def _mean_var_sparse_rows(matrix, row_selectors, n_rows, col_range, out_mean, out_var, cancel_token):
+    for i, (row_selector, nrows) in enumerate(zip(row_selectors, n_rows)):
+        cancel_token.check()
+        if nrows > 0:
+            mean, var = _mean_var_sparse(matrix, row_selector, nrows, col_range)
+            out_mean[i, col_range[0] : col_range[1]] = mean
+            out_var[i, col_range[0] : col_range[1]] = var
+
+
+def _mean_var_groups(matrix, codes, n_groups, col_range, out_mean, out_var, cancel_token):
+    cancel_token.check()
+    X = matrix.multi_index[:, col_range[0] : col_range[1] - 1][""]
+    cancel_token.check()
+    mean, var, _ = mean_var_grouped(X, codes, n_groups, nonfinite=np.nan)
+    out_mean[:, col_range[0] : col_range[1]] = mean
+    out_var[:, col_range[0] : col_range[1]] = var
+
+
+def _mean_var_sparse_groups(matrix, codes, n, col_range, out_mean, out_var, cancel_token):
+    cancel_token.check()
+    data = matrix.multi_index[:, col_range[0] : col_range[1] - 1]
+    cancel_token.check()
+    x = data[""]
+    coords = data.get("coords", data)
+    obs = coords["obs"]
+    var = coords["var"] - col_range[0]
+    mean, v = _mean_var_sparse_groups_numba(x, obs, var, codes, n, col_range[1] - col_range[0])
+    sanitize_mean_var(mean, v, n, nonfinite=np.nan)
+    out_mean[:, col_range[0] : col_range[1]] = mean
+    out_var[:, col_range[0] : col_range[1]] = v
+
+
+@jit(nopython=True, nogil=True, error_model="numpy")
+def _mean_var_sparse_groups_numba(x, obs, var, codes, n, ncols):
+    """as _mean_var_sparse_numba, for each group of rows"""
+    n_groups = n.shape[0]
+    mean = np.zeros((n_groups, ncols), dtype=np.float64)
+    for row, col, val in zip(obs, var, x):
+        mean[codes[row], col] += val
+    for g in range(n_groups):
+        mean[g, :] /= n[g]
+
+    sumsq = np.empty_like(mean)
+    for g in range(n_groups):
+        sumsq[g, :] = n[g] * np.multiply(mean[g, :], mean[g, :])
+    for row, col, val in zip(obs, var, x):
+        g = codes[row]
+        sumsq[g, col] += val * (val - 2 * mean[g, col])
+
+    v = np.empty_like(sumsq)
+    for g in range(n_groups):
+        v[g, :] = sumsq[g, :] / (n[g] - 1)
+    return mean, v
 
 
 @jit(nopython=True)
@@ -179,21 +701,8 @@ def _mean_var_sparse(matrix, selector, nrows, col_range):
     # will become the index into the mean and var arrays.
     var -= col_range[0]
 
-    fp_err_occurred = False
-
-    def fp_err_set(err, flag):
-        nonlocal fp_err_occurred
-        fp_err_occurred = True
-
     ncols = col_range[1] - col_range[0]
-    with np.errstate(divide="call", invalid="call", call=fp_err_set):
-        mean, v = _mean_var_sparse_numba(x, var, nrows, ncols)
-
-    if fp_err_occurred:
-        mean[np.isfinite(mean) == False] = 0  # noqa: E712
-        v[np.isfinite(v) == False] = 0  # noqa: E712
-    else:
-        mean[np.isnan(mean)] = 0
-        v[np.isnan(v)] = 0
+    mean, v = _mean_var_sparse_numba(x, var, nrows, ncols)
+    sanitize_mean_var(mean[np.newaxis], v[np.newaxis], np.array([nrows]), nonfinite=np.nan)
 
     return mean, v
@@ -1,3 +1,4 @@
+import concurrent.futures
 import json
 import logging
 import os
@@ -7,17 +8,19 @@ import numpy as np
 import pandas as pd
 import tiledb
 from server_timing import Timing as ServerTiming
-from tiledb import TileDBError
 
-from server.common.constants import XApproximateDistribution
-from server.common.errors import DatasetAccessError, ConfigurationError
-from server.common.fbs.matrix import encode_matrix_fbs
+from server.common.constants import Axis, XApproximateDistribution
+from server.common.errors import ComputeCancelledError, DatasetAccessError, ConfigurationError
+from server.common.fbs.matrix import encode_columns_fbs
 from server.common.immutable_kvcache import ImmutableKVCache
 from server.common.utils.type_conversion_utils import get_schema_type_hint_from_dtype
 from server.common.utils.utils import path_join
 from server.compute import diffexp_cxg
-from server.dataset.cxg_util import pack_selector_from_mask
-from server.dataset.dataset import Dataset
+from server.dataset.cxg_util import pack_selector_from_mask, pack_selector_from_indices
+from server.dataset.dataset import Dataset, get_io_executor
+
+# Maximum number of vars read together by get_X_row_means()
+ROW_MEANS_VAR_CHUNK_MAX = 64
 
 
 class CxgDataset(Dataset):
@@ -204,13 +207,27 @@ class CxgDataset(Dataset):
         array = self.open_array(f"emb/{ename}")
         return array[:, 0:dims]
 
-    def compute_diffexp_ttest(self, maskA, maskB, top_n=None, lfc_cutoff=None):
+    def compute_diffexp_ttest(self, maskA, maskB, top_n=None, lfc_cutoff=None, cancel_token=None):
         if top_n is None:
             top_n = self.dataset_config.diffexp__top_n
         if lfc_cutoff is None:
             lfc_cutoff = self.dataset_config.diffexp__lfc_cutoff
         return diffexp_cxg.diffexp_ttest(
-            adaptor=self, maskA=maskA, maskB=maskB, top_n=top_n, diffexp_lfc_cutoff=lfc_cutoff
+            adaptor=self,
+            maskA=maskA,
+            maskB=maskB,
+            top_n=top_n,
+            diffexp_lfc_cutoff=lfc_cutoff,
+            cancel_token=cancel_token,
+        )
+
+    def compute_diffexp_groups_ttest(self, codes, n_groups, top_n=None, lfc_cutoff=None):
+        if top_n is None:
+            top_n = self.dataset_config.diffexp__top_n
+        if lfc_cutoff is None:
+            lfc_cutoff = self.dataset_config.diffexp__lfc_cutoff
+        return diffexp_cxg.diffexp_ttest_groups(
+            adaptor=self, codes=codes, n_groups=n_groups, top_n=top_n, diffexp_lfc_cutoff=lfc_cutoff
         )
 
     def get_colors(self):
@@ -287,6 +304,119 @@ class CxgDataset(Dataset):
                 data = X.multi_index[obs_items, var_items][""]
             return data
 
+    def get_X_row_means(self, var_mask, cancel_token=None):
+        """
+        The selected columns of X are read in chunks of at most ROW_MEANS_VAR_CHUNK_MAX vars, each
+        within a single var tile, on the io thread pool.  The row sums of each chunk are accumulated
+        directly from the stored values (the coordinates of sparse X), so the memory used is
+        proportional to n_obs, and not to the number of selected vars.  The column shift of sparse X
+        adds a constant, the mean shift of the selected vars.  The cancel_token, if given, is checked
+        before each chunk is read, and once cancelled, the chunks not yet started are not read.
+        """
+        X = self.open_array("X")
+        n_obs = X.shape[0]
+        var_indices = np.flatnonzero(var_mask)
+        tiles = var_indices // X.schema.domain.dim(1).tile
+        chunks = [
+            chunk[i : i + ROW_MEANS_VAR_CHUNK_MAX]
+            for chunk in np.split(var_indices, np.flatnonzero(np.diff(tiles)) + 1)
+            for i in range(0, len(chunk), ROW_MEANS_VAR_CHUNK_MAX)
+        ]
+
+        def row_sums(chunk):
+            if cancel_token is not None:
+                cancel_token.check()
+            data = X.multi_index[:, pack_selector_from_indices(chunk)]
+            if X.schema.sparse:
+                return np.bincount(data.get("coords", data)["obs"], weights=data[""], minlength=n_obs)
+            return data[""].sum(axis=1, dtype=np.float64)
+
+        sums = np.zeros((n_obs,), dtype=np.float64)
+        futures = [get_io_executor().submit(row_sums, chunk) for chunk in chunks]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                sums += future.result()
+        except ComputeCancelledError:
+            for future in futures:
+                future.cancel()
+            raise
+
+        mean = sums / len(var_indices)
+        if X.schema.sparse and self.has_array("X_col_shift"):
+            X_col_shift = self.open_array("X_col_shift").multi_index[pack_selector_from_indices(var_indices)][""]
+            mean += X_col_shift.mean(dtype=np.float64)
+        return mean.astype(X.dtype)[:, np.newaxis]
+
+    def get_X_column_values(self, var):
+        """sparse X returns only its stored values, the others being zero (plus the column shift)"""
+        X = self.open_array("X")
+        if not X.schema.sparse:
+            return super().get_X_column_values(var)
+
+        data = X.multi_index[:, int(var)]
+        obs, values = data.get("coords", data)["obs"], data[""]
+        implicit = X.dtype.type(0)
+        if self.has_array("X_col_shift"):
+            X_col_shift = self.open_array("X_col_shift").multi_index[int(var)][""][0]
+            values = (values + X_col_shift).astype(X.dtype)
+            implicit = X.dtype.type(X_col_shift)
+        return obs, values, implicit
+
+    def get_X_row_values(self, obs_indices):
+        """
+        sparse X returns only its stored values, read in a single (row major) query of the selected rows.
+        With a column shift, every value may be non-zero, and the rows are read densely.
+        """
+        X = self.open_array("X")
+        if not X.schema.sparse or self.has_array("X_col_shift"):
+            return super().get_X_row_values(obs_indices)
+
+        data = X.multi_index[pack_selector_from_indices(obs_indices), :]
+        coords = data.get("coords", data)
+        obs, var, values = coords["obs"].astype(np.int64), coords["var"].astype(np.int64), data[""]
+        nonzero = values != 0
+        order = np.lexsort((var[nonzero], obs[nonzero]))
+        return obs[nonzero][order], var[nonzero][order], values[nonzero][order]
+
+    def get_X_row_reductions(self, start, stop, subset_masks):
+        """
+        sparse X is reduced directly from its stored values (the coordinates), without densifying the
+        rows.  The column shift adds, to every row, the sum of the shifts of the vars reduced, and makes
+        non-zero the values not stored for vars with a non-zero shift.
+        """
+        X = self.open_array("X")
+        if not X.schema.sparse:
+            return super().get_X_row_reductions(start, stop, subset_masks)
+
+        n_rows = stop - start
+        data = X.multi_index[start : stop - 1, :]
+        coords = data.get("coords", data)
+        rows, var, values = coords["obs"] - start, coords["var"], data[""].astype(np.float64)
+        total = np.bincount(rows, weights=values, minlength=n_rows)
+        subset_totals = np.zeros((n_rows, len(subset_masks)))
+        for k, mask in enumerate(subset_masks):
+            subset_totals[:, k] = np.bincount(rows, weights=values * mask[var], minlength=n_rows)
+
+        if self.has_array("X_col_shift"):
+            X_col_shift = self.open_array("X_col_shift")[:].astype(np.float64)
+            shifted = X_col_shift[var] != 0
+            n_nonzero = np.bincount(rows, weights=(values + X_col_shift[var]) != 0, minlength=n_rows)
+            n_nonzero += np.count_nonzero(X_col_shift) - np.bincount(rows, weights=shifted, minlength=n_rows)
+            total += X_col_shift.sum()
+            for k, mask in enumerate(subset_masks):
+                subset_totals[:, k] += X_col_shift[mask].sum()
+        else:
+            n_nonzero = np.bincount(rows, weights=values != 0, minlength=n_rows)
+        return total, n_nonzero.astype(np.int64), subset_totals
+
+    def get_X_var_tile_extent(self):
+        X = self.open_array("X")
+        return int(X.schema.domain.dim(1).tile)
+
+    def get_X_obs_tile_extent(self):
+        X = self.open_array("X")
+        return int(X.schema.domain.dim(0).tile)
+
     def get_X_approximate_distribution(self) -> XApproximateDistribution:
         return self.X_approximate_distribution
 
@@ -334,7 +464,7 @@ class CxgDataset(Dataset):
     def get_obs_keys(self):
         obs = self.open_array("obs")
         schema = obs.schema
-        return [attr.name for attr in schema]
+        return [attr.name for attr in schema] + [column["name"] for column in self.get_virtual_obs_schema()]
 
     def get_var_keys(self):
         var = self.open_array("var")
@@ -379,6 +509,8 @@ class CxgDataset(Dataset):
                 else:
                     schema.update(get_schema_type_hint_from_dtype(attr.dtype))
                 cols.append(schema)
+            if ax == "obs":
+                cols += self.get_virtual_obs_schema()
 
             annotations[ax] = dict(columns=cols)
 
@@ -401,23 +533,19 @@ class CxgDataset(Dataset):
         return self.schema
 
     def annotation_to_fbs_matrix(self, axis, fields=None):
-        with ServerTiming.time(f"annotations.{axis}.query"):
-            A = self.open_array(str(axis))
+        keys = self.get_obs_keys() if axis == Axis.OBS else self.get_var_keys()
+        if not fields:
+            fields = keys
+        unknown = [name for name in fields if name not in keys]
+        if unknown:
+            raise KeyError(f"unknown {axis} annotation: {', '.join(unknown)}")
 
-            try:
-                if not fields:
-                    data = A[:]
-                else:
-                    data = A.query(attrs=fields)[:]
-
-                df = pd.DataFrame.from_dict(data)
-
-                if fields:
-                    df = df[fields]
-            except TileDBError as e:
-                raise KeyError(e)
+        with ServerTiming.time(f"annotations.{axis}.query"):
+            columns = self.get_annotation_columns(axis, fields)
 
         with ServerTiming.time(f"annotations.{axis}.encode"):
-            fbs = encode_matrix_fbs(df, col_idx=df.columns)
+            n_rows = self.get_shape()[0 if axis == Axis.OBS else 1]
+            columns = [pd.Series(col, copy=False) for col in columns]
+            fbs = encode_columns_fbs(columns, n_rows=n_rows, col_idx=pd.Index(fields))
 
         return fbs
@@ -1,3 +1,6 @@
+import concurrent.futures
+import hashlib
+import json
 from abc import ABCMeta, abstractmethod
 from os.path import basename, splitext
 
@@ -7,16 +10,70 @@ from scipy import sparse
 from server_timing import Timing as ServerTiming
 
 from server.common.config.app_config import AppConfig
-from server.common.constants import Axis, XApproximateDistribution
+from server.common.constants import Axis, LAYOUT_RASTER_MAX_SIZE, VIRTUAL_OBS_GENE_SUBSETS, XApproximateDistribution
 from server.common.errors import (
+    ComputeCancelledError,
     FilterError,
     JSONEncodingValueError,
     ExceedsLimitError,
     UnsupportedSummaryMethod,
     DatasetAccessError,
 )
+from server.common.compute.diffexp_generic import subsample_mask
+from server.common.compute.layout_index import LayoutIndex
+from server.common.compute.name_index import NameIndex
+from server.common.compute.quantile_sketch import QuantileSketch
+from server.common.lru_kvcache import LRUKVCache
 from server.common.utils.utils import jsonify_numpy
-from server.common.fbs.matrix import encode_matrix_fbs
+from server.common.fbs.matrix import encode_matrix_fbs, encode_columns_fbs
+
+"""
+Reads which are independent of each other (eg, several embeddings) are issued
+concurrently on a shared, bounded thread pool.  The underlying storage engine
+releases the GIL while reading, so threads are sufficient to overlap the I/O.
+"""
+io_thread_executor = None
+io_max_workers = None
+
+# Normalized layouts, their spatial indices and raster bins, keyed by (dataset location, embedding
+# name[, "index" | "raster", width, height]).  Shared by all requests, as the data adaptor is
+# re-opened for each request.
+layout_cache = LRUKVCache(max_bytes=1 << 30, name="layout")
+
+# Maximum number of vars read together by data_var_batch_to_fbs_matrices()
+VAR_BATCH_GROUP_MAX = 16
+
+# Spatial selections (see select_layout), as packed bitmasks keyed by (dataset location, handle).
+selection_cache = LRUKVCache(max_bytes=1 << 26, name="selection")
+
+# Encoded gene set summaries (see summarize_var), keyed by (dataset location, query hash, method).
+# The query hash identifies the filter, and is common to the GET and POST forms of the request.
+# Also holds obs annotation and gene expression summaries (see summarize_obs and
+# summarize_var_distribution), keyed by (dataset location, axis, name or var index, bins[,
+# quantiles], selection handle), and per-category gene expression (see summarize_var_groups and
+# summarize_var_quantiles), keyed by (dataset location, "var", var index, "groups" or "sketch",
+# obs name).
+summarize_cache = LRUKVCache(max_bytes=1 << 26, name="summarize")
+
+# Decoded obs and var annotation columns (see get_annotation_columns), keyed by (dataset
+# location, axis, name), and their factorizations (see get_annotation_codes), keyed by (dataset
+# location, axis, name, "codes").  Shared by annotation encoding, filters and summaries.
+# Also holds the var name search index (see get_var_name_index), keyed by (dataset location,
+# "var", "name_index"), and the virtual obs annotations (see get_virtual_obs_columns), keyed by
+# (dataset location, "obs", "virtual").
+column_cache = LRUKVCache(max_bytes=1 << 28, name="column")
+
+
+def set_io_config(config_io_max_workers):
+    global io_max_workers
+    io_max_workers = config_io_max_workers
+
+
+def get_io_executor():
+    global io_thread_executor
+    if io_thread_executor is None:
+        io_thread_executor = concurrent.futures.ThreadPoolExecutor(max_workers=io_max_workers)
+    return io_thread_executor
 
 
 class Dataset(metaclass=ABCMeta):
@@ -162,6 +219,153 @@ class Dataset(metaclass=ABCMeta):
         """
         pass
 
+    def get_annotation_columns(self, axis, names):
+        """
+        return the named obs or var annotation columns, as a list of 1D arrays.  Columns are
+        decoded on first use (when several are missing, they are read concurrently) and are
+        cached across requests.  The results must not be modified.
+
+        Virtual obs annotations are served from get_virtual_obs_columns(), which caches them
+        together, and are computed in the calling thread, as the computation itself uses the I/O
+        thread pool.
+        """
+        query = self.query_obs_array if axis == Axis.OBS else self.query_var_array
+        virtual = {column["name"] for column in self.get_virtual_obs_schema()} if axis == Axis.OBS else set()
+        location = self.get_location()
+
+        def _get(name):
+            if name in virtual:
+                return self.get_virtual_obs_columns()[name]
+            return column_cache.get_or_create((location, str(axis), name), lambda key: query(name))
+
+        missing = [name for name in names if name not in virtual and (location, str(axis), name) not in column_cache]
+        loaded = dict(zip(missing, get_io_executor().map(_get, missing))) if len(missing) > 1 else {}
+        return [loaded[name] if name in loaded else _get(name) for name in names]
+
+    def get_annotation_codes(self, axis, name):
+        """
+        return the factorization of the named annotation column, as (codes, uniques):  the index
+        into uniques of each value, or -1 for missing values.  Cached across requests.
+        """
+
+        def _factorize(key):
+            codes, uniques = pd.factorize(self.get_annotation_columns(axis, [name])[0])
+            return codes, np.asarray(uniques)
+
+        return column_cache.get_or_create((self.get_location(), str(axis), name, "codes"), _factorize)
+
+    def get_virtual_obs_schema(self):
+        """
+        return the schema of the virtual obs annotations, if enabled:  per-cell QC metrics computed
+        from X (see get_virtual_obs_columns).  Those named as a stored obs annotation are omitted.
+        """
+        if not self.dataset_config.virtual_obs__enable:
+            return []
+        columns = [("total_counts", "float32"), ("n_genes_by_counts", "int32")]
+        columns += [(f"pct_counts_{subset}", "float32") for subset in VIRTUAL_OBS_GENE_SUBSETS]
+        stored = set(self.get_obs_columns())
+        return [
+            dict(name=name, writable=False, type=type, virtual=True) for name, type in columns if name not in stored
+        ]
+
+    def get_virtual_obs_columns(self):
+        """
+        return the virtual obs annotations, as a dict of name: 1D array.  These are:
+            total_counts: the sum of each cell's X row
+            n_genes_by_counts: the number of non-zero values in each cell's X row
+            pct_counts_<subset>: the percentage of total_counts from a subset of the genes (see
+                VIRTUAL_OBS_GENE_SUBSETS), or NaN if total_counts is zero
+        All are computed by a single pass over X (see reduce_X_rows), and are cached across requests.
+        """
+
+        def _compute(key):
+            schema = self.get_schema()["annotations"]["var"]
+            names = pd.Series(self.get_annotation_columns(Axis.VAR, [schema["index"]])[0], copy=False)
+            names = names.astype(str).str.upper()
+            subset_masks = [names.str.startswith(prefixes).to_numpy() for prefixes in VIRTUAL_OBS_GENE_SUBSETS.values()]
+            total, n_nonzero, subset_totals = self.reduce_X_rows(subset_masks)
+            columns = dict(total_counts=total.astype(np.float32), n_genes_by_counts=n_nonzero.astype(np.int32))
+            with np.errstate(divide="ignore", invalid="ignore"):
+                for k, subset in enumerate(VIRTUAL_OBS_GENE_SUBSETS):
+                    pct = np.where(total != 0, 100 * subset_totals[:, k] / total, np.nan)
+                    columns[f"pct_counts_{subset}"] = pct.astype(np.float32)
+            return columns
+
+        return column_cache.get_or_create((self.get_location(), str(Axis.OBS), "virtual"), _compute)
+
+    def reduce_X_rows(self, subset_masks):
+        """
+        Streaming row reductions of X:  returns (total, n_nonzero, subset_totals), the sum and the
+        number of non-zero values of each row, and the sum of each row over the vars selected by
+        each of subset_masks (shape (n_obs, len(subset_masks))).
+
+        X is read in chunks of rows aligned with the X storage tiles, concurrently on the I/O
+        thread pool, and each chunk is reduced as it is read (see get_X_row_reductions), so that
+        the memory used is proportional to a single chunk.
+        """
+        n_obs = self.get_shape()[0]
+        tile_extent = self.get_X_obs_tile_extent() or n_obs
+        chunks = [(start, min(start + tile_extent, n_obs)) for start in range(0, n_obs, tile_extent)]
+        results = list(get_io_executor().map(lambda chunk: self.get_X_row_reductions(*chunk, subset_masks), chunks))
+        if not results:
+            return np.zeros((0,)), np.zeros((0,), dtype=np.int64), np.zeros((0, len(subset_masks)))
+        return tuple(np.concatenate(parts) for parts in zip(*results))
+
+    def get_X_row_reductions(self, start, stop, subset_masks):
+        """
+        return the reductions (see reduce_X_rows) of the rows [start, stop) of X.  By default, the
+        rows are read densely.
+        """
+        obs_mask = np.zeros((self.get_shape()[0],), dtype=np.bool_)
+        obs_mask[start:stop] = True
+        X = self.get_X_array(obs_mask, None)
+        X = X.toarray() if sparse.issparse(X) else np.asarray(X)
+        total = X.sum(axis=1, dtype=np.float64)
+        n_nonzero = np.count_nonzero(X, axis=1)
+        subset_totals = np.zeros((stop - start, len(subset_masks)))
+        for k, mask in enumerate(subset_masks):
+            subset_totals[:, k] = X[:, mask].sum(axis=1, dtype=np.float64)
+        return total, n_nonzero, subset_totals
+
+    def get_var_name_index(self):
+        """
+        return the NameIndex of the var index (eg, gene symbols), with aliases from every other
+        string or categorical var annotation whose values are unique (eg, Ensembl IDs).  Cached
+        across requests.
+        """
+
+        def _build(key):
+            schema = self.get_schema()["annotations"]["var"]
+            names = [schema["index"]] + [
+                column["name"]
+                for column in schema["columns"]
+                if column["type"] in ("string", "categorical") and column["name"] != schema["index"]
+            ]
+            fields = []
+            for name, values in zip(names, self.get_annotation_columns(Axis.VAR, names)):
+                values = pd.Series(values, copy=False)
+                if name == schema["index"] or not values[values != ""].dropna().duplicated().any():
+                    fields.append((name, values.to_numpy(dtype=object)))
+            return NameIndex(fields)
+
+        return column_cache.get_or_create((self.get_location(), str(Axis.VAR), "name_index"), _build)
+
+    def search_var(self, query, limit):
+        """
+        Search the var names and aliases beginning with query, ignoring case (see NameIndex), eg,
+        for gene name autocompletion.  Returns JSON:
+            {"query": <query>, "matches": [{"var": <var index>, "name": <var name>, "field": <annotation>,
+                                            "value": <matched value>}, ...]}
+        with the best matches first.
+        """
+        matches = self.get_var_name_index().search(query, limit)
+        return jsonify_numpy(
+            dict(
+                query=query,
+                matches=[dict(var=var, name=name, field=field, value=value) for var, name, field, value in matches],
+            )
+        )
+
     def update_parameters(self, parameters):
         parameters.update(self.parameters)
 
@@ -174,10 +378,20 @@ class Dataset(metaclass=ABCMeta):
                 mask[i] = True
         return mask
 
+    def _selection_filter_to_mask(self, handle, count):
+        packed = selection_cache.get((self.get_location(), handle))
+        if packed is None:
+            raise FilterError("unknown or expired selection")
+        return np.unpackbits(packed, count=count).astype(np.bool_)
+
     def _axis_filter_to_mask(self, axis, filter, count):
         mask = np.ones((count,), dtype=np.bool)
         if "index" in filter:
             mask = np.logical_and(mask, self._index_filter_to_mask(filter["index"], count))
+        if "selection" in filter:
+            if axis != Axis.OBS:
+                raise FilterError("selection filters are only supported on the obs axis")
+            mask = np.logical_and(mask, self._selection_filter_to_mask(filter["selection"], count))
         if "annotation_value" in filter:
             mask = np.logical_and(mask, self._annotation_filter_to_mask(axis, filter["annotation_value"], count))
 
@@ -185,13 +399,8 @@ class Dataset(metaclass=ABCMeta):
 
     def _annotation_filter_to_mask(self, axis, filter, count):
         mask = np.ones((count,), dtype=np.bool)
-        for v in filter:
-            name = v["name"]
-            if axis == Axis.VAR:
-                anno_data = self.query_var_array(name)
-            elif axis == Axis.OBS:
-                anno_data = self.query_obs_array(name)
-
+        names = [v["name"] for v in filter]
+        for v, anno_data in zip(filter, self.get_annotation_columns(axis, names)):
             if anno_data.dtype.name in ["boolean", "category", "object"]:
                 values = v.get("values", [])
                 key_idx = np.in1d(anno_data, values)
@@ -233,9 +442,11 @@ class Dataset(metaclass=ABCMeta):
         :param axis: string obs or var
         :return: flatbuffer Matrix
 
+        If the filter selects obs (by index, selection or annotation value), only the selected
+        rows are read and returned, and the Matrix row index holds their obs indices.
+
         Caveats:
         * currently only supports access on VAR axis
-        * currently only supports filtering on VAR axis
         """
         if axis != Axis.VAR:
             raise ValueError("Only VAR dimension access is supported")
@@ -245,18 +456,162 @@ class Dataset(metaclass=ABCMeta):
         except (KeyError, IndexError, TypeError, AttributeError, DatasetAccessError):
             raise FilterError("Error parsing filter")
 
-        if obs_selector is not None:
-            raise FilterError("filtering on obs unsupported")
-
         num_columns = self.get_shape()[1] if var_selector is None else np.count_nonzero(var_selector)
         if self.server_config.exceeds_limit("column_request_max", num_columns):
             raise ExceedsLimitError("Requested dataframe columns exceed column request limit")
 
         X = self.get_X_array(obs_selector, var_selector)
         col_idx = np.nonzero([] if var_selector is None else var_selector)[0]
-        return encode_matrix_fbs(X, col_idx=col_idx, row_idx=None)
+        row_idx = None if obs_selector is None else np.nonzero(obs_selector)[0]
+        return encode_matrix_fbs(X, col_idx=col_idx, row_idx=row_idx)
+
+    def get_X_var_tile_extent(self):
+        """return the extent, on the var axis, of the tiles in which X is stored, or None if unknown"""
+        return None
+
+    def get_X_row_means(self, var_mask, cancel_token=None):
+        """
+        return the mean of each row of X, over the vars selected by var_mask (which must select
+        at least one var), as an ndarray of shape (n_obs, 1).  The cancel_token, if given, is
+        checked before reading X.
+        """
+        if cancel_token is not None:
+            cancel_token.check()
+        X = self.get_X_array(None, var_mask)
+        if sparse.issparse(X):
+            return X.mean(axis=1).A
+        return X.mean(axis=1, keepdims=True)
+
+    def get_X_column_values(self, var):
+        """
+        return one column of X as (obs, values, implicit):  the values of the cells with obs
+        indices `obs`, every other cell having the value `implicit`.  This allows sparse storage
+        to return only its stored values.  By default, every value is returned.
+        """
+        var_mask = np.zeros((self.get_shape()[1],), dtype=np.bool_)
+        var_mask[var] = True
+        X = self.get_X_array(None, var_mask)
+        values = X.toarray().ravel() if sparse.issparse(X) else np.asarray(X).ravel()
+        return np.arange(len(values)), values, values.dtype.type(0)
+
+    def get_X_obs_tile_extent(self):
+        """return the extent, on the obs axis, of the tiles in which X is stored, or None if unknown"""
+        return None
 
-    def diffexp_topN(self, obsFilterA, obsFilterB, top_n=None):
+    def get_X_row_values(self, obs_indices):
+        """
+        return the non-zero values of the rows of X with the (sorted, unique) obs_indices, as
+        (obs, var, values), sorted by obs and var.  By default, the rows are read densely.
+        """
+        obs_mask = np.zeros((self.get_shape()[0],), dtype=np.bool_)
+        obs_mask[obs_indices] = True
+        X = self.get_X_array(obs_mask, None)
+        X = X.toarray() if sparse.issparse(X) else np.asarray(X)
+        rows, var = np.nonzero(X)
+        return np.asarray(obs_indices)[rows], var, X[rows, var]
+
+    def data_var_batch_to_fbs_matrices(self, var_indices):
+        """
+        Retrieves the X columns for a batch of vars.  Returns an iterator over (var index, flatbuffer Matrix)
+        for each var, in request order, where each flatbuffer is identical to that returned by
+        data_frame_to_fbs_matrix() for the single var.
+
+        The request is validated before returning.  Vars are read in groups aligned with the X storage
+        tiles, concurrently on the I/O thread pool, so that the first vars may be returned while the
+        remainder are being read.
+        """
+        var_indices = np.asarray(var_indices)
+        if var_indices.ndim != 1 or (var_indices.size > 0 and not np.issubdtype(var_indices.dtype, np.integer)):
+            raise ValueError("var indices must be a list of integers")
+        n_vars = self.get_shape()[1]
+        if ((var_indices < 0) | (var_indices >= n_vars)).any():
+            raise ValueError("var index out of range")
+        if self.server_config.exceeds_limit("data_var_batch_max", len(var_indices)):
+            raise ExceedsLimitError("Requested vars exceed batch request limit")
+
+        # group the (unique) vars by tile, splitting large groups so that they may also be read concurrently.
+        # Tiles shared by several groups are read repeatedly, but are normally in the storage engine's cache.
+        unique = np.unique(var_indices)
+        tile_extent = self.get_X_var_tile_extent() or n_vars
+        groups = []
+        for tile_group in np.split(unique, np.nonzero(np.diff(unique // tile_extent))[0] + 1):
+            if len(tile_group) == 0:
+                continue
+            groups.extend(np.array_split(tile_group, -(-len(tile_group) // VAR_BATCH_GROUP_MAX)))
+
+        executor = get_io_executor()
+        pending = {}  # var -> [future, group, number of requests for this group not yet returned]
+        for group in groups:
+            var_mask = np.zeros((n_vars,), dtype=np.bool_)
+            var_mask[group] = True
+            group_state = [executor.submit(self.get_X_array, None, var_mask), group, 0]
+            for var in group:
+                pending[var] = group_state
+        for var in var_indices:
+            pending[var][2] += 1
+
+        def _fbs_matrices():
+            n_obs = self.get_shape()[0]
+            for var in var_indices:
+                group_state = pending[var]
+                future, group, _ = group_state
+                X = future.result()
+                column = X[:, np.searchsorted(group, var)]
+                yield int(var), encode_columns_fbs([column], n_rows=n_obs, col_idx=np.array([var]))
+
+                # release each group's data once all of its vars have been returned
+                group_state[2] -= 1
+                if group_state[2] == 0:
+                    group_state[0] = None
+
+        return _fbs_matrices()
+
+    def data_obs_values(self, obs_indices, top_n=None):
+        """
+        Retrieves the X rows of a list of cells, eg, to show the genes expressed by a cell.  Returns JSON,
+        {"cells": [...]}, with an object for each cell, in request order:
+            {"obs": <obs index>, "var": [<var index>, ...], "values": [<value>, ...]}
+        holding the cell's non-zero values, sorted by var index, or if top_n is given, only its top_n
+        largest values, sorted by decreasing value.  Values which are not finite (eg, NaN) are omitted,
+        as they can not be encoded as JSON.
+
+        Rows are read in groups aligned with the X storage tiles, concurrently on the I/O thread pool, so that
+        each tile is read once, rather than densifying whole columns of X.
+        """
+        obs_indices = np.asarray(obs_indices)
+        if obs_indices.ndim != 1 or (obs_indices.size > 0 and not np.issubdtype(obs_indices.dtype, np.integer)):
+            raise ValueError("obs indices must be a list of integers")
+        if ((obs_indices < 0) | (obs_indices >= self.get_shape()[0])).any():
+            raise ValueError("obs index out of range")
+        if self.server_config.exceeds_limit("data_obs_max", len(obs_indices)):
+            raise ExceedsLimitError("Requested cells exceed data/obs request limit")
+        if top_n is not None and top_n < 1:
+            raise ValueError("top-n must be a positive integer")
+        if len(obs_indices) == 0:
+            return jsonify_numpy(dict(cells=[]))
+
+        # each group of (unique) cells lies within a single obs tile
+        unique = np.unique(obs_indices)
+        tile_extent = self.get_X_obs_tile_extent() or self.get_shape()[0]
+        groups = np.split(unique, np.nonzero(np.diff(unique // tile_extent))[0] + 1)
+        results = list(get_io_executor().map(self.get_X_row_values, groups))
+        obs = np.concatenate([r[0] for r in results])
+        var = np.concatenate([r[1] for r in results])
+        values = np.concatenate([r[2] for r in results])
+        finite = np.isfinite(values)
+        obs, var, values = obs[finite], var[finite], values[finite]
+
+        bounds = np.searchsorted(obs, unique, side="left"), np.searchsorted(obs, unique, side="right")
+        rows = {}
+        for i, lo, hi in zip(unique, *bounds):
+            row_var, row_values = var[lo:hi], values[lo:hi]
+            if top_n is not None:
+                order = np.lexsort((row_var, -row_values))[:top_n]
+                row_var, row_values = row_var[order], row_values[order]
+            rows[i] = dict(obs=int(i), var=row_var.tolist(), values=row_values.tolist())
+        return jsonify_numpy(dict(cells=[rows[i] for i in obs_indices]))
+
+    def diffexp_topN(self, obsFilterA, obsFilterB, top_n=None, approximate=False, cancel_token=None):
         """
         Computes the top N differentially expressed variables between two observation sets. If mode
         is "TOP_N", then stats for the top N
@@ -266,8 +621,22 @@ class Dataset(metaclass=ABCMeta):
         :param obsFilterA: filter: dictionary with filter params for first set of observations
         :param obsFilterB: filter: dictionary with filter params for second set of observations
         :param top_n: Limit results to top N (Top var mode only)
+        :param approximate: if True, compare random subsamples of sets larger than the configured
+            diffexp__approximate_max_cells.  If any set was subsampled, the result will contain an
+            "approximation" describing the sample.
+        :param cancel_token: CancellationToken of the computation, or None to apply the configured timeout
         :return: top N genes and corresponding stats
         """
+        obs_mask_A, obs_mask_B, approximation = self.diffexp_obs_masks(obsFilterA, obsFilterB, approximate)
+        return self.diffexp_topN_from_masks(obs_mask_A, obs_mask_B, approximation, top_n, cancel_token)
+
+    def diffexp_obs_masks(self, obsFilterA, obsFilterB, approximate=False):
+        """
+        Validate the filters of a diffexp_topN request, and check the request against the limits,
+        without computing anything.  Returns (obs_mask_A, obs_mask_B, approximation), where the
+        masks are those of the (possibly subsampled) sets, and approximation describes the sample,
+        or is None.
+        """
         if Axis.VAR in obsFilterA or Axis.VAR in obsFilterB:
             raise FilterError("Observation filters may not contain variable conditions")
         try:
@@ -276,25 +645,89 @@ class Dataset(metaclass=ABCMeta):
             obs_mask_B = self._axis_filter_to_mask(Axis.OBS, obsFilterB["obs"], shape[0])
         except (KeyError, IndexError):
             raise FilterError("Error parsing filter")
-        if top_n is None:
-            top_n = self.dataset_config.diffexp__top_n
+
+        approximation = None
+        if approximate:
+            max_cells = self.dataset_config.diffexp__approximate_max_cells
+            seed = self.dataset_config.diffexp__approximate_seed
+            tile_rows = self.get_X_obs_tile_extent() or 1
+            n_A, n_B = np.count_nonzero(obs_mask_A), np.count_nonzero(obs_mask_B)
+            obs_mask_A = subsample_mask(obs_mask_A, max_cells, seed, tile_rows)
+            obs_mask_B = subsample_mask(obs_mask_B, max_cells, seed, tile_rows)
+            if n_A > max_cells or n_B > max_cells:
+                approximation = dict(
+                    seed=seed,
+                    set1=dict(n=n_A, n_effective=min(n_A, max_cells)),
+                    set2=dict(n=n_B, n_effective=min(n_B, max_cells)),
+                )
 
         if self.server_config.exceeds_limit(
             "diffexp_cellcount_max", np.count_nonzero(obs_mask_A) + np.count_nonzero(obs_mask_B)
         ):
             raise ExceedsLimitError("Diffexp request exceeds max cell count limit")
 
+        return obs_mask_A, obs_mask_B, approximation
+
+    def diffexp_topN_from_masks(self, obs_mask_A, obs_mask_B, approximation=None, top_n=None, cancel_token=None):
+        """as diffexp_topN, given the masks and approximation returned by diffexp_obs_masks"""
+        if top_n is None:
+            top_n = self.dataset_config.diffexp__top_n
+
         result = self.compute_diffexp_ttest(
-            maskA=obs_mask_A, maskB=obs_mask_B, top_n=top_n, lfc_cutoff=self.dataset_config.diffexp__lfc_cutoff
+            maskA=obs_mask_A,
+            maskB=obs_mask_B,
+            top_n=top_n,
+            lfc_cutoff=self.dataset_config.diffexp__lfc_cutoff,
+            cancel_token=cancel_token,
         )
+        if approximation is not None:
+            result["approximation"] = approximation
 
         try:
             return jsonify_numpy(result)
         except ValueError:
             raise JSONEncodingValueError("Error encoding differential expression to JSON")
 
+    def diffexp_groups_topN(self, obs_name, top_n=None):
+        """
+        Computes the top N differentially expressed variables between each category of a
+        categorical observation annotation and all other observations.
+        :param obs_name: name of the categorical obs annotation
+        :param top_n: Limit results to top N
+        :return: JSON, {"obs": obs_name, "groups": [{"category", "n", "positive", "negative"}, ...]},
+            with an element for each non-empty category
+        """
+        columns = {c["name"]: c for c in self.get_schema()["annotations"]["obs"]["columns"]}
+        if obs_name not in columns or columns[obs_name]["type"] != "categorical":
+            raise FilterError(f"{obs_name} is not a categorical observation annotation")
+        categories = columns[obs_name].get("categories")
+        if categories is None:
+            categories = pd.unique(self.get_annotation_columns(Axis.OBS, [obs_name])[0]).tolist()
+        if top_n is None:
+            top_n = self.dataset_config.diffexp__top_n
+
+        if self.server_config.exceeds_limit("diffexp_cellcount_max", self.get_shape()[0]):
+            raise ExceedsLimitError("Diffexp request exceeds max cell count limit")
+        if self.server_config.exceeds_limit("diffexp_groups_max", len(categories)):
+            raise ExceedsLimitError("Diffexp request exceeds max group count limit")
+
+        codes = pd.Categorical(self.get_annotation_columns(Axis.OBS, [obs_name])[0], categories=categories).codes
+        results = self.compute_diffexp_groups_ttest(
+            codes, len(categories), top_n=top_n, lfc_cutoff=self.dataset_config.diffexp__lfc_cutoff
+        )
+        groups = [dict(category=category, n=n, **result) for category, (n, result) in zip(categories, results) if n > 0]
+
+        try:
+            return jsonify_numpy(dict(obs=obs_name, groups=groups))
+        except ValueError:
+            raise JSONEncodingValueError("Error encoding differential expression to JSON")
+
     @abstractmethod
-    def compute_diffexp_ttest(self, maskA, maskB, top_n, lfc_cutoff):
+    def compute_diffexp_ttest(self, maskA, maskB, top_n, lfc_cutoff, cancel_token=None):
+        pass
+
+    @abstractmethod
+    def compute_diffexp_groups_ttest(self, codes, n_groups, top_n, lfc_cutoff):
         pass
 
     @staticmethod
@@ -322,6 +755,165 @@ class Dataset(metaclass=ABCMeta):
         normalized_layout = normalized_layout.astype(dtype=np.float32)
         return normalized_layout
 
+    def get_normalized_embedding(self, ename):
+        """
+        return the normalized layout (see normalize_embedding) for the first two dimensions of
+        the named embedding.  The result is cached across requests, and must not be modified.
+        """
+
+        def _load(key):
+            return Dataset.normalize_embedding(self.get_embedding_array(ename, 2))
+
+        return layout_cache.get_or_create((self.get_location(), ename), _load)
+
+    def get_layout_index(self, ename):
+        """
+        return the spatial index (see LayoutIndex) over the normalized layout of the named
+        embedding.  The result is cached across requests, and must not be modified.
+        """
+
+        def _build(key):
+            return LayoutIndex(self.get_normalized_embedding(ename))
+
+        return layout_cache.get_or_create((self.get_location(), ename, "index"), _build)
+
+    def layout_tile_to_fbs_matrix(self, ename, z, x, y, limit):
+        """
+        return a density-preserving sample of at most `limit` cells from tile (z, x, y) of the
+        named embedding's normalized layout, as a flatbuffer with columns:  obs (the cell index),
+        {ename}_0 and {ename}_1.  At zoom level z, the layout is divided into 2**z by 2**z tiles.
+        """
+        index = self.get_layout_index(ename)
+        with ServerTiming.time("layout.tile"):
+            obs, xy = index.tile_sample(z, x, y, limit)
+        with ServerTiming.time("layout.encode"):
+            col_idx = pd.Index(["obs", f"{ename}_0", f"{ename}_1"])
+            return encode_columns_fbs([obs, xy[:, 0], xy[:, 1]], n_rows=len(obs), col_idx=col_idx)
+
+    def layout_tile_counts_to_fbs_matrix(self, ename, z, x, y, depth):
+        """
+        return the number of cells in each non-empty sub-tile, at level z+depth, of tile (z, x, y)
+        of the named embedding's normalized layout, as a flatbuffer with columns:  x, y and count.
+        """
+        index = self.get_layout_index(ename)
+        with ServerTiming.time("layout.tile"):
+            sub_x, sub_y, counts = index.tile_counts(z, x, y, depth)
+        with ServerTiming.time("layout.encode"):
+            col_idx = pd.Index(["x", "y", "count"])
+            return encode_columns_fbs([sub_x, sub_y, counts], n_rows=len(counts), col_idx=col_idx)
+
+    def get_layout_raster_bins(self, ename, width, height):
+        """
+        return the bin of each cell in a width by height grid over the named embedding's normalized
+        layout, numbered y * width + x, or -1 for cells without a (finite) position.  The result
+        is cached across requests, so that the binning is shared by all rasters of the same grid,
+        and must not be modified.
+        """
+
+        def _build(key):
+            layout = self.get_normalized_embedding(ename)
+            finite = np.isfinite(layout).all(axis=1)
+            x = np.clip(np.floor(np.nan_to_num(layout[:, 0]) * width), 0, width - 1).astype(np.int32)
+            y = np.clip(np.floor(np.nan_to_num(layout[:, 1]) * height), 0, height - 1).astype(np.int32)
+            return np.where(finite, y * width + x, -1).astype(np.int32)
+
+        return layout_cache.get_or_create((self.get_location(), ename, "raster", width, height), _build)
+
+    def layout_raster_to_fbs_matrix(self, ename, width, height, var_indices=None, agg="mean"):
+        """
+        Aggregate cells over a width by height grid of the named embedding's normalized layout, eg,
+        for an overview of a large dataset.  Returns a flatbuffer with a row for each non-empty bin,
+        and columns:  x, y, count (the number of cells in the bin), and if var_indices are given,
+        `agg` ("mean" or "max") of the expression of the gene, or of the gene set score (the mean
+        expression of the genes, as in summarize_var) of the cells in the bin.  Non-finite values are
+        ignored, and bins without a finite value are NaN.
+        """
+        if not (1 <= width <= LAYOUT_RASTER_MAX_SIZE and 1 <= height <= LAYOUT_RASTER_MAX_SIZE):
+            raise ValueError(f"raster width and height must be in range [1, {LAYOUT_RASTER_MAX_SIZE}]")
+        if agg not in ("mean", "max"):
+            raise ValueError("raster aggregation must be mean or max")
+
+        bins = self.get_layout_raster_bins(ename, width, height)
+        counts = np.bincount(bins[bins >= 0], minlength=width * height)
+        nonempty = np.nonzero(counts)[0]
+        columns = [(nonempty % width).astype(np.uint32), (nonempty // width).astype(np.uint32)]
+        columns.append(counts[nonempty].astype(np.uint32))
+        col_idx = ["x", "y", "count"]
+        if var_indices:
+            var_indices = self._validate_var_indices(var_indices)
+            with ServerTiming.time("layout.raster"):
+                values = self._layout_raster_values(bins, counts, var_indices, agg)
+            columns.append(values[nonempty])
+            col_idx.append(agg)
+
+        with ServerTiming.time("layout.encode"):
+            return encode_columns_fbs(columns, n_rows=len(nonempty), col_idx=pd.Index(col_idx))
+
+    def _layout_raster_values(self, bins, counts, var_indices, agg):
+        """return the mean or max expression of the gene (or gene set) in each bin, as float32"""
+        if len(set(var_indices)) == 1:
+            obs, values, implicit = self.get_X_column_values(var_indices[0])
+        else:
+            var_mask = np.zeros((self.get_shape()[1],), dtype=np.bool_)
+            var_mask[var_indices] = True
+            values = self.get_X_row_means(var_mask)[:, 0]
+            obs, implicit = np.arange(len(values)), 0
+
+        # cells not in obs (eg, those not stored by sparse X) have the value implicit
+        n_bins = len(counts)
+        obs_bins = bins[obs]
+        placed = obs_bins >= 0
+        n_implicit = counts - np.bincount(obs_bins[placed], minlength=n_bins)
+        finite = placed & np.isfinite(values)
+        n_values = np.bincount(obs_bins[finite], minlength=n_bins) + n_implicit
+        if agg == "mean":
+            totals = np.bincount(obs_bins[finite], weights=values[finite], minlength=n_bins)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                result = (totals + n_implicit * float(implicit)) / n_values
+        else:
+            result = np.full((n_bins,), -np.inf)
+            np.maximum.at(result, obs_bins[finite], values[finite])
+            result[n_implicit > 0] = np.maximum(result[n_implicit > 0], float(implicit))
+            result[n_values == 0] = np.nan
+        return result.astype(np.float32)
+
+    @staticmethod
+    def _mask_to_index_filter(mask):
+        """return the mask in index filter format: a list of indices and [start, stop) ranges"""
+        edges = np.diff(np.concatenate(([0], mask.view(np.int8), [0])))
+        starts = np.nonzero(edges == 1)[0]
+        stops = np.nonzero(edges == -1)[0]
+        return [int(start) if stop - start == 1 else [int(start), int(stop)] for start, stop in zip(starts, stops)]
+
+    def select_layout(self, ename, box=None, polygon=None, index=False):
+        """
+        Select the cells within a box [x0, y0, x1, y1], or a polygon [[x, y], ...], in the named
+        embedding's normalized layout coordinates.  The selection is retained on the server,
+        and may be referenced in obs filters as {"selection": handle}, until evicted.
+
+        Returns JSON {"selection": handle, "count": <number of cells selected>}.  If index is true,
+        the selection is also returned as an obs index filter, ie, {..., "index": [...]}.
+        """
+        if (box is None) == (polygon is None):
+            raise ValueError("exactly one of box or polygon must be specified")
+
+        layout_index = self.get_layout_index(ename)
+        with ServerTiming.time("layout.select"):
+            if box is not None:
+                x0, y0, x1, y1 = (float(v) for v in box)
+                mask = layout_index.select_box(x0, y0, x1, y1)
+            else:
+                mask = layout_index.select_polygon(polygon)
+
+        geometry = json.dumps({"layout": ename, "box": box, "polygon": polygon}, sort_keys=True)
+        handle = hashlib.sha1(geometry.encode("utf-8")).hexdigest()
+        selection_cache.put((self.get_location(), handle), np.packbits(mask))
+
+        result = {"selection": handle, "count": np.count_nonzero(mask)}
+        if index:
+            result["index"] = self._mask_to_index_filter(mask)
+        return jsonify_numpy(result)
+
     def layout_to_fbs_matrix(self, fields):
         """
         return specified embeddings as a flatbuffer, using the cellxgene matrix fbs encoding.
@@ -334,22 +926,326 @@ class Dataset(metaclass=ABCMeta):
 
         """
         embeddings = self.get_embedding_names() if fields is None or len(fields) == 0 else fields
-        layout_data = []
         with ServerTiming.time("layout.query"):
-            for ename in embeddings:
-                embedding = self.get_embedding_array(ename, 2)
-                normalized_layout = Dataset.normalize_embedding(embedding)
-                layout_data.append(pd.DataFrame(normalized_layout, columns=[f"{ename}_0", f"{ename}_1"]))
+            layouts = list(get_io_executor().map(self.get_normalized_embedding, embeddings))
 
         with ServerTiming.time("layout.encode"):
-            if layout_data:
-                df = pd.concat(layout_data, axis=1, copy=False)
-            else:
-                df = pd.DataFrame()
-            fbs = encode_matrix_fbs(df, col_idx=df.columns, row_idx=None)
+            columns = [layout[:, dim] for layout in layouts for dim in range(2)]
+            col_idx = pd.Index([f"{ename}_{dim}" for ename in embeddings for dim in range(2)])
+            n_rows = self.get_shape()[0] if columns else 0
+            fbs = encode_columns_fbs(columns, n_rows=n_rows, col_idx=col_idx)
 
         return fbs
 
+    def summarize_obs(self, names, bins, selection=None):
+        """
+        Summarize the named obs annotations, optionally restricted to the cells of a selection
+        (see select_layout).  Returns JSON {"n": <number of cells>, "obs": {name: summary, ...}}.
+        Categorical, boolean and string annotations are summarized as value counts:
+            {"type", "categories": [...], "counts": [...], "truncated": <bool>}
+        in the schema's category order, if it has one, or else in order of first appearance.  At
+        most max_categories values (the most frequent) are reported.  Numeric annotations are
+        summarized as a histogram of the finite values, with bins equally spaced between the
+        minimum and maximum of the whole annotation (so that summaries of selections are
+        comparable):
+            {"type", "min", "max", "counts": [...], "nan": <number of non-finite values>}
+        Summaries are cached across requests.
+        """
+        columns = {c["name"]: c for c in self.get_schema()["annotations"]["obs"]["columns"]}
+        unknown = [name for name in names if name not in columns]
+        if unknown:
+            raise KeyError(f"unknown obs annotation: {', '.join(unknown)}")
+
+        n_obs = self.get_shape()[0]
+        mask = self._selection_filter_to_mask(selection, n_obs) if selection is not None else None
+
+        def _summarize(name):
+            column = columns[name]
+            if column["type"] in ("int32", "float32"):
+                return self._summarize_obs_numeric(name, column["type"], bins, mask)
+            return self._summarize_obs_values(name, column, mask)
+
+        obs = {
+            name: summarize_cache.get_or_create(
+                (self.get_location(), "obs", name, bins, selection), lambda key, name=name: _summarize(name)
+            )
+            for name in names
+        }
+        result = {"n": n_obs if mask is None else np.count_nonzero(mask), "obs": obs}
+        try:
+            return jsonify_numpy(result)
+        except ValueError:
+            raise JSONEncodingValueError("Error encoding obs annotation summary to JSON")
+
+    def _summarize_obs_values(self, name, column, mask):
+        codes, uniques = self.get_annotation_codes(Axis.OBS, name)
+        if mask is not None:
+            codes = codes[mask]
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+
+        if "categories" in column:
+            index = {value: i for i, value in enumerate(uniques.tolist())}
+            categories = column["categories"]
+            counts = np.array([counts[index[c]] if c in index else 0 for c in categories], dtype=counts.dtype)
+        else:
+            categories = uniques.tolist()
+
+        max_categories = self.dataset_config.presentation__max_categories
+        truncated = len(categories) > max_categories
+        if truncated:
+            keep = np.sort(np.argsort(-counts, kind="stable")[:max_categories])
+            categories = [categories[i] for i in keep]
+            counts = counts[keep]
+
+        return {"type": column["type"], "categories": categories, "counts": counts.tolist(), "truncated": truncated}
+
+    def _summarize_obs_numeric(self, name, type, bins, mask):
+        data = self.get_annotation_columns(Axis.OBS, [name])[0]
+        finite = np.isfinite(data)
+        if finite.any():
+            range_ = (data[finite].min(), data[finite].max())
+        else:
+            range_ = (None, None)
+        if mask is not None:
+            data, finite = data[mask], finite[mask]
+
+        if range_[0] is None:
+            counts = np.zeros((bins,), dtype=np.int64)
+        else:
+            counts, _ = np.histogram(data[finite], bins=bins, range=range_)
+        return {
+            "type": type,
+            "min": range_[0],
+            "max": range_[1],
+            "counts": counts.tolist(),
+            "nan": np.count_nonzero(~finite),
+        }
+
+    def summarize_var_distribution(self, var_indices, bins, quantiles, selection=None):
+        """
+        Summarize the distribution of expression of each var, over all cells or over the cells of a
+        selection (see select_layout).  Returns JSON {"n": <number of cells>, "q": quantiles,
+        "var": [summary, ...]}, in request order, each summary being:
+            {"index", "min", "max", "counts": [...], "quantiles": [...], "nonzero", "nan"}
+        The histogram has bins equally spaced between the minimum and maximum of the var over
+        all cells (so that summaries of selections are comparable), and quantiles are linearly
+        interpolated, as numpy.quantile.  Non-finite values are counted by "nan", and otherwise
+        ignored.  Summaries are computed from the values stored by X (see get_X_column_values),
+        without materializing implicit zeros, and are cached across requests.
+        """
+        var_indices = [int(var) for var in var_indices]
+        n_obs, n_vars = self.get_shape()
+        if any(var < 0 or var >= n_vars for var in var_indices):
+            raise ValueError("var index out of range")
+        if self.server_config.exceeds_limit("data_var_batch_max", len(var_indices)):
+            raise ExceedsLimitError("Requested vars exceed batch request limit")
+        mask = self._selection_filter_to_mask(selection, n_obs) if selection is not None else None
+        quantiles = tuple(quantiles)
+
+        def _get(var, selection, mask):
+            def _summarize(key):
+                range_ = None if mask is None else _get(var, None, None)
+                return self._summarize_var_values(var, bins, quantiles, mask, range_)
+
+            key = (self.get_location(), "var", var, bins, quantiles, selection)
+            return dict(index=var, **summarize_cache.get_or_create(key, _summarize))
+
+        with ServerTiming.time("summary.var"):
+            summaries = list(get_io_executor().map(lambda var: _get(var, selection, mask), var_indices))
+        result = {"n": n_obs if mask is None else np.count_nonzero(mask), "q": list(quantiles), "var": summaries}
+        try:
+            return jsonify_numpy(result)
+        except ValueError:
+            raise JSONEncodingValueError("Error encoding gene expression summary to JSON")
+
+    def _summarize_var_values(self, var, bins, quantiles, mask, range_summary):
+        obs, values, implicit = self.get_X_column_values(var)
+        if mask is None:
+            n_implicit = self.get_shape()[0] - len(obs)
+        else:
+            values = values[mask[obs]]
+            n_implicit = np.count_nonzero(mask) - len(values)
+
+        finite = np.isfinite(values)
+        n_nan = len(values) - np.count_nonzero(finite)
+        values = np.sort(values[finite]).astype(np.float64)
+        implicit = float(implicit)
+        if not np.isfinite(implicit):
+            n_nan, n_implicit = n_nan + n_implicit, 0
+        n = len(values) + n_implicit
+        nonzero = np.count_nonzero(values) + (n_implicit if implicit != 0 else 0)
+
+        if range_summary is not None:
+            range_ = (range_summary["min"], range_summary["max"])
+        elif n == 0:
+            range_ = (None, None)
+        else:
+            candidates = ([values[0], values[-1]] if len(values) else []) + ([implicit] if n_implicit else [])
+            range_ = (min(candidates), max(candidates))
+
+        if range_[0] is None:
+            counts = np.zeros((bins,), dtype=np.int64)
+        else:
+            counts, _ = np.histogram(values, bins=bins, range=range_)
+            counts += np.histogram([implicit], bins=bins, range=range_)[0] * n_implicit
+
+        if n == 0:
+            qvalues = [None] * len(quantiles)
+        else:
+            # the column, sorted, is values[:split], then n_implicit copies of implicit, then values[split:]
+            split = np.searchsorted(values, implicit)
+            padded = np.append(values, implicit)
+            position = np.asarray(quantiles, dtype=np.float64) * (n - 1)
+            lower = np.floor(position).astype(np.int64)
+            upper = np.minimum(lower + 1, n - 1)
+
+            def _at(i):
+                explicit = padded[np.where(i < split, i, np.clip(i - n_implicit, 0, len(values)))]
+                return np.where((i >= split) & (i < split + n_implicit), implicit, explicit)
+
+            fraction = position - lower
+            qvalues = (_at(lower) * (1 - fraction) + _at(upper) * fraction).tolist()
+
+        return {
+            "min": range_[0],
+            "max": range_[1],
+            "counts": counts.tolist(),
+            "quantiles": qvalues,
+            "nonzero": nonzero,
+            "nan": n_nan,
+        }
+
+    def _validate_var_indices(self, var_indices):
+        var_indices = [int(var) for var in var_indices]
+        if any(var < 0 or var >= self.get_shape()[1] for var in var_indices):
+            raise ValueError("var index out of range")
+        if self.server_config.exceeds_limit("data_var_batch_max", len(var_indices)):
+            raise ExceedsLimitError("Requested vars exceed batch request limit")
+        return var_indices
+
+    def _get_obs_category_codes(self, obs_name):
+        """
+        return (categories, codes, sizes) of a categorical obs annotation:  the categories, in the
+        schema's order if it has one, the category index of each cell (-1 if missing), and the
+        number of cells in each category.
+        """
+        columns = {c["name"]: c for c in self.get_schema()["annotations"]["obs"]["columns"]}
+        if obs_name not in columns or columns[obs_name]["type"] != "categorical":
+            raise FilterError(f"{obs_name} is not a categorical observation annotation")
+
+        codes, uniques = self.get_annotation_codes(Axis.OBS, obs_name)
+        categories = columns[obs_name].get("categories")
+        if categories is None:
+            categories = uniques.tolist()
+        else:
+            order = {c: i for i, c in enumerate(categories)}
+            remap = np.array([order.get(value, -1) for value in uniques.tolist()] + [-1], dtype=np.int64)
+            codes = remap[codes]
+        return categories, codes, np.bincount(codes[codes >= 0], minlength=len(categories))
+
+    def summarize_var_groups(self, obs_name, var_indices):
+        """
+        Aggregate the expression of each var over the categories of a categorical obs annotation,
+        eg, for a dot plot.  Returns JSON {"obs", "categories": [...], "n": [...], "var": [...],
+        "mean": [[...], ...], "fraction": [[...], ...]}, where n is the number of cells in each
+        category, and mean and fraction are (category x var) matrices of the mean expression and
+        the fraction of cells with nonzero expression.  Cells with a missing category are ignored.
+        Cells with a non-finite value of a var are excluded from both its mean and its fraction,
+        which are therefore over the same cells (and may be fewer than n).  The aggregation of each
+        var is computed from the values stored by X (see get_X_column_values), and cached across
+        requests.
+        """
+        var_indices = self._validate_var_indices(var_indices)
+        categories, codes, group_sizes = self._get_obs_category_codes(obs_name)
+        n_groups = len(categories)
+
+        def _aggregate(var):
+            def _compute(key):
+                obs, values, implicit = self.get_X_column_values(var)
+                group = codes[obs]
+                n_implicit = group_sizes - np.bincount(group[group >= 0], minlength=n_groups)
+                keep = (group >= 0) & np.isfinite(values)
+                group, values = group[keep], values[keep]
+                count = np.bincount(group, minlength=n_groups) + n_implicit
+                sums = np.bincount(group, weights=values, minlength=n_groups) + n_implicit * float(implicit)
+                nonzero = np.bincount(group[values != 0], minlength=n_groups) + (n_implicit if implicit != 0 else 0)
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    mean = np.where(count > 0, sums / count, 0)
+                    fraction = np.where(count > 0, nonzero / count, 0)
+                return mean, fraction
+
+            return summarize_cache.get_or_create((self.get_location(), "var", var, "groups", obs_name), _compute)
+
+        with ServerTiming.time("summary.var.groups"):
+            aggregates = list(get_io_executor().map(_aggregate, var_indices))
+        shape = (n_groups, len(var_indices))
+        mean = np.column_stack([a[0] for a in aggregates]) if aggregates else np.zeros(shape)
+        fraction = np.column_stack([a[1] for a in aggregates]) if aggregates else np.zeros(shape)
+        result = {
+            "obs": obs_name,
+            "categories": categories,
+            "n": group_sizes.tolist(),
+            "var": var_indices,
+            "mean": mean.tolist(),
+            "fraction": fraction.tolist(),
+        }
+        try:
+            return jsonify_numpy(result)
+        except ValueError:
+            raise JSONEncodingValueError("Error encoding gene expression aggregation to JSON")
+
+    def summarize_var_quantiles(self, obs_name, var_indices, quantiles, groups=None):
+        """
+        Quantiles of the expression of each var, within groups of the categories of a categorical obs
+        annotation, eg, for violin or box plots.  groups is a list of lists of categories (by default,
+        each category alone), and each group is the union of its categories.  Returns JSON {"obs",
+        "q": quantiles, "var": [...], "groups": [...], "n": [...], "quantiles": [[[...], ...], ...]},
+        where n is the number of cells in each group, and quantiles[group][var] are the quantiles
+        of the var over the cells of the group (null if there are none).
+
+        Quantiles are approximate.  A mergeable sketch (see QuantileSketch) of each var in each
+        category is built in a single pass over the values stored by X (see get_X_column_values),
+        and cached across requests, so that any union of categories is answered without reading X.
+        """
+        var_indices = self._validate_var_indices(var_indices)
+        categories, codes, group_sizes = self._get_obs_category_codes(obs_name)
+        n_groups = len(categories)
+        if groups is None:
+            groups = [[category] for category in categories]
+        index = {category: i for i, category in enumerate(categories)}
+        unknown = [category for group in groups for category in group if category not in index]
+        if unknown:
+            raise FilterError(f"unknown categories of {obs_name}: {', '.join(map(str, unknown))}")
+        groups = [[index[category] for category in group] for group in groups]
+
+        def _quantiles(var):
+            def _sketch(key):
+                obs, values, implicit = self.get_X_column_values(var)
+                group = codes[obs]
+                n_implicit = group_sizes - np.bincount(group[group >= 0], minlength=n_groups)
+                keep = (group >= 0) & np.isfinite(values)
+                return QuantileSketch.build_grouped(
+                    values[keep], group[keep], n_groups, atom=float(implicit), atom_weights=n_implicit
+                )
+
+            sketches = summarize_cache.get_or_create((self.get_location(), "var", var, "sketch", obs_name), _sketch)
+            return [QuantileSketch.merge([sketches[k] for k in group]).quantile(quantiles) for group in groups]
+
+        with ServerTiming.time("summary.var.quantiles"):
+            by_var = list(get_io_executor().map(_quantiles, var_indices))
+        result = {
+            "obs": obs_name,
+            "q": list(quantiles),
+            "var": var_indices,
+            "groups": [[categories[k] for k in group] for group in groups],
+            "n": [int(group_sizes[group].sum()) for group in groups],
+            "quantiles": [[by_var[j][g] for j in range(len(var_indices))] for g in range(len(groups))],
+        }
+        try:
+            return jsonify_numpy(result)
+        except ValueError:
+            raise JSONEncodingValueError("Error encoding gene expression quantiles to JSON")
+
     def get_last_mod_time(self):
         try:
             lastmod = self.get_data_locator().lastmodtime()
@@ -357,10 +1253,27 @@ class Dataset(metaclass=ABCMeta):
             lastmod = None
         return lastmod
 
-    def summarize_var(self, method, filter, query_hash):
+    def summarize_var(self, method, filter, query_hash, cancel_token=None):
+        """
+        The summary is computed once for concurrent requests with the same query.  If the caller
+        computing it is cancelled (see CancellationToken), the other callers, which were not,
+        retry under their own tokens.
+        """
         if method != "mean":
             raise UnsupportedSummaryMethod("Unknown gene set summary method.")
 
+        while True:
+            try:
+                return summarize_cache.get_or_create(
+                    (self.get_location(), query_hash, method),
+                    lambda key: self._summarize_var(method, filter, query_hash, cancel_token),
+                )
+            except ComputeCancelledError:
+                # re-raise if it was this caller which was cancelled
+                if cancel_token is not None:
+                    cancel_token.check()
+
+    def _summarize_var(self, method, filter, query_hash, cancel_token=None):
         obs_selector, var_selector = self._filter_to_mask(filter)
         if obs_selector is not None:
             raise FilterError("filtering on obs unsupported")
@@ -371,11 +1284,7 @@ class Dataset(metaclass=ABCMeta):
         if var_selector is None or np.count_nonzero(var_selector) == 0:
             mean = np.zeros((self.get_shape()[0], 1), dtype=np.float32)
         else:
-            X = self.get_X_array(obs_selector, var_selector)
-            if sparse.issparse(X):
-                mean = X.mean(axis=1).A
-            else:
-                mean = X.mean(axis=1, keepdims=True)
+            mean = self.get_X_row_means(var_selector, cancel_token)
 
         col_idx = pd.Index([query_hash])
         return encode_matrix_fbs(mean, col_idx=col_idx, row_idx=None)
@@ -96,6 +96,15 @@ server:
       # together in one thread.
       target_workunit: 16_000_000
 
+      # The time limit, in seconds, of a single computation, or null for no limit.
+      # Computations which exceed the limit are abandoned, and the request fails.
+      timeout: null
+
+      # The executor of the computation:  "thread", a pool of threads in the server process, or
+      # "process", a pool of worker processes (python 3.8 or later).  Worker processes avoid
+      # contention for the GIL, at the cost of memory and startup time.
+      executor: thread
+
   data_locator:
     api_base: null
     s3:
@@ -106,6 +115,10 @@ server:
       region_name: true
 
   adaptor:
+    # Independent reads from a dataset (eg, of several embeddings) are issued
+    # concurrently, on a thread pool of at most this many threads.
+    io_max_workers: 16
+
     cxg_adaptor:
       # The key/values under tiledb_ctx will be used to initialize the tiledb Context.
       # If 'vfs.s3.region' is not set, then it will automatically use the setting from
@@ -114,9 +127,39 @@ server:
         sm.tile_cache_size:  8589934592
         sm.num_reader_threads:  32
 
+  data_cache:
+    # Data derived from a dataset (eg, normalized layouts) is cached in memory and shared
+    # across requests.  Each cache is limited to the given number of bytes, and evicts the
+    # least recently used entries when full.
+    layout_max_bytes: 1_073_741_824
+
+    # Spatial selections, retained for reference by later requests (eg, diffexp).
+    selection_max_bytes: 67_108_864
+
+    # Per-gene statistics of recent differential expression comparisons.
+    diffexp_max_bytes: 268_435_456
+
+    # Encoded responses of recent gene set summaries (summarize/var).
+    summarize_max_bytes: 67_108_864
+
+    # Decoded obs and var annotation columns, shared by annotation requests and filters.
+    column_max_bytes: 268_435_456
+
+  jobs:
+    # Long running computations (eg, diffexp) may be submitted as background jobs, which run
+    # on a pool of at most max_workers threads.  Job results are kept in directory (a local
+    # path, or null for a directory in the system temporary directory) for ttl seconds after the
+    # job finishes.
+    max_workers: 2
+    directory: null
+    ttl: 3600
+
   limits:
     column_request_max: 32
+    data_var_batch_max: 256
+    data_obs_max: 64
     diffexp_cellcount_max: null
+    diffexp_groups_max: 128
 
 
 dataset:
@@ -142,6 +185,18 @@ dataset:
     lfc_cutoff: 0.01
     top_n: 10
 
+    # Approximate differential expression, when requested, draws a random subsample of
+    # at most approximate_max_cells cells from each set.  The sample is reproducible for
+    # a given seed.
+    approximate_max_cells: 50_000
+    approximate_seed: 0
+
+  virtual_obs:
+    # Computed per-cell QC annotations (total_counts, n_genes_by_counts and the pct_counts_*
+    # of gene subsets), added to the obs annotations.  They are computed by a single pass over X
+    # when first used, and then cached.
+    enable: false
+
   X_approximate_distribution: normal # currently fixed config
 
 external:
@@ -12,7 +12,6 @@ from server.common.fbs.matrix import deserialize_typed_array
 def decode_matrix_FBS(buf):
     """
     Given a FBS Matrix, return an decoded Python dict containing same info in native format.
-    NOTE / TODO: row_idx not currently implemented
     """
     df = Matrix.Matrix.GetRootAsMatrix(buf, 0)
     n_rows = df.NRows()
@@ -27,5 +26,6 @@ def decode_matrix_FBS(buf):
         decoded_columns.append(deserialize_typed_array(tarr))
 
     cidx = deserialize_typed_array((df.ColIndexType(), df.ColIndex()))
+    ridx = deserialize_typed_array((df.RowIndexType(), df.RowIndex()))
 
-    return {"n_rows": n_rows, "n_cols": n_cols, "columns": decoded_columns, "col_idx": cidx, "row_idx": None}
+    return {"n_rows": n_rows, "n_cols": n_cols, "columns": decoded_columns, "col_idx": cidx, "row_idx": ridx}
@@ -18,6 +18,11 @@ dataset:
     enable: {enable_difexp}
     lfc_cutoff: {lfc_cutoff}
     top_n: {top_n}
+    approximate_max_cells: {approximate_max_cells}
+    approximate_seed: {approximate_seed}
+
+  virtual_obs:
+    enable: {enable_virtual_obs}
 
   X_approximate_distribution: {X_approximate_distribution}
 """
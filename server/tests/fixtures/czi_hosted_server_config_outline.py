@@ -30,6 +30,8 @@ f"""server:
       max_workers: {diffexp_max_workers}
       cpu_multiplier: {cpu_multiplier}
       target_workunit: {target_workunit}  # The target number of matrix elements that are evaluated in one thread.
+      timeout: {diffexp_timeout}
+      executor: {diffexp_executor}
 
   data_locator:
     api_base: {data_locator_api_base}
@@ -37,12 +39,28 @@ f"""server:
       region_name: {data_locator_region_name}
 
   adaptor:
+    io_max_workers: {io_max_workers}
     cxg_adaptor:
       tiledb_ctx:
         sm.tile_cache_size:  {cxg_tile_cache_size}
         sm.num_reader_threads:  {cxg_num_reader_threads}
 
+  data_cache:
+    layout_max_bytes: {layout_max_bytes}
+    selection_max_bytes: {selection_max_bytes}
+    diffexp_max_bytes: {diffexp_max_bytes}
+    summarize_max_bytes: {summarize_max_bytes}
+    column_max_bytes: {column_max_bytes}
+
+  jobs:
+    max_workers: {jobs_max_workers}
+    directory: {jobs_directory}
+    ttl: {jobs_ttl}
+
   limits:
     column_request_max: {column_request_max}
+    data_var_batch_max: {data_var_batch_max}
+    data_obs_max: {data_obs_max}
     diffexp_cellcount_max: {diffexp_cellcount_max}
+    diffexp_groups_max: {diffexp_groups_max}
 """
@@ -27,16 +27,27 @@ def main():
         "-n", "--new-selection", default=False, action="store_true", help="change the selection between each trial"
     )
     parser.add_argument("--seed", default=1, type=int, help="set the random seed")
+    parser.add_argument(
+        "-e",
+        "--executor",
+        choices=("thread", "process"),
+        nargs="+",
+        default=["thread"],
+        help="executor(s) of the cxg algorithm.  If more than one, the trials are run with each in turn",
+    )
+    parser.add_argument(
+        "-c", "--no-cache", default=False, action="store_true", help="clear the diffexp cache before each trial"
+    )
 
     args = parser.parse_args()
 
     app_config = AppConfig()
     app_config.update_server_config(single_dataset__datapath=args.dataset)
-    app_config.update_server_config(app__verbose=True)
+    app_config.update_server_config(app__verbose=True, app__flask_secret_key="run_diffexp")
     app_config.complete_config()
 
     loader = MatrixDataLoader(location=args.dataset, app_config=app_config)
-    adaptor = loader.open(app_config)
+    adaptor = loader.open()
 
     if args.show:
         if isinstance(adaptor, CxgDataset):
@@ -64,31 +75,37 @@ def main():
         print("must supply numB or varB")
         sys.exit(1)
 
-    for i in range(args.trials):
-        if args.new_selection:
-            if args.numA:
-                filterA = random.sample(range(rows), args.numA)
-            if args.numB:
-                filterB = random.sample(range(rows), args.numB)
-
-        maskA = np.zeros(rows, dtype=bool)
-        maskA[filterA] = True
-        maskB = np.zeros(rows, dtype=bool)
-        maskB[filterB] = True
-
-        t1 = time.time()
-        if args.alg == "default":
-            results = adaptor.compute_diffexp_ttest(maskA, maskB)
-        elif args.alg == "generic":
-            results = diffexp_generic.diffexp_ttest(adaptor, maskA, maskB)
-        elif args.alg == "cxg":
-            if not isinstance(adaptor, CxgDataset):
-                print("cxg only works with CxgDataset")
-                sys.exit(1)
-            results = diffexp_cxg.diffexp_ttest(adaptor, maskA, maskB)
-
-        t2 = time.time()
-        print("TIME=", t2 - t1)
+    # the first trial with each executor includes the one-time costs (eg, numba compilation, and
+    # starting the worker processes), so compare the executors over several trials.
+    for executor in args.executor:
+        diffexp_cxg.executor_type = executor
+        for i in range(args.trials):
+            if args.new_selection:
+                if args.numA:
+                    filterA = random.sample(range(rows), args.numA)
+                if args.numB:
+                    filterB = random.sample(range(rows), args.numB)
+
+            maskA = np.zeros(rows, dtype=bool)
+            maskA[filterA] = True
+            maskB = np.zeros(rows, dtype=bool)
+            maskB[filterB] = True
+            if args.no_cache:
+                diffexp_cxg.mean_var_cache.clear()
+
+            t1 = time.time()
+            if args.alg == "default":
+                results = adaptor.compute_diffexp_ttest(maskA, maskB)
+            elif args.alg == "generic":
+                results = diffexp_generic.diffexp_ttest(adaptor, maskA, maskB)
+            elif args.alg == "cxg":
+                if not isinstance(adaptor, CxgDataset):
+                    print("cxg only works with CxgDataset")
+                    sys.exit(1)
+                results = diffexp_cxg.diffexp_ttest(adaptor, maskA, maskB)
+
+            t2 = time.time()
+            print(f"EXECUTOR={executor} TIME=", t2 - t1)
 
     if args.show:
         for res in results:
@@ -1,3 +1,4 @@
+import io
 import json
 import os
 import time
@@ -5,12 +6,17 @@ from http import HTTPStatus
 import hashlib
 from unittest.mock import patch
 
+import flask
+import numpy as np
 import requests
 
+from server.common import rest
 from server.common.config.app_config import AppConfig
+from server.common.utils.bundle import decode_bundle
 from server.tests import decode_fbs, FIXTURES_ROOT
 from server.tests.fixtures.fixtures import pbmc3k_colors
-from server.tests.unit import BaseTest as _BaseTest, skip_if
+from server.dataset.matrix_loader import MatrixDataLoader
+from server.tests.unit import BaseTest as _BaseTest, app_config, skip_if
 
 BAD_FILTER = {"filter": {"obs": {"annotation_value": [{"name": "xyz"}]}}}
 
@@ -68,6 +74,30 @@ class EndPoints(BaseTest):
         self.assertIn("library_versions", result_data["config"])
         self.assertEqual(result_data["config"]["displayNames"]["dataset"], "pbmc3k")
 
+    def test_bootstrap(self):
+        endpoint = "bootstrap"
+        url = f"{self.TEST_URL_BASE}{endpoint}"
+        header = {"Accept": "application/octet-stream"}
+        result = self.client.get(url, headers=header)
+        self.assertEqual(result.status_code, HTTPStatus.OK)
+        self.assertEqual(result.headers["Content-Type"], "application/octet-stream")
+        parts = dict(decode_bundle(result.data))
+        self.assertListEqual(list(parts), ["schema", "config", "colors", "layout/obs", "annotations/var"])
+
+        # each part is identical to the response of the equivalent route
+        for name in ["schema", "config", "colors"]:
+            expected = json.loads(self.client.get(f"{self.TEST_URL_BASE}{name}").data)
+            self.assertEqual(json.loads(parts[name]), expected)
+        self.assertEqual(parts["layout/obs"], self.client.get(f"{self.TEST_URL_BASE}layout/obs", headers=header).data)
+        var_index_name = self.schema["schema"]["annotations"]["var"]["index"]
+        var_index = self.client.get(
+            f"{self.TEST_URL_BASE}annotations/var?annotation-name={var_index_name}", headers=header
+        )
+        self.assertEqual(parts["annotations/var"], var_index.data)
+
+        result = self.client.get(url, headers={"Accept": "application/json"})
+        self.assertEqual(result.status_code, HTTPStatus.NOT_ACCEPTABLE)
+
     def test_get_layout_fbs(self):
         endpoint = "layout/obs"
         url = f"{self.TEST_URL_BASE}{endpoint}"
@@ -86,6 +116,73 @@ class EndPoints(BaseTest):
         self.assertIsNone(df["row_idx"])
         self.assertEqual(len(df["columns"]), df["n_cols"])
 
+    def test_get_layout_tile_fbs(self):
+        endpoint = "layout/obs/tile"
+        header = {"Accept": "application/octet-stream"}
+
+        url = f"{self.TEST_URL_BASE}{endpoint}?layout-name=umap&z=0&x=0&y=0"
+        result = self.client.get(url, headers=header)
+        self.assertEqual(result.status_code, HTTPStatus.OK)
+        self.assertEqual(result.headers["Content-Type"], "application/octet-stream")
+        df = decode_fbs.decode_matrix_FBS(result.data)
+        self.assertEqual(df["n_rows"], 2638)
+        self.assertListEqual(df["col_idx"], ["obs", "umap_0", "umap_1"])
+
+        url = f"{self.TEST_URL_BASE}{endpoint}?layout-name=umap&z=1&x=1&y=0&limit=100"
+        result = self.client.get(url, headers=header)
+        self.assertEqual(result.status_code, HTTPStatus.OK)
+        df = decode_fbs.decode_matrix_FBS(result.data)
+        self.assertLessEqual(df["n_rows"], 100)
+        self.assertTrue(all(x >= 0.5 for x in df["columns"][1]))
+
+        url = f"{self.TEST_URL_BASE}{endpoint}?layout-name=umap&z=0&x=0&y=0&mode=counts&depth=2"
+        result = self.client.get(url, headers=header)
+        self.assertEqual(result.status_code, HTTPStatus.OK)
+        df = decode_fbs.decode_matrix_FBS(result.data)
+        self.assertListEqual(df["col_idx"], ["x", "y", "count"])
+        self.assertEqual(sum(df["columns"][2]), 2638)
+
+        for query in ["layout-name=umap&z=1&x=2&y=0", "layout-name=umap&z=0", "layout-name=nope&z=0&x=0&y=0"]:
+            result = self.client.get(f"{self.TEST_URL_BASE}{endpoint}?{query}", headers=header)
+            self.assertEqual(result.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_get_layout_raster_fbs(self):
+        endpoint = "layout/obs/raster"
+        header = {"Accept": "application/octet-stream"}
+        result = self.client.get(f"{self.TEST_URL_BASE}{endpoint}?layout-name=umap&width=16&height=8", headers=header)
+        self.assertEqual(result.status_code, HTTPStatus.OK)
+        self.assertEqual(result.headers["Content-Type"], "application/octet-stream")
+        df = decode_fbs.decode_matrix_FBS(result.data)
+        self.assertListEqual(df["col_idx"], ["x", "y", "count"])
+        self.assertEqual(sum(df["columns"][2]), 2638)
+        self.assertTrue(all(x < 16 for x in df["columns"][0]) and all(y < 8 for y in df["columns"][1]))
+
+        for query in ["width=16", "layout-name=umap&width=0", "layout-name=nope", "layout-name=umap&agg=min"]:
+            result = self.client.get(f"{self.TEST_URL_BASE}{endpoint}?{query}", headers=header)
+            self.assertEqual(result.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_layout_selection(self):
+        endpoint = "layout/obs/selection"
+        url = f"{self.TEST_URL_BASE}{endpoint}"
+        result = self.client.post(url, json={"layout": "umap", "box": [0, 0, 0.5, 1], "index": True})
+        self.assertEqual(result.status_code, HTTPStatus.OK)
+        self.assertEqual(result.headers["Content-Type"], "application/json")
+        selection = json.loads(result.data)
+        self.assertGreater(selection["count"], 0)
+        self.assertLess(selection["count"], 2638)
+        self.assertEqual(
+            sum(1 if type(i) == int else i[1] - i[0] for i in selection["index"]), selection["count"]
+        )
+
+        polygon = [[0, 0], [0.5, 0], [0.5, 1], [0, 1]]
+        result = self.client.post(url, json={"layout": "umap", "polygon": polygon})
+        self.assertEqual(result.status_code, HTTPStatus.OK)
+        self.assertNotEqual(json.loads(result.data)["selection"], selection["selection"])
+
+        for body in [{"layout": "umap"}, {"box": [0, 0, 1, 1]}, {"layout": "umap", "polygon": [[0, 0]]}]:
+            result = self.client.post(url, json=body)
+            self.assertEqual(result.status_code, HTTPStatus.BAD_REQUEST)
+
     def test_bad_filter(self):
         endpoint = "data/var"
         url = f"{self.TEST_URL_BASE}{endpoint}"
@@ -138,6 +235,60 @@ class EndPoints(BaseTest):
 
     # TEMP: Testing count 15 to match hardcoded values for diffexp
     # TODO(#1281): Switch back to dynamic values
+    def test_search_var(self):
+        result = self.client.get(f"{self.TEST_URL_BASE}search/var?q=cd&limit=10")
+        self.assertEqual(result.status_code, HTTPStatus.OK)
+        self.assertEqual(result.headers["Content-Type"], "application/json")
+        matches = json.loads(result.data)["matches"]
+        self.assertEqual(len(matches), 10)
+        self.assertTrue(all(match["name"].lower().startswith("cd") for match in matches))
+
+        # the var positions index the var annotations
+        header = {"Accept": "application/octet-stream"}
+        var_index_name = self.schema["schema"]["annotations"]["var"]["index"]
+        url = f"{self.TEST_URL_BASE}annotations/var?annotation-name={var_index_name}"
+        var_index = decode_fbs.decode_matrix_FBS(self.client.get(url, headers=header).data)["columns"][0]
+        self.assertListEqual([var_index[match["var"]] for match in matches], [match["name"] for match in matches])
+
+        matches = json.loads(self.client.get(f"{self.TEST_URL_BASE}search/var?q=cD79b").data)["matches"]
+        self.assertListEqual([match["name"] for match in matches], ["CD79B"])
+
+        for query in ["", "q=", "q=%20", "q=cd&limit=0", "q=cd&limit=1001"]:
+            result = self.client.get(f"{self.TEST_URL_BASE}search/var?{query}")
+            self.assertEqual(result.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_get_summary_obs(self):
+        url = f"{self.TEST_URL_BASE}summary/obs?annotation-name=louvain&annotation-name=n_genes&bins=10"
+        result = self.client.get(url)
+        self.assertEqual(result.status_code, HTTPStatus.OK)
+        self.assertEqual(result.headers["Content-Type"], "application/json")
+        summary = json.loads(result.data)
+        self.assertEqual(summary["n"], 2638)
+        louvain = summary["obs"]["louvain"]
+        self.assertEqual(louvain["type"], "categorical")
+        self.assertEqual(dict(zip(louvain["categories"], louvain["counts"]))["B cells"], 342)
+        self.assertEqual(sum(louvain["counts"]), 2638)
+        n_genes = summary["obs"]["n_genes"]
+        self.assertEqual((n_genes["min"], n_genes["max"], n_genes["nan"]), (212, 2455, 0))
+        self.assertEqual(len(n_genes["counts"]), 10)
+        self.assertEqual(sum(n_genes["counts"]), 2638)
+
+        # restricted to a selection, the histogram bins are unchanged
+        result = self.client.post(
+            f"{self.TEST_URL_BASE}layout/obs/selection", json={"layout": "umap", "box": [0, 0, 0.5, 1]}
+        )
+        selection = json.loads(result.data)
+        result = self.client.get(f"{url}&selection={selection['selection']}")
+        self.assertEqual(result.status_code, HTTPStatus.OK)
+        subset = json.loads(result.data)
+        self.assertEqual(subset["n"], selection["count"])
+        self.assertEqual(sum(subset["obs"]["louvain"]["counts"]), selection["count"])
+        self.assertEqual((subset["obs"]["n_genes"]["min"], subset["obs"]["n_genes"]["max"]), (212, 2455))
+
+        for query in ["annotation-name=nonexistent", "bins=0", "selection=nonexistent"]:
+            result = self.client.get(f"{self.TEST_URL_BASE}summary/obs?{query}")
+            self.assertEqual(result.status_code, HTTPStatus.BAD_REQUEST)
+
     def test_diff_exp(self):
         endpoint = "diffexp/obs"
         url = f"{self.TEST_URL_BASE}{endpoint}"
@@ -405,6 +556,328 @@ class EndPoints(BaseTest):
         self.assertAlmostEqual(df["columns"][0][0], -0.16628358)
 
 
+class TestDataVarBatch(BaseTest):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.TEST_S3_URI = f"{FIXTURES_ROOT}/nan.cxg"
+        cls.TEST_URL_BASE = f"/s3_uri/{cls.encode_s3_uri(cls.TEST_S3_URI)}/api/v0.3/"
+        cls.app.testing = True
+        cls.client = cls.app.test_client()
+
+    def test_data_var_batch(self):
+        url = f"{self.TEST_URL_BASE}data/var/batch"
+        header = {"Accept": "application/octet-stream"}
+        var_indices = [7, 0, 42, 7, 99]
+        for result in [
+            self.client.post(url, headers=header, json={"var": var_indices}),
+            self.client.post(
+                url,
+                headers={**header, "Content-Type": "application/octet-stream"},
+                data=np.array(var_indices, dtype="<u4").tobytes(),
+            ),
+        ]:
+            self.assertEqual(result.status_code, HTTPStatus.OK)
+            self.assertEqual(result.headers["Content-Type"], "application/octet-stream")
+            parts = decode_bundle(result.data)
+            self.assertListEqual([name for name, _ in parts], [str(var) for var in var_indices])
+            self.assertEqual(parts[0][1], parts[3][1])
+            for name, fbs in parts:
+                expected = self.client.put(
+                    f"{self.TEST_URL_BASE}data/var", headers=header, json={"filter": {"var": {"index": [int(name)]}}}
+                )
+                df, expected_df = decode_fbs.decode_matrix_FBS(fbs), decode_fbs.decode_matrix_FBS(expected.data)
+                self.assertEqual(df["col_idx"], expected_df["col_idx"])
+                np.testing.assert_array_equal(df["columns"][0], expected_df["columns"][0])
+
+        for body in [{"var": [100]}, {"var": ["a"]}, {"vars": [1]}]:
+            result = self.client.post(url, headers=header, json=body)
+            self.assertEqual(result.status_code, HTTPStatus.BAD_REQUEST)
+
+        # a failure to read the first part fails the request, rather than truncating a 200 response
+        data_adaptor = MatrixDataLoader(self.TEST_S3_URI, app_config=app_config(self.TEST_S3_URI)).open()
+        with self.app.test_request_context(url, method="POST", headers=header, json={"var": var_indices}):
+            with patch("server.dataset.cxg_dataset.CxgDataset.get_X_array", side_effect=OSError("read failed")):
+                with self.assertRaises(OSError):
+                    rest.data_var_batch_post(flask.request, data_adaptor)
+
+        result = self.client.post(url, headers=header, json={"var": []})
+        self.assertEqual(result.status_code, HTTPStatus.OK)
+        self.assertEqual(decode_bundle(result.data), [])
+
+    def test_data_var_obs_filter(self):
+        url = f"{self.TEST_URL_BASE}data/var"
+        header = {"Accept": "application/octet-stream"}
+        all_obs = decode_fbs.decode_matrix_FBS(
+            self.client.put(url, headers=header, json={"filter": {"var": {"index": [7, 42]}}}).data
+        )
+        for obs_filter, expected_rows in [
+            ({"index": [[10, 20], 50]}, list(range(10, 20)) + [50]),
+            ({"annotation_value": [{"name": "n_genes", "min": 1000}]}, None),
+        ]:
+            filter = {"filter": {"obs": obs_filter, "var": {"index": [7, 42]}}}
+            result = self.client.put(url, headers=header, json=filter)
+            self.assertEqual(result.status_code, HTTPStatus.OK)
+            df = decode_fbs.decode_matrix_FBS(result.data)
+            self.assertListEqual(df["col_idx"].tolist(), [7, 42])
+            rows = df["row_idx"].tolist()
+            self.assertEqual(df["n_rows"], len(rows))
+            if expected_rows is not None:
+                self.assertListEqual(rows, expected_rows)
+            self.assertGreater(len(rows), 0)
+            self.assertLess(len(rows), 100)
+            for column, expected in zip(df["columns"], all_obs["columns"]):
+                np.testing.assert_array_equal(column, expected[rows])
+
+
+class TestSummaryVar(BaseTest):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.TEST_S3_URI = f"{FIXTURES_ROOT}/nan.cxg"
+        cls.TEST_URL_BASE = f"/s3_uri/{cls.encode_s3_uri(cls.TEST_S3_URI)}/api/v0.3/"
+        cls.app.testing = True
+        cls.client = cls.app.test_client()
+
+    def test_summary_var(self):
+        url = f"{self.TEST_URL_BASE}summary/var?var-index=7&var-index=0&bins=8"
+        result = self.client.get(url)
+        self.assertEqual(result.status_code, HTTPStatus.OK)
+        self.assertEqual(result.headers["Content-Type"], "application/json")
+        summary = json.loads(result.data)
+        self.assertEqual(summary["n"], 100)
+        self.assertListEqual([var["index"] for var in summary["var"]], [7, 0])
+        for var in summary["var"]:
+            self.assertEqual(len(var["counts"]), 8)
+            self.assertEqual(sum(var["counts"]) + var["nan"], 100)
+            self.assertEqual(len(var["quantiles"]), len(summary["q"]))
+            self.assertLessEqual(var["min"], var["quantiles"][0])
+            self.assertLessEqual(var["quantiles"][-1], var["max"])
+
+        for query in ["", "var-index=100", "var-index=a", "var-index=1&bins=0", "var-index=1&selection=nonexistent"]:
+            result = self.client.get(f"{self.TEST_URL_BASE}summary/var?{query}")
+            self.assertEqual(result.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_summary_var_groups(self):
+        url = f"{self.TEST_URL_BASE}summary/var/groups?obs=louvain&var-index=7&var-index=0&var-index=42"
+        result = self.client.get(url)
+        self.assertEqual(result.status_code, HTTPStatus.OK)
+        self.assertEqual(result.headers["Content-Type"], "application/json")
+        summary = json.loads(result.data)
+        self.assertListEqual(summary["var"], [7, 0, 42])
+        self.assertEqual(sum(summary["n"]), 100)
+        n_categories = len(summary["categories"])
+        self.assertEqual(np.array(summary["mean"]).shape, (n_categories, 3))
+        self.assertEqual(np.array(summary["fraction"]).shape, (n_categories, 3))
+
+        # compare with the per-cell values
+        header = {"Accept": "application/octet-stream"}
+        louvain = decode_fbs.decode_matrix_FBS(
+            self.client.get(f"{self.TEST_URL_BASE}annotations/obs?annotation-name=louvain", headers=header).data
+        )["columns"][0]
+        filter = {"filter": {"var": {"index": [7]}}}
+        X = decode_fbs.decode_matrix_FBS(
+            self.client.put(f"{self.TEST_URL_BASE}data/var", headers=header, json=filter).data
+        )["columns"][0]
+        for k, category in enumerate(summary["categories"]):
+            values = np.array(X)[np.array(louvain) == category]
+            finite = values[np.isfinite(values)]
+            if len(finite):
+                self.assertAlmostEqual(summary["mean"][k][0], finite.mean(), places=5)
+                # over the same cells as the mean
+                self.assertAlmostEqual(summary["fraction"][k][0], np.count_nonzero(finite) / len(finite))
+
+        for query in ["obs=louvain", "var-index=1", "obs=n_genes&var-index=1", "obs=louvain&var-index=100"]:
+            result = self.client.get(f"{self.TEST_URL_BASE}summary/var/groups?{query}")
+            self.assertEqual(result.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_data_obs(self):
+        result = self.client.get(f"{self.TEST_URL_BASE}data/obs?obs-index=9&obs-index=2&top-n=3")
+        self.assertEqual(result.status_code, HTTPStatus.OK)
+        self.assertEqual(result.headers["Content-Type"], "application/json")
+        cells = json.loads(result.data)["cells"]
+        self.assertListEqual([cell["obs"] for cell in cells], [9, 2])
+
+        # compare with the per-cell values of each gene
+        header = {"Accept": "application/octet-stream"}
+        for cell in json.loads(self.client.get(f"{self.TEST_URL_BASE}data/obs?obs-index=9").data)["cells"]:
+            filter = {"filter": {"obs": {"index": [9]}, "var": {"index": cell["var"][:8]}}}
+            X = decode_fbs.decode_matrix_FBS(
+                self.client.put(f"{self.TEST_URL_BASE}data/var", headers=header, json=filter).data
+            )
+            self.assertListEqual(X["col_idx"].tolist(), cell["var"][:8])
+            np.testing.assert_array_almost_equal([column[0] for column in X["columns"]], cell["values"][:8])
+        self.assertEqual(len(cells[0]["var"]), 3)
+        self.assertListEqual(cells[0]["values"], sorted(cell["values"], reverse=True)[:3])
+
+        for query in ["", "obs-index=a", "obs-index=100", "obs-index=1&top-n=0", "obs-index=1&top-n=a"]:
+            result = self.client.get(f"{self.TEST_URL_BASE}data/obs?{query}")
+            self.assertEqual(result.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_summary_var_quantiles(self):
+        url = f"{self.TEST_URL_BASE}summary/var/quantiles"
+        groups = [["B cells"], ["CD4 T cells", "CD8 T cells"], ["Megakaryocytes"]]
+        result = self.client.post(url, json={"obs": "louvain", "var": [7, 0], "groups": groups})
+        self.assertEqual(result.status_code, HTTPStatus.OK)
+        self.assertEqual(result.headers["Content-Type"], "application/json")
+        summary = json.loads(result.data)
+        self.assertListEqual(summary["groups"], groups)
+        self.assertListEqual(summary["n"], [14, 52, 0])
+        self.assertListEqual(summary["q"], [0, 0.25, 0.5, 0.75, 1])
+        for quantiles in summary["quantiles"][0] + summary["quantiles"][1]:
+            self.assertEqual(len(quantiles), 5)
+            self.assertListEqual(quantiles, sorted(quantiles))
+        self.assertListEqual(summary["quantiles"][2], [[None] * 5] * 2)
+
+        # by default, each category alone
+        result = self.client.post(url, json={"obs": "louvain", "var": [7], "quantiles": [0.5]})
+        self.assertEqual(result.status_code, HTTPStatus.OK)
+        self.assertEqual(sum(json.loads(result.data)["n"]), 100)
+
+        for body in [
+            {"obs": "louvain"},
+            {"obs": "n_genes", "var": [1]},
+            {"obs": "louvain", "var": [1], "groups": [["nonexistent"]]},
+            {"obs": "louvain", "var": [1], "quantiles": [2]},
+        ]:
+            result = self.client.post(url, json=body)
+            self.assertEqual(result.status_code, HTTPStatus.BAD_REQUEST)
+
+        # empty groups are rejected before summarizing
+        with patch("server.dataset.cxg_dataset.CxgDataset.summarize_var_quantiles") as summarize_var_quantiles:
+            result = self.client.post(url, json={"obs": "louvain", "var": [1], "groups": [["B cells"], []]})
+            self.assertEqual(result.status_code, HTTPStatus.BAD_REQUEST)
+            summarize_var_quantiles.assert_not_called()
+
+
+class TestDiffExpGroups(BaseTest):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.TEST_S3_URI = f"{FIXTURES_ROOT}/nan.cxg"
+        cls.TEST_URL_BASE = f"/s3_uri/{cls.encode_s3_uri(cls.TEST_S3_URI)}/api/v0.3/"
+        cls.app.testing = True
+        cls.client = cls.app.test_client()
+
+    def test_diffexp_groups(self):
+        url = f"{self.TEST_URL_BASE}diffexp/obs/groups"
+        result = self.client.post(url, json={"obs": "louvain", "count": 5})
+        self.assertEqual(result.status_code, HTTPStatus.OK)
+        self.assertEqual(result.headers["Content-Type"], "application/json")
+        result_data = json.loads(result.data)
+        self.assertEqual(result_data["obs"], "louvain")
+        groups = {group["category"]: group for group in result_data["groups"]}
+        self.assertEqual(sum(group["n"] for group in groups.values()), 100)
+
+        for group in groups.values():
+            self.assertEqual(len(group["positive"]), 5)
+            self.assertEqual(len(group["negative"]), 5)
+
+        for body in [{"obs": "n_genes"}, {"obs": "nonexistent"}, {"var": "louvain"}, {"obs": "louvain", "count": 0}]:
+            result = self.client.post(url, json=body)
+            self.assertEqual(result.status_code, HTTPStatus.BAD_REQUEST)
+
+
+class TestJobs(BaseTest):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.TEST_S3_URI = f"{FIXTURES_ROOT}/nan.cxg"
+        cls.TEST_URL_BASE = f"/s3_uri/{cls.encode_s3_uri(cls.TEST_S3_URI)}/api/v0.3/"
+        cls.app.testing = True
+        cls.client = cls.app.test_client()
+
+    def wait_for_job(self, job_id):
+        url = f"{self.TEST_URL_BASE}jobs/{job_id}"
+        for i in range(300):
+            result = self.client.get(url)
+            self.assertEqual(result.status_code, HTTPStatus.OK)
+            job = json.loads(result.data)
+            if job["finished"] is not None:
+                return job
+            time.sleep(0.1)
+        self.fail("job did not finish")
+
+    def test_diffexp_job(self):
+        params = {
+            "mode": "topN",
+            "set1": {"filter": {"obs": {"index": [[0, 50]]}}},
+            "set2": {"filter": {"obs": {"index": [[50, 100]]}}},
+        }
+        result = self.client.post(f"{self.TEST_URL_BASE}jobs/diffexp/obs", json=params)
+        self.assertEqual(result.status_code, HTTPStatus.ACCEPTED)
+        job = json.loads(result.data)
+        self.assertEqual(job["type"], "diffexp")
+
+        job = self.wait_for_job(job["id"])
+        self.assertEqual(job["status"], "succeeded")
+        result = self.client.get(f"{self.TEST_URL_BASE}jobs/{job['id']}/result")
+        self.assertEqual(result.status_code, HTTPStatus.OK)
+        self.assertEqual(result.headers["Content-Type"], "application/json")
+        expected = self.client.post(f"{self.TEST_URL_BASE}diffexp/obs", json=params)
+        self.assertEqual(json.loads(result.data), json.loads(expected.data))
+
+        # the job belongs to its dataset
+        other_url_base = f"/s3_uri/{self.encode_s3_uri(f'{FIXTURES_ROOT}/pbmc3k.cxg')}/api/v0.3/"
+        result = self.client.get(f"{other_url_base}jobs/{job['id']}")
+        self.assertEqual(result.status_code, HTTPStatus.NOT_FOUND)
+
+        # discard the job
+        result = self.client.delete(f"{self.TEST_URL_BASE}jobs/{job['id']}")
+        self.assertEqual(result.status_code, HTTPStatus.NO_CONTENT)
+        result = self.client.get(f"{self.TEST_URL_BASE}jobs/{job['id']}/result")
+        self.assertEqual(result.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_failed_job(self):
+        params = {"mode": "topN", "set1": {"filter": {"obs": {"index": [[0, 50]]}}}}
+        result = self.client.post(f"{self.TEST_URL_BASE}jobs/diffexp/obs", json={**params, "approximate": "yes"})
+        self.assertEqual(result.status_code, HTTPStatus.BAD_REQUEST)
+
+        # bad filters are rejected before a job is submitted, as by /diffexp/obs
+        params["set2"] = {"filter": {"obs": {"annotation_value": [{"name": "nonexistent", "values": ["a"]}]}}}
+        result = self.client.post(f"{self.TEST_URL_BASE}jobs/diffexp/obs", json=params)
+        self.assertEqual(result.status_code, HTTPStatus.BAD_REQUEST)
+
+        params["set2"] = {"filter": {"obs": {"index": [[50, 100]]}}}
+        with patch("server.dataset.cxg_dataset.CxgDataset.diffexp_topN_from_masks", side_effect=ValueError("bad")):
+            result = self.client.post(f"{self.TEST_URL_BASE}jobs/diffexp/obs", json=params)
+            self.assertEqual(result.status_code, HTTPStatus.ACCEPTED)
+            job = self.wait_for_job(json.loads(result.data)["id"])
+        self.assertEqual(job["status"], "failed")
+        self.assertIsNotNone(job["error"])
+        result = self.client.get(f"{self.TEST_URL_BASE}jobs/{job['id']}/result")
+        self.assertEqual(result.status_code, HTTPStatus.BAD_REQUEST)
+
+        for job_id in ("0" * 32, "../schema"):
+            result = self.client.get(f"{self.TEST_URL_BASE}jobs/{job_id}")
+            self.assertEqual(result.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_summarize_var_job(self):
+        query = "method=mean&var:name_0=0&var:name_0=1"
+        query_hash = hashlib.sha1(query.encode()).hexdigest()
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        url = f"{self.TEST_URL_BASE}jobs/summarize/var?key={query_hash}"
+        result = self.client.post(url, headers=headers, data=query)
+        self.assertEqual(result.status_code, HTTPStatus.ACCEPTED)
+        job = self.wait_for_job(json.loads(result.data)["id"])
+        self.assertEqual(job["status"], "succeeded")
+
+        result = self.client.get(f"{self.TEST_URL_BASE}jobs/{job['id']}/result")
+        self.assertEqual(result.status_code, HTTPStatus.OK)
+        self.assertEqual(result.headers["Content-Type"], "application/octet-stream")
+        headers["Accept"] = "application/octet-stream"
+        expected = self.client.post(f"{self.TEST_URL_BASE}summarize/var?key={query_hash}", headers=headers, data=query)
+        self.assertEqual(result.data, expected.data)
+
+        # a chunked body has no Content-Length
+        chunked_headers = {**headers, "Transfer-Encoding": "chunked"}
+        for endpoint, status in [("jobs/summarize/var", HTTPStatus.ACCEPTED), ("summarize/var", HTTPStatus.OK)]:
+            result = self.client.post(
+                f"{self.TEST_URL_BASE}{endpoint}", headers=chunked_headers, input_stream=io.BytesIO(query.encode())
+            )
+            self.assertEqual(result.status_code, status)
+
+
 class TestDatasetMetadata(BaseTest):
     @classmethod
     def setUpClass(cls):
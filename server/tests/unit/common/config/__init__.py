@@ -49,12 +49,26 @@ class ConfigTests(BaseTest):
         diffexp_max_workers=64,
         cpu_multiplier=4,
         target_workunit="16_000_000",
+        diffexp_timeout="null",
+        diffexp_executor="thread",
         data_locator_region_name="us-east-1",
         data_locator_api_base="null",
         cxg_tile_cache_size=8589934592,
         cxg_num_reader_threads=32,
+        io_max_workers=16,
+        layout_max_bytes=1073741824,
+        selection_max_bytes=67108864,
+        diffexp_max_bytes=268435456,
+        summarize_max_bytes=67108864,
+        column_max_bytes=268435456,
+        jobs_max_workers=2,
+        jobs_directory="null",
+        jobs_ttl=3600,
         column_request_max=32,
+        data_var_batch_max=256,
+        data_obs_max=64,
         diffexp_cellcount_max="null",
+        diffexp_groups_max=128,
         config_file_name="server_config.yaml",
     ):
         configfile = os.path.join(self.tmp_fixtures_directory, config_file_name)
@@ -96,12 +110,26 @@ class ConfigTests(BaseTest):
         diffexp_max_workers=64,
         cpu_multiplier=4,
         target_workunit="16_000_000",
+        diffexp_timeout="null",
+        diffexp_executor="thread",
         data_locator_region_name="us-east-1",
         data_locator_api_base="null",
         cxg_tile_cache_size=8589934592,
         cxg_num_reader_threads=32,
+        io_max_workers=16,
+        layout_max_bytes=1073741824,
+        selection_max_bytes=67108864,
+        diffexp_max_bytes=268435456,
+        summarize_max_bytes=67108864,
+        column_max_bytes=268435456,
+        jobs_max_workers=2,
+        jobs_directory="null",
+        jobs_ttl=3600,
         column_request_max=32,
+        data_var_batch_max=256,
+        data_obs_max=64,
         diffexp_cellcount_max="null",
+        diffexp_groups_max=128,
         scripts=[],
         inline_scripts=[],
         about_legal_tos="null",
@@ -118,6 +146,9 @@ class ConfigTests(BaseTest):
         enable_difexp="true",
         lfc_cutoff=0.01,
         top_n=10,
+        approximate_max_cells=50000,
+        approximate_seed=0,
+        enable_virtual_obs="false",
         environment=None,
         aws_secrets_manager_region=None,
         aws_secrets_manager_secrets=[],
@@ -155,12 +186,26 @@ class ConfigTests(BaseTest):
             diffexp_max_workers=diffexp_max_workers,
             cpu_multiplier=cpu_multiplier,
             target_workunit=target_workunit,
+            diffexp_timeout=diffexp_timeout,
+            diffexp_executor=diffexp_executor,
             data_locator_region_name=data_locator_region_name,
             data_locator_api_base=data_locator_api_base,
             cxg_tile_cache_size=cxg_tile_cache_size,
             cxg_num_reader_threads=cxg_num_reader_threads,
+            io_max_workers=io_max_workers,
+            layout_max_bytes=layout_max_bytes,
+            selection_max_bytes=selection_max_bytes,
+            diffexp_max_bytes=diffexp_max_bytes,
+            summarize_max_bytes=summarize_max_bytes,
+            column_max_bytes=column_max_bytes,
+            jobs_max_workers=jobs_max_workers,
+            jobs_directory=jobs_directory,
+            jobs_ttl=jobs_ttl,
             column_request_max=column_request_max,
+            data_var_batch_max=data_var_batch_max,
+            data_obs_max=data_obs_max,
             diffexp_cellcount_max=diffexp_cellcount_max,
+            diffexp_groups_max=diffexp_groups_max,
             config_file_name=f"temp_server_config_{random_num}.yml",
         )
         dataset_config = self.custom_dataset_config(
@@ -180,6 +225,9 @@ class ConfigTests(BaseTest):
             enable_difexp=enable_difexp,
             lfc_cutoff=lfc_cutoff,
             top_n=top_n,
+            approximate_max_cells=approximate_max_cells,
+            approximate_seed=approximate_seed,
+            enable_virtual_obs=enable_virtual_obs,
             X_approximate_distribution=X_approximate_distribution,
             config_file_name=f"temp_dataset_config_{random_num}.yml",
         )
@@ -215,6 +263,9 @@ class ConfigTests(BaseTest):
         enable_difexp="true",
         lfc_cutoff=0.01,
         top_n=10,
+        approximate_max_cells=50000,
+        approximate_seed=0,
+        enable_virtual_obs="false",
         X_approximate_distribution="normal",
         config_file_name="dataset_config.yml",
     ):
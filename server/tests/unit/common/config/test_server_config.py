@@ -47,7 +47,7 @@ class TestServerConfig(ConfigTests):
     def test_complete_config_checks_all_attr(self, mock_check_attrs):
         mock_check_attrs.side_effect = BaseConfig.validate_correct_type_of_configuration_attribute()
         self.server_config.complete_config(self.context)
-        self.assertEqual(mock_check_attrs.call_count, 31)
+        self.assertEqual(mock_check_attrs.call_count, 45)
 
     def test_handle_app__throws_error_if_port_doesnt_exist(self):
         config = self.get_config(port=99999999)
@@ -281,7 +281,15 @@ class TestServerConfig(ConfigTests):
         config.update_from_config_file(custom_config_file)
         config.server_config.handle_diffexp()
         # called with the min of diffexp_max_workers and cpus*cpu_multiplier
-        mock_tiledb_config.assert_called_once_with(1, 4)
+        mock_tiledb_config.assert_called_once_with(1, 4, None, "thread")
+
+        custom_config_file = self.custom_app_config(
+            dataroot=f"{FIXTURES_ROOT}", diffexp_executor="cluster", config_file_name=self.config_file_name
+        )
+        config = AppConfig()
+        config.update_from_config_file(custom_config_file)
+        with self.assertRaises(ConfigurationError):
+            config.server_config.handle_diffexp()
 
     @patch("server.dataset.cxg_dataset.CxgDataset.set_tiledb_context")
     def test_handle_adaptor(self, mock_tiledb_context):
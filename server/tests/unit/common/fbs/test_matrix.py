@@ -6,7 +6,7 @@ from parameterized import parameterized_class
 import json
 
 from server.tests import decode_fbs
-from server.common.fbs.matrix import encode_matrix_fbs, decode_matrix_fbs
+from server.common.fbs.matrix import encode_matrix_fbs, encode_columns_fbs, decode_matrix_fbs
 from server.common.utils.type_conversion_utils import get_dtypes_and_schemas_of_dataframe
 import server.common.fbs as fbs
 
@@ -17,9 +17,9 @@ class FbsTests(unittest.TestCase):
     def test_encode_boundary(self):
         """test various boundary checks"""
 
-        # row indexing is unsupported
+        # row index must match the number of rows
         with self.assertRaises(ValueError):
-            encode_matrix_fbs(matrix=pd.DataFrame(), row_idx=[])
+            encode_matrix_fbs(matrix=np.zeros((3, 2)), row_idx=[0, 1])
 
         # matrix must be 2D
         with self.assertRaises(ValueError):
@@ -66,6 +66,36 @@ class FbsTests(unittest.TestCase):
         fbs = encode_matrix_fbs(matrix=csc, row_idx=None, col_idx=None)
         self.fbs_checks(fbs, (2, 3), expected_types, None)
 
+    def test_encode_columns(self):
+        arr = np.arange(0, 20, dtype=np.float32).reshape((10, 2))
+        columns = [arr[:, 0], arr[:, 1], np.ones((10,), dtype=np.int64)]
+        fbs = encode_columns_fbs(columns, n_rows=10, col_idx=pd.Index(["a", "b", "c"]))
+        df = decode_matrix_fbs(fbs)
+        self.assertListEqual(df.columns.tolist(), ["a", "b", "c"])
+        self.assertTrue(np.array_equal(df["a"], arr[:, 0]))
+        self.assertTrue(np.array_equal(df["b"], arr[:, 1]))
+        self.assertEqual(df["c"].dtype, np.int32)
+
+        # same wire format as the equivalent matrix
+        self.assertEqual(encode_columns_fbs(columns[0:2], n_rows=10), encode_matrix_fbs(arr))
+
+        # columns must all be the same length
+        with self.assertRaises(ValueError):
+            encode_columns_fbs([np.zeros((3,)), np.zeros((4,))], n_rows=3)
+
+    def test_row_index(self):
+        arr = np.arange(0, 20, dtype=np.float32).reshape((10, 2))
+        row_idx = np.array([1, 3, 4, 8, 9, 11, 20, 21, 22, 99])
+        for buf in [
+            encode_matrix_fbs(arr, row_idx=row_idx, col_idx=np.array([7, 3])),
+            encode_columns_fbs([arr[:, 0], arr[:, 1]], n_rows=10, col_idx=np.array([7, 3]), row_idx=row_idx),
+        ]:
+            df = decode_matrix_fbs(buf)
+            self.assertListEqual(df.index.tolist(), row_idx.tolist())
+            self.assertListEqual(df.columns.tolist(), [7, 3])
+            self.assertTrue(np.array_equal(df.to_numpy(), arr))
+            self.assertListEqual(decode_fbs.decode_matrix_FBS(buf)["row_idx"].tolist(), row_idx.tolist())
+
     def test_roundtrip(self):
         dfSrc = pd.DataFrame(
             data={
@@ -0,0 +1,120 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from server.common import jobs
+from server.common.jobs import JobStore
+
+
+class JobStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = JobStore(self.tmpdir.name, ttl=10)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def make_record(self, job_id, finished=None):
+        return dict(id=job_id, finished=finished, expires=None if finished is None else finished + self.store.ttl)
+
+    def record_exists(self, job_id):
+        return os.path.exists(os.path.join(self.tmpdir.name, job_id + ".json"))
+
+    def test_expiry(self):
+        # unfinished jobs do not expire, however old
+        running_id, expired_id, finished_id = "a" * 32, "b" * 32, "c" * 32
+        self.store.put(self.make_record(running_id))
+        self.store.put(self.make_record(expired_id, finished=time.time() - 20), b"result")
+        self.store.put(self.make_record(finished_id, finished=time.time()), b"result")
+        for job_id in (running_id, expired_id, finished_id):
+            os.utime(os.path.join(self.tmpdir.name, job_id + ".json"), (time.time() - 20, time.time() - 20))
+
+        self.store.sweep()
+        self.assertIsNotNone(self.store.get(running_id))
+        self.assertFalse(self.record_exists(expired_id))
+        self.assertIsNone(self.store.get_result(expired_id))
+        self.assertIsNotNone(self.store.get(finished_id))
+        self.assertIsNone(self.store.get(expired_id))
+
+    def test_sweep_interval(self):
+        self.store.sweep()
+        expired_id = "d" * 32
+        self.store.put(self.make_record(expired_id, finished=time.time() - 20))
+        os.utime(os.path.join(self.tmpdir.name, expired_id + ".json"), (time.time() - 20, time.time() - 20))
+
+        # the directory is not swept again until the interval has passed
+        self.store.sweep()
+        self.assertTrue(self.record_exists(expired_id))
+        self.store.last_sweep -= self.store.sweep_interval
+        self.store.sweep()
+        self.assertFalse(self.record_exists(expired_id))
+
+    def wait_for_job(self, job_id):
+        for i in range(100):
+            record = jobs.get_job_store().get(job_id)
+            if record is not None and record["finished"] is not None:
+                return record
+            time.sleep(0.05)
+        self.fail("job did not finish")
+
+    def test_job_outlasting_ttl(self):
+        saved = (jobs.job_max_workers, jobs.job_directory, jobs.job_ttl)
+        jobs.set_config(1, self.tmpdir.name, 0.5)
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_job(cancel_token):
+            started.set()
+            release.wait()
+            return "application/json", b"{}"
+
+        try:
+            record = jobs.submit_job("test", "location", slow_job)
+            self.assertIsNone(record["expires"])
+            started.wait()
+            time.sleep(0.6)
+            jobs.get_job_store().last_sweep = None
+            other = jobs.submit_job("test", "location", slow_job)  # sweeps
+
+            # the job is still reported while it runs past the ttl, and expires ttl after it finishes
+            running = jobs.get_job(record["id"], "location")
+            self.assertEqual(running["status"], "running")
+            self.assertIsNone(running["expires"])
+            release.set()
+            finished = self.wait_for_job(record["id"])
+            self.wait_for_job(other["id"])
+            self.assertEqual(finished["status"], "succeeded")
+            self.assertAlmostEqual(finished["expires"], finished["finished"] + 0.5, places=2)
+            time.sleep(0.6)
+            self.assertIsNone(jobs.get_job(record["id"], "location"))
+        finally:
+            release.set()
+            jobs.set_config(*saved)
+
+    def test_failure_to_save_result(self):
+        saved = (jobs.job_max_workers, jobs.job_directory, jobs.job_ttl)
+        jobs.set_config(1, self.tmpdir.name, 10)
+        put = JobStore.put
+        calls = []
+
+        def failing_put(store, record, result=None):
+            calls.append(record["status"])
+            if len(calls) == 3:
+                raise OSError("disk full")
+            put(store, record, result)
+
+        # submitted (1), running (2), and the result (3), which fails
+        try:
+            with patch.object(JobStore, "put", failing_put):
+                record = jobs.submit_job("test", "location", lambda cancel_token: ("application/json", b"{}"))
+                finished = self.wait_for_job(record["id"])
+            self.assertEqual(calls, ["queued", "running", "succeeded", "failed"])
+            self.assertEqual(finished["status"], "failed")
+            self.assertEqual(finished["status_code"], 500)
+            self.assertIsNotNone(finished["expires"])
+            self.assertIsNone(jobs.get_job_result(record["id"]))
+        finally:
+            jobs.set_config(*saved)
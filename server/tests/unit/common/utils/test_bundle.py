@@ -0,0 +1,20 @@
+import unittest
+
+from server.common.utils.bundle import encode_bundle, decode_bundle
+
+
+class TestBundle(unittest.TestCase):
+    def test_roundtrip(self):
+        parts = [("schema", b'{"a": 1}'), ("layout/obs", bytes(range(256))), ("empty", b""), ("ünïcode", b"x")]
+        self.assertEqual(decode_bundle(encode_bundle(parts)), parts)
+        self.assertEqual(decode_bundle(encode_bundle([])), [])
+
+        # repeated names are all returned
+        parts = [("7", b"a"), ("0", b"b"), ("7", b"a")]
+        self.assertEqual(decode_bundle(encode_bundle(parts)), parts)
+
+    def test_truncated(self):
+        buf = encode_bundle([("schema", b"0123456789")])
+        for length in [2, 6, 12, len(buf) - 1]:
+            with self.assertRaises(ValueError):
+                decode_bundle(buf[0:length])
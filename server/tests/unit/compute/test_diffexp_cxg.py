@@ -1,9 +1,17 @@
+import concurrent.futures
 import tempfile
+import threading
+import time
 import unittest
+from unittest import mock
 
 import numpy as np
+from scipy import sparse
 
 from server.common.compute import diffexp_generic
+from server.common.compute.cancellation import CancellationToken
+from server.common.constants import XApproximateDistribution
+from server.common.errors import ComputeCancelledError
 from server.common.fbs.matrix import encode_matrix_fbs, decode_matrix_fbs
 from server.compute import diffexp_cxg
 from server.compute.diffexp_cxg import diffexp_ttest
@@ -12,6 +20,14 @@ from server.tests import FIXTURES_ROOT
 from server.tests.unit import app_config
 
 
+def _wait_for_cancellation(matrix, out, cancel_token):
+    """a partition task which runs until it is cancelled"""
+    for _ in range(3000):
+        cancel_token.check()
+        time.sleep(0.01)
+    out[...] = 1
+
+
 class DiffExpTest(unittest.TestCase):
     """Tests the diffexp returns the expected results for one test case, using different
     adaptor types and different algorithms."""
@@ -115,6 +131,260 @@ class DiffExpTest(unittest.TestCase):
 
         self.sparse_diffexp(adaptor_dense, adaptor_sparse)
 
+    def test_mean_var_cache(self):
+        adaptor = self.load_dataset(f"{FIXTURES_ROOT}/diffexp/sparse_col_shift.cxg")
+        maskA = self.get_mask(adaptor, 1, 10)
+        maskB = self.get_mask(adaptor, 2, 10)
+        diffexp_cxg.mean_var_cache.clear()
+        expected_10 = diffexp_ttest(adaptor, maskA, maskB, 10)
+
+        # repeated comparisons, with any top_n or cutoff, and in either direction, do not recompute
+        stats = diffexp_cxg.mean_var_cache.stats()
+        self.assertEqual(stats["entries"], 1)
+        adaptor = self.load_dataset(f"{FIXTURES_ROOT}/diffexp/sparse_col_shift.cxg")
+        self.assertEqual(diffexp_ttest(adaptor, maskA, maskB, 10), expected_10)
+        results_5 = diffexp_ttest(adaptor, maskA, maskB, 5, diffexp_lfc_cutoff=0.1)
+        reversed_10 = diffexp_ttest(adaptor, maskB, maskA, 10)
+        self.assertEqual(diffexp_cxg.mean_var_cache.stats()["hits"], stats["hits"] + 3)
+        self.assertEqual(diffexp_cxg.mean_var_cache.stats()["entries"], 1)
+
+        diffexp_cxg.mean_var_cache.clear()
+        self.assertEqual(diffexp_ttest(adaptor, maskA, maskB, 5, diffexp_lfc_cutoff=0.1), results_5)
+        self.assertEqual(diffexp_ttest(adaptor, maskB, maskA, 10), reversed_10)
+        self.assertListEqual([r[0] for r in reversed_10["positive"]], [r[0] for r in expected_10["negative"]])
+
+        # a different selection is a different entry
+        diffexp_ttest(adaptor, maskA, self.get_mask(adaptor, 3, 10), 10)
+        self.assertEqual(diffexp_cxg.mean_var_cache.stats()["entries"], 2)
+
+    def test_one_vs_rest(self):
+        adaptor_dense = self.load_dataset(f"{FIXTURES_ROOT}/diffexp/dense_col_shift.cxg")
+        adaptor_sparse = self.load_dataset(f"{FIXTURES_ROOT}/diffexp/sparse_col_shift.cxg")
+        maskA = self.get_mask(adaptor_dense, 1, 10)
+        X = adaptor_dense.get_X_array().astype(np.float64)
+
+        for maskB in (~maskA, ~self.get_mask(adaptor_dense, 3, 10)):
+            diffexp_cxg.mean_var_cache.clear()
+            for adaptor in (adaptor_dense, adaptor_sparse):
+                meanA, varA, nA, meanB, varB, nB = diffexp_cxg.mean_var_ab(adaptor, maskA, maskB)
+                self.assertEqual((nA, nB), (maskA.sum(), maskB.sum()))
+                np.testing.assert_allclose(meanA, X[maskA].mean(axis=0), rtol=1e-4, atol=1e-4)
+                np.testing.assert_allclose(varA, X[maskA].var(axis=0, ddof=1), rtol=1e-4, atol=1e-4)
+                np.testing.assert_allclose(meanB, X[maskB].mean(axis=0), rtol=1e-4, atol=1e-4)
+                np.testing.assert_allclose(varB, X[maskB].var(axis=0, ddof=1), rtol=1e-4, atol=1e-4)
+
+            # one totals entry per dataset
+            self.assertEqual(len(diffexp_cxg.mean_var_cache), 2)
+
+    def test_diffexp_groups(self):
+        for path in ("dense_col_shift.cxg", "sparse_col_shift.cxg"):
+            adaptor = self.load_dataset(f"{FIXTURES_ROOT}/diffexp/{path}")
+            codes = np.arange(adaptor.get_shape()[0]) % 5 - 1  # four groups, and unassigned rows
+            diffexp_cxg.mean_var_cache.clear()
+            results = diffexp_cxg.diffexp_ttest_groups(adaptor, codes, 4, 10)
+            self.assertEqual(len(results), 4)
+            for group, (n, result) in enumerate(results):
+                mask = codes == group
+                self.assertEqual(n, mask.sum())
+                expected = diffexp_ttest(adaptor, mask, ~mask, 10)
+                self.compare_diffexp_results(result["positive"], expected["positive"])
+                self.compare_diffexp_results(result["negative"], expected["negative"])
+
+    def test_cancellation(self):
+        token = CancellationToken()
+        self.assertIsNone(token.remaining())
+        token.check()
+        token.cancel()
+        with self.assertRaises(ComputeCancelledError):
+            token.check()
+
+        token = CancellationToken(timeout=0)
+        self.assertEqual(token.remaining(), 0)
+        with self.assertRaisesRegex(ComputeCancelledError, "time limit"):
+            token.check()
+
+        # a cancelled computation stops, and caches nothing
+        adaptor = self.load_dataset(f"{FIXTURES_ROOT}/diffexp/sparse_col_shift.cxg")
+        maskA = self.get_mask(adaptor, 1, 10)
+        maskB = self.get_mask(adaptor, 2, 10)
+        diffexp_cxg.mean_var_cache.clear()
+        token = CancellationToken()
+        token.cancel()
+        with self.assertRaises(ComputeCancelledError):
+            diffexp_cxg.mean_var_ab(adaptor, maskA, maskB, token)
+        self.assertEqual(len(diffexp_cxg.mean_var_cache), 0)
+        diffexp_ttest(adaptor, maskA, maskB, 10)
+        self.assertEqual(len(diffexp_cxg.mean_var_cache), 1)
+
+    def test_cancellation_of_shared_computation(self):
+        # concurrent callers share one computation; if its caller is cancelled, the others are not
+        adaptor = self.load_dataset(f"{FIXTURES_ROOT}/diffexp/sparse_col_shift.cxg")
+        maskA = self.get_mask(adaptor, 1, 10)
+        maskB = self.get_mask(adaptor, 2, 10)
+        diffexp_cxg.mean_var_cache.clear()
+        expected = diffexp_ttest(adaptor, maskA, maskB, 10)
+        diffexp_cxg.mean_var_cache.clear()
+
+        cancelled_token = CancellationToken()
+        waiting = threading.Event()
+        tokens = []
+        mean_var_ab = diffexp_cxg.mean_var_ab
+
+        def cancellable_mean_var_ab(adaptor, maskA, maskB, cancel_token):
+            tokens.append(cancel_token)
+            if cancel_token is cancelled_token:
+                # the second caller is waiting for this computation when it is cancelled
+                waiting.wait()
+                time.sleep(0.1)
+                cancel_token.cancel()
+            return mean_var_ab(adaptor, maskA, maskB, cancel_token)
+
+        with mock.patch.object(diffexp_cxg, "mean_var_ab", cancellable_mean_var_ab):
+            with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+                cancelled = executor.submit(diffexp_ttest, adaptor, maskA, maskB, 10, 0.01, cancelled_token)
+                while not tokens:
+                    time.sleep(0.01)
+                waiting.set()
+                other = executor.submit(diffexp_ttest, adaptor, maskA, maskB, 10)
+                with self.assertRaises(ComputeCancelledError):
+                    cancelled.result()
+                self.assertEqual(other.result(), expected)
+
+        # the second caller computed the statistics under its own token
+        self.assertEqual(len(tokens), 2)
+        self.assertFalse(tokens[1].cancelled)
+        self.assertEqual(len(diffexp_cxg.mean_var_cache), 1)
+
+    @unittest.skipIf(diffexp_cxg.shared_memory is None, "requires python 3.8 or later")
+    def test_process_executor(self):
+        for path in ("dense_col_shift.cxg", "sparse_col_shift.cxg"):
+            adaptor = self.load_dataset(f"{FIXTURES_ROOT}/diffexp/{path}")
+            maskA = self.get_mask(adaptor, 1, 10)
+            maskB = self.get_mask(adaptor, 2, 10)
+            codes = np.arange(adaptor.get_shape()[0]) % 5 - 1
+            results = {}
+            try:
+                for executor_type in ("thread", "process"):
+                    diffexp_cxg.executor_type = executor_type
+                    diffexp_cxg.mean_var_cache.clear()
+                    results[executor_type] = (
+                        diffexp_ttest(adaptor, maskA, maskB, 10),
+                        diffexp_cxg.diffexp_ttest_groups(adaptor, codes, 4, 10),
+                    )
+            finally:
+                diffexp_cxg.executor_type = "thread"
+            self.assertEqual(str(results["process"]), str(results["thread"]))
+
+        diffexp_cxg.diffexp_process_executor.shutdown()
+        diffexp_cxg.diffexp_process_executor = None
+
+    @unittest.skipIf(diffexp_cxg.shared_memory is None, "requires python 3.8 or later")
+    def test_process_executor_cancellation(self):
+        # explicit cancellation stops the tasks in the worker processes, and no task outlives its shared memory
+        adaptor = self.load_dataset(f"{FIXTURES_ROOT}/diffexp/sparse_col_shift.cxg")
+        matrix = adaptor.open_array("X")
+        token = CancellationToken()
+        try:
+            diffexp_cxg.executor_type = "process"
+            start = time.monotonic()
+            with self.assertRaises(ComputeCancelledError):
+                with diffexp_cxg._Partitions(token) as partitions:
+                    out = partitions.zeros((4,))
+                    for _ in range(2 * diffexp_cxg.get_process_executor()._max_workers + 2):
+                        partitions.submit(_wait_for_cancellation, matrix, out)
+                    threading.Timer(0.5, token.cancel).start()
+                    partitions.gather(out)
+            self.assertLess(time.monotonic() - start, 20)
+            self.assertEqual(partitions.blocks, [])
+            for future in partitions.futures:
+                self.assertTrue(future.done())
+                self.assertTrue(future.cancelled() or isinstance(future.exception(), ComputeCancelledError))
+        finally:
+            diffexp_cxg.executor_type = "thread"
+            diffexp_cxg.diffexp_process_executor.shutdown()
+            diffexp_cxg.diffexp_process_executor = None
+
+    def test_subsample_mask(self):
+        mask = np.zeros((1000,), dtype=bool)
+        mask[::2] = True
+        self.assertIs(diffexp_generic.subsample_mask(mask, 500), mask)
+
+        sample = diffexp_generic.subsample_mask(mask, 100, seed=1)
+        self.assertEqual(sample.sum(), 100)
+        self.assertTrue(mask[sample].all())
+        np.testing.assert_array_equal(diffexp_generic.subsample_mask(mask, 100, seed=1), sample)
+        self.assertFalse(np.array_equal(diffexp_generic.subsample_mask(mask, 100, seed=2), sample))
+
+        # whole tiles are preferred:  each tile of 10 rows holds 5 selected rows
+        sample = diffexp_generic.subsample_mask(mask, 100, seed=1, tile_rows=10)
+        self.assertEqual(sample.sum(), 100)
+        self.assertEqual(len(np.unique(np.flatnonzero(sample) // 10)), 20)
+
+    def test_mean_var_complement(self):
+        rng = np.random.default_rng(0)
+        X = rng.normal(3, 2, (100, 7))
+        mask = rng.random(100) < 0.2
+
+        def stats(X):
+            return X.mean(axis=0), X.var(axis=0, ddof=1), X.shape[0]
+
+        mean, var, n = diffexp_cxg.mean_var_complement(stats(X), stats(X[mask]))
+        self.assertEqual(n, np.count_nonzero(~mask))
+        np.testing.assert_allclose(mean, X[~mask].mean(axis=0))
+        np.testing.assert_allclose(var, X[~mask].var(axis=0, ddof=1))
+
+        mean, var, n = diffexp_cxg.mean_var_complement(stats(X), stats(X))
+        self.assertEqual(n, 0)
+        np.testing.assert_array_equal(var, 0)
+
+    def test_mean_var_masked(self):
+        rng = np.random.default_rng(1)
+        X = rng.poisson(3, (200, 13)).astype(np.float32)
+        membership = np.zeros((200, 4), dtype=bool)
+        membership[::3, 0] = True
+        membership[100:, 1] = True  # overlaps set 0
+        membership[7, 2] = True  # single row
+        # set 3 is empty
+
+        for distribution in (XApproximateDistribution.NORMAL, XApproximateDistribution.COUNT):
+            mean, var = diffexp_generic.mean_var_masked(X, membership, distribution)
+            Y = X.astype(np.float64)
+            if distribution == XApproximateDistribution.COUNT:
+                Y = np.log1p(Y)
+            for s in (0, 1):
+                np.testing.assert_allclose(mean[s], Y[membership[:, s]].mean(axis=0))
+                np.testing.assert_allclose(var[s], Y[membership[:, s]].var(axis=0, ddof=1))
+            np.testing.assert_allclose(mean[2], Y[7])
+            np.testing.assert_array_equal(var[2], 0)
+            np.testing.assert_array_equal(mean[3], 0)
+            np.testing.assert_array_equal(var[3], 0)
+
+            # and the single set convenience wrapper
+            mean_n, var_n, n = diffexp_generic.mean_var_n(X[membership[:, 0]], distribution)
+            self.assertEqual(n, membership[:, 0].sum())
+            np.testing.assert_allclose(mean_n, mean[0])
+            np.testing.assert_allclose(var_n, var[0])
+
+    def test_mean_var_nonfinite(self):
+        # the statistics of columns containing NaN or +/-inf are zero, for dense and sparse X
+        rng = np.random.default_rng(2)
+        X = rng.poisson(3, (50, 6)).astype(np.float32)
+        X[3, 1] = np.inf
+        X[4, 2] = -np.inf
+        X[5, 3] = np.nan
+        dense_mean, dense_var, _ = diffexp_generic.mean_var_n(X)
+        sparse_mean, sparse_var, _ = diffexp_generic.mean_var_n(sparse.csr_matrix(X))
+        for mean, var in ((dense_mean, dense_var), (sparse_mean, sparse_var)):
+            np.testing.assert_array_equal(mean[1:4], 0)
+            np.testing.assert_array_equal(var[1:4], 0)
+            finite = [0, 4, 5]
+            np.testing.assert_allclose(mean[finite], X[:, finite].mean(axis=0), rtol=1e-6)
+            np.testing.assert_allclose(var[finite], X[:, finite].var(axis=0, ddof=1), rtol=1e-5)
+
+        # the CXG partitions mark them, to be zeroed when finalized
+        mean, var = diffexp_generic.mean_var_masked(X, np.ones((50, 1), dtype=bool), nonfinite=np.nan)
+        self.assertTrue(np.isnan(mean[0, 1:4]).all() and np.isnan(var[0, 1:4]).all())
+
     def sparse_diffexp(self, adaptor_dense, adaptor_sparse):
         with tempfile.TemporaryDirectory() as dirname:
             maskA = self.get_mask(adaptor_dense, 1, 10)
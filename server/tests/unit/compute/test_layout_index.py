@@ -0,0 +1,84 @@
+import unittest
+
+import numpy as np
+
+from server.common.compute.layout_index import LayoutIndex, morton_encode, morton_decode
+
+
+class LayoutIndexTest(unittest.TestCase):
+    """Tests the quadtree layout index against brute force evaluation"""
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.layout = rng.random((5000, 2), dtype=np.float32)
+        self.layout[[3, 99], 0] = np.nan
+        self.index = LayoutIndex(self.layout, max_level=10)
+
+    def in_tile(self, z, x, y):
+        tile = np.floor(self.layout * (1 << z))
+        return np.nonzero((tile[:, 0] == x) & (tile[:, 1] == y))[0]
+
+    def test_morton(self):
+        x = np.array([0, 1, 2, 3, 1023, 65535], dtype=np.uint64)
+        y = np.array([0, 0, 1, 3, 7, 65535], dtype=np.uint64)
+        codes = morton_encode(x, y)
+        self.assertListEqual(codes[0:4].tolist(), [0, 1, 6, 15])
+        dx, dy = morton_decode(codes)
+        self.assertListEqual(dx.tolist(), x.tolist())
+        self.assertListEqual(dy.tolist(), y.tolist())
+
+    def test_tile_sample(self):
+        self.assertEqual(len(self.index.obs), 4998)
+        obs, xy = self.index.tile_sample(0, 0, 0, 10000)
+        self.assertSetEqual(set(obs.tolist()), set(range(5000)) - {3, 99})
+
+        for (z, x, y) in [(1, 0, 1), (2, 3, 2), (4, 5, 9)]:
+            obs, xy = self.index.tile_sample(z, x, y, 10000)
+            self.assertSetEqual(set(obs.tolist()), set(self.in_tile(z, x, y).tolist()))
+            self.assertTrue(np.array_equal(xy, self.layout[obs]))
+
+        # samples are limited, and nested in the samples of child tiles
+        parent, _ = self.index.tile_sample(1, 1, 1, 100)
+        self.assertEqual(len(parent), 100)
+        child, _ = self.index.tile_sample(2, 2, 3, 100)
+        in_child = set(self.in_tile(2, 2, 3).tolist())
+        self.assertTrue({o for o in parent.tolist() if o in in_child} <= set(child.tolist()))
+        self.assertEqual(len(self.index.tile_sample(1, 1, 1, 0)[0]), 0)
+
+        with self.assertRaises(ValueError):
+            self.index.tile_sample(1, 2, 0, 10)
+        with self.assertRaises(ValueError):
+            self.index.tile_sample(11, 0, 0, 10)
+
+    def test_tile_counts(self):
+        x, y, counts = self.index.tile_counts(1, 1, 0, 3)
+        self.assertEqual(counts.sum(), len(self.in_tile(1, 1, 0)))
+        for sx, sy, count in zip(x, y, counts):
+            self.assertEqual(count, len(self.in_tile(4, sx, sy)))
+        self.assertTrue(((x >= 8) & (x < 16) & (y < 8)).all())
+
+        with self.assertRaises(ValueError):
+            self.index.tile_counts(8, 0, 0, 3)
+
+    def test_select_box(self):
+        x, y = self.layout[:, 0], self.layout[:, 1]
+        for box in [(0.1, 0.2, 0.6, 0.3), (0, 0, 1, 1), (0.5, 0.5, 0.5001, 0.9), (-1, -1, 0.25, 2), (0.6, 0, 0.5, 1)]:
+            x0, y0, x1, y1 = box
+            expected = (x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)
+            self.assertTrue(np.array_equal(self.index.select_box(*box), expected))
+
+    def test_select_polygon(self):
+        x, y = self.layout[:, 0], self.layout[:, 1]
+        triangle = [[0.1, 0.1], [0.9, 0.1], [0.1, 0.9]]
+        expected = (x >= 0.1) & (y >= 0.1) & (x + y < 1.0)
+        mask = self.index.select_polygon(triangle)
+        self.assertLessEqual(np.count_nonzero(mask != expected), 2)  # allow for float rounding on the boundary
+        self.assertGreater(np.count_nonzero(mask), 0)
+
+        # concave, spanning many tiles
+        chevron = [[0.0, 0.0], [0.5, 0.5], [1.0, 0.0], [1.0, 1.0], [0.0, 1.0]]
+        expected = y > np.minimum(x, 1.0 - x)
+        self.assertLessEqual(np.count_nonzero(self.index.select_polygon(chevron) != expected), 2)
+
+        with self.assertRaises(ValueError):
+            self.index.select_polygon([[0, 0], [1, 1]])
@@ -0,0 +1,43 @@
+import unittest
+
+import numpy as np
+
+from server.common.compute.name_index import NameIndex
+
+
+class NameIndexTest(unittest.TestCase):
+    """Tests the name index against a linear scan"""
+
+    def setUp(self):
+        self.names = np.array(["CD4", "CD44", "cd8a", "ACTB", "CD4", "MT-CO1", None, ""], dtype=object)
+        self.ids = np.array([f"ENSG{i:04d}" for i in range(len(self.names))], dtype=object)
+        self.ids[3] = "CD4X"
+        self.index = NameIndex([("name", self.names), ("id", self.ids)])
+
+    def test_search(self):
+        # exact matches first, then names before aliases, then shorter matches
+        matches = self.index.search("cd4", 10)
+        expected = [(0, "CD4", "name", "CD4"), (4, "CD4", "name", "CD4"), (1, "CD44", "name", "CD44")]
+        self.assertListEqual(matches, expected + [(3, "ACTB", "id", "CD4X")])
+        self.assertListEqual(self.index.search("Cd4", 2), matches[:2])
+        self.assertListEqual(self.index.search("  mt-c ", 10), [(5, "MT-CO1", "name", "MT-CO1")])
+        self.assertListEqual(self.index.search("zz", 10), [])
+        self.assertListEqual(self.index.search("", 10), [])
+
+    def test_aliases(self):
+        # each var is returned once, for its best match
+        matches = self.index.search("e", 100)
+        self.assertListEqual([var for var, _, _, _ in matches], [0, 1, 2, 4, 5, 6, 7])
+        self.assertTrue(all(field == "id" for _, _, field, _ in matches))
+        self.assertEqual(matches[5], (6, None, "id", "ENSG0006"))
+
+    def test_prefix_scan(self):
+        rng = np.random.default_rng(0)
+        chars = list("abAB-1") + [chr(0x10FFFF)]
+        names = np.array(["".join(rng.choice(chars, rng.integers(1, 6))) for _ in range(2000)], dtype=object)
+        index = NameIndex([("name", names)])
+        # including prefixes ending in the greatest character, which can not be incremented
+        for prefix in ["a", "Ab", "b-", "1", "aaa", "a\U0010ffff", "\U0010ffff", "\U0010ffff\U0010ffff"]:
+            expected = {i for i, name in enumerate(names) if name.lower().startswith(prefix.lower())}
+            self.assertSetEqual({var for var, _, _, _ in index.search(prefix, len(names))}, expected)
+            self.assertEqual(len(index.search(prefix, 3)), min(3, len(expected)))
@@ -0,0 +1,49 @@
+import unittest
+
+import numpy as np
+
+from server.common.compute.quantile_sketch import QuantileSketch
+
+
+class QuantileSketchTest(unittest.TestCase):
+    """Tests the quantile sketch against exact quantiles"""
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        n = 100000
+        self.groups = rng.integers(0, 4, n)
+        self.stored = rng.random(n) < 0.3
+        self.values = np.where(self.stored, rng.lognormal(0, 1, n), 0)
+        n_implicit = np.bincount(self.groups, minlength=4) - np.bincount(self.groups[self.stored], minlength=4)
+        self.sketches = QuantileSketch.build_grouped(
+            self.values[self.stored], self.groups[self.stored], 4, atom=0.0, atom_weights=n_implicit
+        )
+        self.q = [0, 0.01, 0.25, 0.5, 0.75, 0.9, 0.99, 1]
+
+    def assertQuantilesClose(self, sketch, values):
+        expected = np.quantile(values, self.q)
+        actual = sketch.quantile(self.q)
+        # exact at the extremes and within the implicit zeros, and otherwise within 2% (of the values' scale)
+        self.assertEqual(actual[0], expected[0])
+        self.assertEqual(actual[-1], expected[-1])
+        np.testing.assert_allclose(actual, expected, rtol=0.02, atol=0.01)
+
+    def test_grouped(self):
+        for g, sketch in enumerate(self.sketches):
+            self.assertEqual(sketch.count, np.count_nonzero(self.groups == g))
+            self.assertLessEqual(len(sketch.means), 200)
+            self.assertQuantilesClose(sketch, self.values[self.groups == g])
+
+    def test_merge(self):
+        for union in [[0, 2], [0, 1, 2, 3]]:
+            sketch = QuantileSketch.merge([self.sketches[g] for g in union])
+            self.assertEqual(sketch.count, np.count_nonzero(np.isin(self.groups, union)))
+            self.assertQuantilesClose(sketch, self.values[np.isin(self.groups, union)])
+
+    def test_empty(self):
+        (sketch,) = QuantileSketch.build_grouped([], [], 1)
+        self.assertListEqual(sketch.quantile([0, 0.5]), [None, None])
+        (sketch,) = QuantileSketch.build_grouped([], [], 1, atom=2.0, atom_weights=np.array([3.0]))
+        self.assertListEqual(sketch.quantile([0, 0.5, 1]), [2.0, 2.0, 2.0])
+        with self.assertRaises(ValueError):
+            QuantileSketch.merge([sketch, self.sketches[0]])
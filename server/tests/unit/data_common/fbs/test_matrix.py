@@ -13,9 +13,9 @@ class FbsTests(unittest.TestCase):
     def test_encode_boundary(self):
         """test various boundary checks"""
 
-        # row indexing is unsupported
+        # row index must match the number of rows
         with self.assertRaises(ValueError):
-            encode_matrix_fbs(matrix=pd.DataFrame(), row_idx=[])
+            encode_matrix_fbs(matrix=np.zeros((3, 2)), row_idx=[0, 1])
 
         # matrix must be 2D
         with self.assertRaises(ValueError):
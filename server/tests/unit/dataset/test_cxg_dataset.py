@@ -1,6 +1,14 @@
+import json
 import unittest
 
+import numpy as np
+
+from server.common.constants import Axis
+from server.common.compute.cancellation import CancellationToken
+from server.common.errors import ComputeCancelledError, FilterError, ExceedsLimitError
+from server.common.fbs.matrix import decode_matrix_fbs
 from server.common.utils.data_locator import DataLocator
+from server.dataset import dataset
 from server.dataset.cxg_dataset import CxgDataset
 from server.tests.unit import app_config
 from server.tests import FIXTURES_ROOT
@@ -14,7 +22,266 @@ class TestCxgDataset(unittest.TestCase):
         data = self.get_data("pbmc3k_v0.cxg")
         self.assertDictEqual(data.get_colors(), dict())
 
-    def get_data(self, fixture):
+    def test_layout_cache(self):
+        data = self.get_data("nan.cxg")
+        dataset.layout_cache.clear()
+        df = decode_matrix_fbs(data.layout_to_fbs_matrix(["umap", "pca"]))
+        self.assertListEqual(df.columns.tolist(), ["umap_0", "umap_1", "pca_0", "pca_1"])
+        self.assertEqual(df.shape, (100, 4))
+        self.assertTrue((df.min() >= 0).all() and (df.max() <= 1).all())
+        self.assertEqual(len(dataset.layout_cache), 2)
+
+        # a new adaptor on the same dataset is served from the cache
+        stats = dataset.layout_cache.stats()
+        data = self.get_data("nan.cxg")
+        umap = data.get_normalized_embedding("umap")
+        self.assertEqual(dataset.layout_cache.stats()["hits"], stats["hits"] + 1)
+        self.assertEqual(umap.dtype, np.float32)
+        self.assertTrue(np.array_equal(umap[:, 0], df["umap_0"].to_numpy()))
+
+        # all layouts
+        df = decode_matrix_fbs(data.layout_to_fbs_matrix(None))
+        self.assertSetEqual(set(df.columns), {"pca_0", "pca_1", "tsne_0", "tsne_1", "umap_0", "umap_1"})
+
+    def test_layout_raster(self):
+        for fixture, ename in [("nan.cxg", "umap"), ("diffexp/sparse_col_shift.cxg", "random")]:
+            data = self.get_data(fixture)
+            layout = data.get_normalized_embedding(ename)
+            x = np.clip(np.floor(layout[:, 0] * 7), 0, 6)
+            y = np.clip(np.floor(layout[:, 1] * 5), 0, 4)
+            X = data.get_X_array().astype(np.float64)
+            for var_indices, values in [([3], X[:, 3]), ([0, 5, 9, 5], X[:, [0, 5, 9]].mean(axis=1))]:
+                for agg in ["mean", "max"]:
+                    df = decode_matrix_fbs(data.layout_raster_to_fbs_matrix(ename, 7, 5, var_indices, agg))
+                    self.assertListEqual(df.columns.tolist(), ["x", "y", "count", agg])
+                    self.assertEqual(df["count"].sum(), data.get_shape()[0])
+                    for _, row in df.iterrows():
+                        in_bin = values[(x == row["x"]) & (y == row["y"])]
+                        self.assertEqual(len(in_bin), row["count"])
+                        in_bin = in_bin[np.isfinite(in_bin)]
+                        expected = np.nan if len(in_bin) == 0 else getattr(in_bin, agg)()
+                        np.testing.assert_allclose(row[agg], expected, rtol=1e-5, atol=1e-6)
+
+        # the binning is cached, and shared by all rasters of the same grid
+        stats = dataset.layout_cache.stats()
+        data.layout_raster_to_fbs_matrix(ename, 7, 5)
+        self.assertEqual(dataset.layout_cache.stats()["hits"], stats["hits"] + 1)
+        for args in [(ename, 0, 5), (ename, 7, 5000), (ename, 7, 5, [0], "min")]:
+            with self.assertRaises(ValueError):
+                data.layout_raster_to_fbs_matrix(*args)
+
+    def test_select_layout(self):
+        data = self.get_data("nan.cxg")
+        layout = data.get_normalized_embedding("umap")
+        expected = (layout[:, 0] <= 0.5) & (layout[:, 1] <= 0.5)
+
+        result = json.loads(data.select_layout("umap", box=[0, 0, 0.5, 0.5], index=True))
+        self.assertEqual(result["count"], np.count_nonzero(expected))
+        index_mask = data._index_filter_to_mask(result["index"], 100)
+        self.assertTrue(np.array_equal(index_mask, expected))
+
+        # the selection handle may be used in obs filters, on a new adaptor
+        data = self.get_data("nan.cxg")
+        obs_mask, _ = data._filter_to_mask({"obs": {"selection": result["selection"]}})
+        self.assertTrue(np.array_equal(obs_mask, expected))
+        with self.assertRaises(FilterError):
+            data._filter_to_mask({"obs": {"selection": "no-such-selection"}})
+        with self.assertRaises(FilterError):
+            data._filter_to_mask({"var": {"selection": result["selection"]}})
+
+        with self.assertRaises(ValueError):
+            data.select_layout("umap")
+        with self.assertRaises(ValueError):
+            data.select_layout("umap", box=[0, 0, 1])
+
+    def test_data_var_batch(self):
+        for fixture in ["diffexp/dense_no_col_shift.cxg", "diffexp/sparse_col_shift.cxg", "nan.cxg"]:
+            data = self.get_data(fixture)
+            n_vars = data.get_shape()[1]
+            var_indices = [n_vars - 1, 3, 0, 3, 150 % n_vars, 99, 1, 2, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16]
+            results = list(data.data_var_batch_to_fbs_matrices(var_indices))
+            self.assertListEqual([var for var, _ in results], var_indices)
+            for var, fbs in results:
+                expected = decode_matrix_fbs(data.data_frame_to_fbs_matrix({"var": {"index": [var]}}, Axis.VAR))
+                df = decode_matrix_fbs(fbs)
+                self.assertListEqual(df.columns.tolist(), [var])
+                np.testing.assert_array_equal(df[var].to_numpy(), expected[var].to_numpy())
+
+            self.assertListEqual(list(data.data_var_batch_to_fbs_matrices([])), [])
+            for bad in [[n_vars], [-1], [0.5], [[0, 1]]]:
+                with self.assertRaises(ValueError):
+                    data.data_var_batch_to_fbs_matrices(bad)
+
+        data = self.get_data("nan.cxg", extra_server_config=dict(limits__data_var_batch_max=2))
+        with self.assertRaises(ExceedsLimitError):
+            data.data_var_batch_to_fbs_matrices([0, 1, 2])
+
+    def test_data_obs_values(self):
+        for fixture in ["diffexp/dense_col_shift.cxg", "diffexp/sparse_no_col_shift.cxg", "nan.cxg"]:
+            data = self.get_data(fixture)
+            X = np.nan_to_num(data.get_X_array(), nan=0)
+            obs_indices = [data.get_shape()[0] - 1, 3, 0, 3, 60, 24]
+            cells = json.loads(data.data_obs_values(obs_indices))["cells"]
+            self.assertListEqual([cell["obs"] for cell in cells], obs_indices)
+            for cell in cells:
+                row = X[cell["obs"]]
+                self.assertListEqual(cell["var"], np.flatnonzero(row).tolist())
+                np.testing.assert_array_almost_equal(cell["values"], row[row != 0])
+
+            for cell in json.loads(data.data_obs_values(obs_indices, top_n=5))["cells"]:
+                row = X[cell["obs"]]
+                self.assertEqual(len(cell["var"]), 5)
+                self.assertTrue(np.all(np.diff(cell["values"]) <= 0))
+                np.testing.assert_array_almost_equal(cell["values"], np.sort(row[row != 0])[::-1][:5])
+                np.testing.assert_array_equal(row[cell["var"]], cell["values"])
+
+            self.assertEqual(json.loads(data.data_obs_values([]))["cells"], [])
+            for bad in [[data.get_shape()[0]], [-1], [0.5], [[0, 1]]]:
+                with self.assertRaises(ValueError):
+                    data.data_obs_values(bad)
+            with self.assertRaises(ValueError):
+                data.data_obs_values([0], top_n=0)
+
+        data = self.get_data("nan.cxg", extra_server_config=dict(limits__data_obs_max=2))
+        with self.assertRaises(ExceedsLimitError):
+            data.data_obs_values([0, 1, 2])
+
+    def test_virtual_obs(self):
+        names = ["total_counts", "n_genes_by_counts", "pct_counts_mt", "pct_counts_ribo"]
+        self.assertNotIn("total_counts", self.get_data("nan.cxg").get_obs_keys())
+
+        config = dict(virtual_obs__enable=True)
+        for fixture in ["diffexp/sparse_col_shift.cxg", "diffexp/dense_no_col_shift.cxg", "schema_2_0_0.cxg"]:
+            data = self.get_data(fixture, extra_dataset_config=config)
+            schema = {column["name"]: column for column in data.get_schema()["annotations"]["obs"]["columns"]}
+            self.assertTrue(all(schema[name]["virtual"] for name in names))
+            self.assertListEqual(data.get_obs_keys()[-4:], names)
+
+            X = data.get_X_array().astype(np.float64)
+            var_names = data.get_annotation_columns(Axis.VAR, [data.get_schema()["annotations"]["var"]["index"]])[0]
+            mt = np.char.startswith(np.char.upper(var_names.astype(str)), "MT-")
+            df = decode_matrix_fbs(data.annotation_to_fbs_matrix(Axis.OBS, names))
+            np.testing.assert_allclose(df["total_counts"], X.sum(axis=1), rtol=1e-5)
+            np.testing.assert_array_equal(df["n_genes_by_counts"], np.count_nonzero(X, axis=1))
+            np.testing.assert_allclose(df["pct_counts_mt"], 100 * X[:, mt].sum(axis=1) / X.sum(axis=1), rtol=1e-4)
+            # cached once, together, and not again by name
+            for name in names:
+                self.assertNotIn((data.get_location(), str(Axis.OBS), name), dataset.column_cache)
+
+            # usable by filters
+            threshold = np.median(df["n_genes_by_counts"])
+            filter = {"obs": {"annotation_value": [{"name": "n_genes_by_counts", "min": threshold}]}}
+            obs_mask, _ = data._filter_to_mask(filter)
+            np.testing.assert_array_equal(obs_mask, df["n_genes_by_counts"] >= threshold)
+
+    def test_diffexp_approximate(self):
+        config = dict(diffexp__approximate_max_cells=100)
+        data = self.get_data("diffexp/sparse_col_shift.cxg", extra_dataset_config=config)
+        filterA = {"obs": {"index": [[0, 1000]]}}
+        filterB = {"obs": {"index": [[1000, 1050]]}}
+
+        result = json.loads(data.diffexp_topN(filterA, filterB, 10, approximate=True))
+        self.assertDictEqual(
+            result["approximation"],
+            {"seed": 0, "set1": {"n": 1000, "n_effective": 100}, "set2": {"n": 50, "n_effective": 50}},
+        )
+        self.assertEqual(len(result["positive"]), 10)
+        self.assertEqual(json.loads(data.diffexp_topN(filterA, filterB, 10, approximate=True)), result)
+
+        # exact unless requested, or unless a set exceeds the cap
+        self.assertNotIn("approximation", json.loads(data.diffexp_topN(filterA, filterB, 10)))
+        self.assertNotIn("approximation", json.loads(data.diffexp_topN(filterB, filterB, 10, approximate=True)))
+
+    def test_row_means(self):
+        for fixture in ["diffexp/dense_no_col_shift.cxg", "diffexp/sparse_col_shift.cxg", "nan.cxg"]:
+            data = self.get_data(fixture)
+            n_vars = data.get_shape()[1]
+            for var_indices in ([3], [0, 1, 2, 99], list(range(0, n_vars, 7))):
+                var_mask = np.zeros((n_vars,), dtype=bool)
+                var_mask[var_indices] = True
+                expected = data.get_X_array(None, var_mask).astype(np.float64).mean(axis=1, keepdims=True)
+                mean = data.get_X_row_means(var_mask)
+                self.assertEqual(mean.shape, (data.get_shape()[0], 1))
+                self.assertEqual(mean.dtype, np.float32)
+                np.testing.assert_allclose(mean, expected, rtol=1e-5, atol=1e-5)
+
+    def test_summarize_cache(self):
+        dataset.summarize_cache.clear()
+        filter = {"var": {"annotation_value": [{"name": "name_0", "values": ["0", "1", "2"]}]}}
+        result = self.get_data("nan.cxg").summarize_var("mean", filter, "0123abcd")
+        self.assertEqual(len(dataset.summarize_cache), 1)
+
+        # a new adaptor, with the same query hash, is served from the cache
+        stats = dataset.summarize_cache.stats()
+        self.assertEqual(self.get_data("nan.cxg").summarize_var("mean", filter, "0123abcd"), result)
+        self.assertEqual(dataset.summarize_cache.stats()["hits"], stats["hits"] + 1)
+
+        # a cancelled summary stops, and caches nothing
+        filter = {"var": {"annotation_value": [{"name": "name_0", "values": ["TNFRSF4", "CPSF3L", "RER1"]}]}}
+        token = CancellationToken()
+        token.cancel()
+        with self.assertRaises(ComputeCancelledError):
+            self.get_data("nan.cxg").summarize_var("mean", filter, "4567abcd", token)
+        self.assertEqual(len(dataset.summarize_cache), 1)
+        self.get_data("nan.cxg").summarize_var("mean", filter, "4567abcd", CancellationToken())
+        self.assertEqual(len(dataset.summarize_cache), 2)
+
+    def test_annotation_columns(self):
+        dataset.column_cache.clear()
+        data = self.get_data("nan.cxg")
+        fbs = data.annotation_to_fbs_matrix(Axis.OBS)
+        keys = data.get_obs_keys()
+        self.assertEqual(len(dataset.column_cache), len(keys))
+
+        # a new adaptor shares the decoded columns, for both encoding and filters
+        data = self.get_data("nan.cxg")
+        stats = dataset.column_cache.stats()
+        self.assertEqual(data.annotation_to_fbs_matrix(Axis.OBS), fbs)
+        mask = data._axis_filter_to_mask(Axis.OBS, {"annotation_value": [{"name": "louvain", "values": ["0"]}]}, 100)
+        df = decode_matrix_fbs(data.annotation_to_fbs_matrix(Axis.OBS, ["louvain", "n_genes"]))
+        self.assertListEqual(df.columns.tolist(), ["louvain", "n_genes"])
+        np.testing.assert_array_equal(mask, df["louvain"] == "0")
+        self.assertEqual(dataset.column_cache.stats()["misses"], stats["misses"])
+
+        with self.assertRaises(KeyError):
+            data.annotation_to_fbs_matrix(Axis.OBS, ["louvain", "no_such_column"])
+
+    def test_summarize_obs(self):
+        data = self.get_data("nan.cxg", extra_dataset_config=dict(presentation__max_categories=10))
+        summary = json.loads(data.summarize_obs(["percent_mito", "name_0"], 4))["obs"]
+        percent_mito = data.get_annotation_columns(Axis.OBS, ["percent_mito"])[0]
+        finite = percent_mito[np.isfinite(percent_mito)]
+        self.assertEqual(summary["percent_mito"]["nan"], 20)
+        self.assertListEqual(summary["percent_mito"]["counts"], np.histogram(finite, bins=4)[0].tolist())
+        self.assertEqual(summary["name_0"]["type"], "string")
+        self.assertTrue(summary["name_0"]["truncated"])
+        self.assertEqual(len(summary["name_0"]["categories"]), 10)
+
+    def test_summarize_var_distribution(self):
+        quantiles = [0, 0.1, 0.5, 0.9, 1]
+        for fixture in ["diffexp/sparse_col_shift.cxg", "diffexp/dense_no_col_shift.cxg"]:
+            data = self.get_data(fixture)
+            n_obs, n_vars = data.get_shape()
+            mask = np.random.default_rng(0).random(n_obs) < 0.3
+            dataset.selection_cache.put((data.get_location(), "test"), np.packbits(mask))
+            for selection in [None, "test"]:
+                summary = json.loads(data.summarize_var_distribution([3, 1999], 10, quantiles, selection))
+                self.assertEqual(summary["n"], n_obs if selection is None else np.count_nonzero(mask))
+                for var in summary["var"]:
+                    var_mask = np.zeros((n_vars,), dtype=bool)
+                    var_mask[var["index"]] = True
+                    column = data.get_X_array(None, var_mask).ravel().astype(np.float64)
+                    range_ = (column.min(), column.max())
+                    if selection is not None:
+                        column = column[mask]
+                    np.testing.assert_allclose(var["quantiles"], np.quantile(column, quantiles), rtol=1e-6)
+                    np.testing.assert_allclose((var["min"], var["max"]), range_, rtol=1e-6)
+                    self.assertListEqual(var["counts"], np.histogram(column, bins=10, range=range_)[0].tolist())
+                    self.assertEqual(var["nonzero"], np.count_nonzero(column))
+
+    def get_data(self, fixture, extra_server_config={}, extra_dataset_config={}):
         data_locator = f"{FIXTURES_ROOT}/{fixture}"
-        config = app_config(data_locator)
+        config = app_config(
+            data_locator, extra_server_config=extra_server_config, extra_dataset_config=extra_dataset_config
+        )
         return CxgDataset(DataLocator(data_locator), config)